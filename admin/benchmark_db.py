@@ -0,0 +1,130 @@
+import os
+import sys
+import time
+import random
+import tempfile
+
+# admin/benchmark_db.py -> admin -> root
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root_dir)
+
+from src.data import database, staging
+from src.data.connections import close_all
+
+# Statistics as computed on the line table (one row per article)
+LINE_QUERIES = {
+    "total_rda": "SELECT COUNT(DISTINCT rda_number) FROM rda_data",
+    "overdue_rda": "SELECT COUNT(DISTINCT rda_number) FROM rda_data WHERE alert_level > 0",
+    "by_requester": """
+        SELECT richiedente, COUNT(DISTINCT rda_number) as cnt FROM rda_data
+        WHERE richiedente IS NOT NULL AND richiedente != ''
+        GROUP BY richiedente ORDER BY cnt DESC
+    """,
+    "by_month": """
+        SELECT substr(data_rda_iso, 1, 7), COUNT(DISTINCT rda_number) FROM rda_data
+        WHERE data_rda_iso != '' GROUP BY substr(data_rda_iso, 1, 7)
+    """,
+}
+
+# The same statistics on the header table (one row per RDA)
+HEADER_QUERIES = {
+    "total_rda": "SELECT COUNT(*) FROM rda_header",
+    "overdue_rda": "SELECT COUNT(*) FROM rda_header WHERE alert_level > 0",
+    "by_requester": """
+        SELECT r.name, COUNT(*) as cnt FROM rda_header h
+        JOIN requester r ON r.id = h.requester_id
+        GROUP BY h.requester_id ORDER BY cnt DESC
+    """,
+    "by_month": """
+        SELECT substr(data_rda_iso, 1, 7), COUNT(*) FROM rda_header
+        WHERE data_rda_iso != '' GROUP BY substr(data_rda_iso, 1, 7)
+    """,
+}
+
+
+def synthetic_rows(n_rda, seed=42):
+    """
+    Yields register rows for n_rda requests with 1-8 lines each,
+    200 requesters and dates spread over three years.
+    """
+    rng = random.Random(seed)
+    requesters = [f"Richiedente {i:03d}" for i in range(200)]
+    for n in range(n_rda):
+        rda_number = f"{22 + n // 100000}/{n % 100000:05d}"
+        day, month, year = rng.randint(1, 28), rng.randint(1, 12), rng.randint(2022, 2024)
+        data_rda = f"{day:02d}/{month:02d}/{year}"
+        requester = rng.choice(requesters)
+        alert = rng.choice((0, 0, 0, 1, 2, 5))
+        pdf_path = f"\\\\server\\RDA_PDF\\{year}\\RDA_{n:06d}.pdf"
+        for line in range(rng.randint(1, 8)):
+            yield (
+                rda_number, str(rng.randint(10000, 99999)), "GEN",
+                f"Materiale {rng.randint(1, 5000)} tipo {line}", "PZ",
+                float(rng.randint(1, 100)), rng.choice(("Si", "No")), pdf_path,
+                data_rda, "", alert, requester
+            )
+
+
+def table_sizes(conn, names):
+    """
+    Bytes used by each table/index (None if dbstat is not available).
+    Indexes rebuilt by replace_all_data carry a generation suffix (_g<n>).
+    """
+    sql = "SELECT SUM(pgsize) FROM dbstat WHERE name = ? OR name GLOB ? || '_g[0-9]*'"
+    try:
+        return {name: conn.execute(sql, (name, name)).fetchone()[0] or 0 for name in names}
+    except Exception:
+        return None
+
+
+def best_time(conn, sql, repeat=5):
+    """Best of repeat runs, in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(sql).fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+
+def run(n_rda):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        database.DATABASE_DIR = tmp_dir
+        database.SQLITE_DB_PATH = os.path.join(tmp_dir, "benchmark.db")
+        database.init_db()
+
+        start = time.perf_counter()
+        staging.replace_all_data(synthetic_rows(n_rda))
+        print(f"Loaded {n_rda} RDA in {time.perf_counter() - start:.1f}s")
+
+        conn = database.get_connection()
+        n_lines = conn.execute("SELECT COUNT(*) FROM rda_data").fetchone()[0]
+        print(f"{n_lines} lines, {n_lines / n_rda:.1f} lines per RDA\n")
+
+        sizes = table_sizes(conn, ("rda_data", "rda_header", "requester", "idx_site_rda_number"))
+        if sizes:
+            print("Storage:")
+            for name, size in sizes.items():
+                print(f"  {name:<22} {size / 1024:>10.0f} KB")
+            print()
+
+        print(f"{'statistic':<15} {'lines (ms)':>12} {'headers (ms)':>14} {'speedup':>9}")
+        for name, line_sql in LINE_QUERIES.items():
+            line_ms = best_time(conn, line_sql)
+            header_ms = best_time(conn, HEADER_QUERIES[name])
+            print(f"{name:<15} {line_ms:>12.2f} {header_ms:>14.2f} {line_ms / max(header_ms, 1e-6):>8.1f}x")
+
+        # All dashboard statistics at once, from the pre-aggregated table
+        timings = []
+        for _ in range(5):
+            start = time.perf_counter()
+            database.read_statistics(conn.cursor())
+            timings.append((time.perf_counter() - start) * 1000)
+        print(f"\nread_statistics (stat_summary): {min(timings):.3f} ms")
+
+        conn.close()
+        close_all()
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
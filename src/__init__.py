@@ -3,4 +3,5 @@
 
 from src.utils.config import *
 from src.utils.utils import logger, format_number, format_date
-from src.data.database import get_connection, init_db, replace_all_data
+from src.data.database import get_connection, init_db
+from src.data.staging import replace_all_data
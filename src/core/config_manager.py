@@ -8,7 +8,21 @@ import platform
 DEFAULT_CONFIG = {
     "excel_path": r"\\192.168.11.251\Condivisa\RICHIESTE MATERIALI\DATABASE\database_RDA.xlsm",
     "pdf_folder": r"\\192.168.11.251\Condivisa\RICHIESTE MATERIALI\RDA_PDF",
-    "database_dir": r"\\192.168.11.251\Condivisa\RICHIESTE MATERIALI\DATABASE"
+    "database_dir": r"\\192.168.11.251\Condivisa\RICHIESTE MATERIALI\DATABASE",
+    # "excel": the .xlsm workbook is the register; "sqlite": the database is the
+    # register and the workbook is a generated export
+    "register_mode": "excel",
+    "excel_export_path": "",
+    # One register per site: [{"site": "Priolo", "path": "...\\database_RDA.xlsm"}].
+    # Empty list: only excel_path is synced
+    "registers": [],
+    # Opt-in SQL timing: statements slower than this many ms are written to
+    # Logs/slow_queries.log (0 = off)
+    "sql_slow_query_ms": 0,
+    # GUI reads from a local read-only copy of the database (refreshed when
+    # the data generation changes); db_replica_memory also loads it into RAM
+    "db_replica": True,
+    "db_replica_memory": False
 }
 
 def get_base_path():
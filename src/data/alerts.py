@@ -0,0 +1,74 @@
+"""
+Calcolo dei livelli di alert delle RDA (1 per ogni settimana trascorsa).
+Condiviso dal registro Excel e dal registro SQLite.
+"""
+
+from src.data.sync_rows import parse_cell_date
+
+
+def alert_level(rda_date, today):
+    """
+    Calcola il livello di alert di una RDA.
+    
+    Args:
+        rda_date: Data della RDA (datetime)
+        today: Data odierna a mezzanotte
+    
+    Returns:
+        int: Settimane trascorse (0 se meno di 7 giorni)
+    """
+    days_diff = (today - rda_date).days
+    return days_diff // 7 if days_diff >= 7 else 0
+
+
+def evaluate_alerts(rows, today):
+    """
+    Ricalcola gli alert delle righe del registro (colonne A:L).
+    
+    Args:
+        rows: Righe A:L (valori Excel o tuple del database)
+        today: Data odierna a mezzanotte
+    
+    Returns:
+        tuple: (livelli alert per riga, indici delle righe con alert
+                modificato, lista di dict con le RDA scadute non consegnate)
+    """
+    levels = []
+    changed_rows = []
+    overdue_items = []
+    
+    for i, row_val in enumerate(rows):
+        # Data RDA (colonna I)
+        rda_date = parse_cell_date(row_val[8])
+        
+        if not rda_date:
+            # Nessuna data: mantieni il valore alert esistente
+            levels.append(row_val[10])
+            continue
+        
+        level = alert_level(rda_date, today)
+        levels.append(level)
+        if row_val[10] is None or row_val[10] != level:
+            changed_rows.append(i)
+        
+        # Se scaduta, aggiungi alla lista
+        if level > 0:
+            # Controlla se già consegnata (colonna J)
+            delivery_date = parse_cell_date(row_val[9])
+            if delivery_date and delivery_date <= today:
+                continue  # Già consegnata, salta
+            
+            # Raccogli dati per email
+            overdue_items.append({
+                "N°RDA": row_val[0],
+                "Data RDA": rda_date.strftime('%d/%m/%Y'),
+                "Commessa": row_val[1],
+                "Descrizione Materiale": row_val[3],
+                "Unità di Misura": row_val[4],
+                "Quantità Richiesta": row_val[5],
+                "APF": row_val[6],
+                "richiesta da: (giorni)": (today - rda_date).days,
+                "Richiedente": row_val[11]
+            })
+    
+    return levels, changed_rows, overdue_items
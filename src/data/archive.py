@@ -0,0 +1,380 @@
+"""
+Archivi per anno: le righe degli anni chiusi vengono spostate dal database
+principale in un file per anno (database_RDA_<anno>.db), che resta
+interrogabile da solo, collegato con ATTACH o in parallelo agli altri.
+"""
+
+import os
+import re
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from src.data import database
+from src.data.database import (
+    get_connection, writer_lease, FTS_COLUMNS, _STORED_COLUMNS, _INSERT_SQL,
+    _UPDATE_SQL, _create_indexes, _fts_available, _refresh_derived, _stored_row
+)
+from src.utils.utils import to_iso_date
+from src.data.changelog import bump_generation
+
+logger = logging.getLogger("RDA_Bot")
+
+# Anni mantenuti nel database principale (anno in corso compreso): quelli
+# precedenti vengono spostati negli archivi per anno (database_RDA_<anno>.db)
+ARCHIVE_KEEP_YEARS = 2
+
+# Archivi letti contemporaneamente da query_archives
+ARCHIVE_WORKERS = 4
+
+# Database collegabili con ATTACH a una connessione (limite di SQLite)
+MAX_ATTACHED = 10
+
+
+def archive_path(year):
+    """File di archivio di un anno, accanto al database principale (es. database_RDA_2023.db)."""
+    base, ext = os.path.splitext(database.SQLITE_DB_PATH)
+    return f"{base}_{year}{ext}"
+
+
+@writer_lease.exclusive
+def archive_closed_years(today=None, keep_years=ARCHIVE_KEEP_YEARS):
+    """
+    Sposta negli archivi per anno le righe degli anni chiusi: nel database
+    principale restano le RDA degli ultimi keep_years anni (anno in corso
+    compreso) e quelle senza data RDA.
+    
+    Ogni anno viene prima copiato e confermato nel suo archivio, poi
+    eliminato dal database principale (testate, statistiche e indice di
+    ricerca seguono tramite i trigger): se il processo si interrompe tra i
+    due passi le righe restano in entrambi i file e l'archiviazione
+    successiva le ritrova. Le sincronizzazioni successive scrivono le
+    modifiche alle righe degli anni archiviati direttamente negli archivi.
+    
+    Args:
+        today: Data di riferimento (default oggi)
+        keep_years: Anni mantenuti nel database principale
+    
+    Returns:
+        dict: Anno -> numero di righe spostate
+    """
+    first_kept = (today or datetime.now()).year - keep_years + 1
+    moved = {}
+    
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT DISTINCT substr(data_rda_iso, 1, 4) FROM rda_data
+            WHERE data_rda_iso != '' AND data_rda_iso < ?
+        """, (f"{first_kept:04d}-01-01",))
+        for year in sorted(int(value) for (value,) in cursor.fetchall()):
+            moved[year] = _archive_year(conn, year)
+            logger.info(f"Anno {year} archiviato: {moved[year]} righe spostate in {archive_path(year)}")
+    finally:
+        conn.close()
+    
+    return moved
+
+
+def _archive_year(conn, year):
+    """
+    Copia le righe di un anno nel suo archivio, poi le elimina dal
+    database principale e registra l'anno in archive_year.
+    
+    Returns:
+        int: Righe eliminate dal database principale
+    """
+    path = archive_path(year)
+    bounds = (f"{year:04d}-01-01", f"{year + 1:04d}-01-01")
+    cursor = conn.cursor()
+    cursor.execute("ATTACH DATABASE ? AS archive", (path,))
+    
+    try:
+        # 1. Copia (le righe già presenti, da un'archiviazione interrotta, vengono ignorate)
+        cursor.execute("BEGIN TRANSACTION")
+        _create_archive_schema(cursor)
+        cursor.execute("PRAGMA archive.table_info(rda_data)")
+        columns = ", ".join(row[1] for row in cursor.fetchall())
+        cursor.execute(f"""
+            INSERT OR IGNORE INTO archive.rda_data ({columns})
+            SELECT {columns} FROM main.rda_data
+            WHERE data_rda_iso >= ? AND data_rda_iso < ?
+        """, bounds)
+        cursor.execute("SELECT 1 FROM archive.sqlite_master WHERE type = 'table' AND name = 'rda_fts'")
+        if cursor.fetchone():
+            cursor.execute("INSERT INTO archive.rda_fts (rda_fts) VALUES ('rebuild')")
+        cursor.execute("COMMIT")
+        
+        # 2. Eliminazione dal database principale
+        cursor.execute("BEGIN TRANSACTION")
+        cursor.execute("DELETE FROM main.rda_data WHERE data_rda_iso >= ? AND data_rda_iso < ?", bounds)
+        moved = cursor.rowcount
+        cursor.execute("SELECT COUNT(*) FROM archive.rda_data")
+        cursor.execute(
+            "INSERT OR REPLACE INTO main.archive_year (year, file_name, row_count) VALUES (?, ?, ?)",
+            (year, os.path.basename(path), cursor.fetchone()[0])
+        )
+        _refresh_derived(cursor)
+        bump_generation(cursor)
+        cursor.execute("COMMIT")
+    except Exception as e:
+        if conn.in_transaction:
+            cursor.execute("ROLLBACK")
+        logger.error(f"Errore durante l'archiviazione dell'anno {year}: {e}")
+        raise
+    finally:
+        cursor.execute("DETACH DATABASE archive")
+    
+    return moved
+
+
+def _create_archive_schema(cursor):
+    """
+    Crea nell'archivio collegato come "archive" la tabella rda_data (stessa
+    struttura del database principale), i suoi indici e l'indice di ricerca.
+    """
+    cursor.execute("SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = 'rda_data'")
+    sql = re.sub(r'^CREATE TABLE "?rda_data"?', "CREATE TABLE IF NOT EXISTS archive.rda_data", cursor.fetchone()[0])
+    cursor.execute(sql)
+    _create_indexes(cursor, "rda_data", schema="archive")
+    
+    if _fts_available(cursor):
+        cursor.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS archive.rda_fts USING fts5(
+                {", ".join(FTS_COLUMNS)}, content='rda_data', content_rowid='id', tokenize='trigram'
+            )
+        """)
+
+
+def archive_files(first_year=None, last_year=None):
+    """
+    Archivi registrati nel database principale, eventualmente limitati a
+    un intervallo di anni. Gli archivi mancanti su disco vengono segnalati
+    e saltati.
+    
+    Returns:
+        dict: Anno -> percorso del file, dal più vecchio
+    """
+    conn = get_connection()
+    try:
+        rows = conn.execute("SELECT year, file_name FROM archive_year ORDER BY year").fetchall()
+    finally:
+        conn.close()
+    
+    files = {}
+    for year, file_name in rows:
+        if (first_year and year < first_year) or (last_year and year > last_year):
+            continue
+        path = os.path.join(os.path.dirname(database.SQLITE_DB_PATH), file_name)
+        if os.path.exists(path):
+            files[year] = path
+        else:
+            logger.warning(f"Archivio dell'anno {year} non trovato: {path}")
+    return files
+
+
+def attach_archives(conn):
+    """
+    Collega alla connessione gli archivi (ATTACH come archive_<anno>) e
+    crea la vista temporanea rda_data_all: righe del database principale
+    e di tutti gli archivi (UNION ALL), per le query che attraversano gli
+    anni. SQLite collega al massimo MAX_ATTACHED database: oltre, restano
+    esclusi gli anni più vecchi.
+    
+    Args:
+        conn: Connessione al database principale, fuori da transazioni
+    
+    Returns:
+        list: Anni collegati
+    """
+    files = archive_files()
+    years = sorted(files)[-MAX_ATTACHED:]
+    if len(years) < len(files):
+        logger.warning(f"Collegati solo gli ultimi {MAX_ATTACHED} archivi su {len(files)}")
+    
+    attached = {row[1] for row in conn.execute("PRAGMA database_list").fetchall()}
+    columns = ", ".join(("id",) + _STORED_COLUMNS + ("row_key", "row_hash", "site"))
+    selects = [f"SELECT {columns} FROM main.rda_data"]
+    for year in years:
+        schema = f"archive_{year}"
+        if schema not in attached:
+            conn.execute(f"ATTACH DATABASE ? AS {schema}", (files[year],))
+        selects.append(f"SELECT {columns} FROM {schema}.rda_data")
+    
+    conn.execute("DROP VIEW IF EXISTS temp.rda_data_all")
+    conn.execute("CREATE TEMP VIEW rda_data_all AS " + " UNION ALL ".join(selects))
+    return years
+
+
+def detach_archives(conn):
+    """Scollega gli archivi collegati da attach_archives ed elimina la vista rda_data_all."""
+    conn.execute("DROP VIEW IF EXISTS temp.rda_data_all")
+    for row in conn.execute("PRAGMA database_list").fetchall():
+        if row[1].startswith("archive_"):
+            conn.execute(f"DETACH DATABASE {row[1]}")
+
+
+def query_archives(sql, params=(), first_year=None, last_year=None):
+    """
+    Esegue una query di lettura su ogni archivio dell'intervallo di anni,
+    con una connessione per file; con più archivi le query girano in
+    parallelo. La query vede le tabelle rda_data e rda_fts dell'archivio.
+    
+    Returns:
+        list: Righe (sqlite3.Row) di tutti gli archivi, dall'anno più recente
+    """
+    paths = [path for _, path in sorted(archive_files(first_year, last_year).items(), reverse=True)]
+    
+    def run(path):
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA query_only = ON")
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+    
+    if len(paths) <= 1:
+        results = [run(path) for path in paths]
+    else:
+        with ThreadPoolExecutor(max_workers=min(ARCHIVE_WORKERS, len(paths))) as executor:
+            results = list(executor.map(run, paths))
+    
+    return [row for rows in results for row in rows]
+
+
+def iter_archived_rows():
+    """
+    Scorre le righe di tutti gli archivi, dall'anno più vecchio e
+    nell'ordine del registro, senza caricarle in memoria.
+    
+    Yields:
+        sqlite3.Row: Righe archiviate
+    """
+    for path in archive_files().values():
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield from conn.execute("SELECT * FROM rda_data ORDER BY id")
+        finally:
+            conn.close()
+
+
+def _row_year(row):
+    """Anno (yyyy) della data RDA di una riga di sincronizzazione, "" se manca."""
+    return to_iso_date(row[8])[:4]
+
+
+class ArchivedRows:
+    """
+    Righe di una sincronizzazione che cadono negli anni archiviati: vengono
+    confrontate con l'archivio del proprio anno (per chiave riga e hash,
+    come nel database principale) e le differenze scritte nell'archivio.
+    
+    Le righe di un archivio assenti dal registro vengono eliminate solo se
+    il registro contiene almeno una riga dello stesso anno: un registro da
+    cui sono stati tolti gli anni chiusi non svuota gli archivi.
+    """
+    
+    def __init__(self, cursor, site):
+        """
+        Args:
+            cursor: Cursore sul database principale
+            site: Sede del registro sincronizzato
+        """
+        self.site = site
+        self.unchanged = 0
+        self._existing = {}  # anno -> {row_key: (id, row_hash)}
+        self._paths = {}
+        self._inserts = {}
+        self._updates = {}
+        self._seen = set()
+        self._ignored = {}   # anno senza file di archivio -> righe ignorate
+        
+        cursor.execute("SELECT year, file_name FROM archive_year")
+        for year, file_name in cursor.fetchall():
+            path = os.path.join(os.path.dirname(database.SQLITE_DB_PATH), file_name)
+            if not os.path.exists(path):
+                self._ignored[str(year)] = 0
+                continue
+            self._paths[str(year)] = path
+            conn = sqlite3.connect(path)
+            try:
+                self._existing[str(year)] = {
+                    row_key: (row_id, row_hash) for row_id, row_key, row_hash in conn.execute(
+                        "SELECT id, row_key, row_hash FROM rda_data WHERE site = ?", (site,)
+                    )
+                }
+            finally:
+                conn.close()
+    
+    def add(self, row_key, row_hash, row):
+        """
+        Confronta una riga del registro con l'archivio del suo anno.
+        
+        Returns:
+            bool: True se la riga è di un anno archiviato (non va scritta
+                  nel database principale)
+        """
+        year = _row_year(row)
+        if year in self._ignored:
+            self._ignored[year] += 1
+            return True
+        existing = self._existing.get(year)
+        if existing is None:
+            return False
+        
+        self._seen.add(year)
+        current = existing.pop(row_key, None)
+        if current is None:
+            self._inserts.setdefault(year, []).append(_stored_row(row) + (row_key, row_hash, self.site))
+        elif current[1] != row_hash:
+            self._updates.setdefault(year, []).append(_stored_row(row) + (row_hash, current[0]))
+        else:
+            self.unchanged += 1
+        return True
+    
+    def apply(self, cursor):
+        """
+        Scrive negli archivi le differenze raccolte e aggiorna il numero di
+        righe in archive_year (nella transazione del cursore).
+        
+        Returns:
+            int: Righe inserite, aggiornate o eliminate negli archivi
+        """
+        for year, count in self._ignored.items():
+            if count:
+                logger.warning(f"Archivio dell'anno {year} non trovato: {count} righe del registro ignorate")
+        for year in set(self._existing) - self._seen:
+            if self._existing[year]:
+                logger.warning(f"Nessuna riga del {year} nel registro: archivio lasciato invariato")
+        
+        changed = 0
+        for year in sorted(self._seen):
+            inserts = self._inserts.get(year, [])
+            updates = self._updates.get(year, [])
+            deletes = [(row_id,) for row_id, _ in self._existing[year].values()]
+            if not (inserts or updates or deletes):
+                continue
+            
+            conn = sqlite3.connect(self._paths[year])
+            try:
+                conn.executemany(_UPDATE_SQL, updates)
+                conn.executemany(_INSERT_SQL, inserts)
+                conn.executemany("DELETE FROM rda_data WHERE id = ?", deletes)
+                # L'indice di ricerca dell'archivio non ha trigger: si ricostruisce
+                if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rda_fts'").fetchone():
+                    conn.execute("INSERT INTO rda_fts (rda_fts) VALUES ('rebuild')")
+                row_count = conn.execute("SELECT COUNT(*) FROM rda_data").fetchone()[0]
+                conn.commit()
+            finally:
+                conn.close()
+            
+            cursor.execute("UPDATE archive_year SET row_count = ? WHERE year = ?", (row_count, int(year)))
+            changed += len(inserts) + len(updates) + len(deletes)
+            logger.info(
+                f"Archivio {year} aggiornato: {len(inserts)} inserite, "
+                f"{len(updates)} aggiornate, {len(deletes)} eliminate"
+            )
+        return changed
@@ -0,0 +1,120 @@
+"""
+Generazione dei dati e registro delle modifiche alle righe (rda_changes).
+Ogni scrittura che modifica rda_data incrementa la generazione in db_meta
+e i trigger annotano le righe toccate, così i lettori si aggiornano in modo
+incrementale. Le funzioni lavorano sul cursore della transazione di chi
+scrive o legge.
+"""
+
+# Generazioni conservate nel registro delle modifiche (rda_changes)
+CHANGELOG_RETENTION = 200
+
+# Oltre questo numero di modifiche changes_since chiede di ricaricare tutto
+CHANGES_LIMIT = 5000
+
+
+def create_changelog(cursor):
+    """
+    Crea rda_changes, il registro delle modifiche a rda_data: per ogni riga
+    inserita (I), modificata (U) o eliminata (D) l'id, la chiave e la
+    generazione che la scrittura pubblicherà. changes_floor in db_meta è la
+    prima generazione da cui il registro è completo.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS rda_changes (
+            seq INTEGER PRIMARY KEY,
+            generation INTEGER NOT NULL,
+            op TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            site TEXT,
+            row_key TEXT
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_changes_generation ON rda_changes(generation)")
+    cursor.execute("""
+        INSERT OR IGNORE INTO db_meta (key, value)
+        SELECT 'changes_floor', value FROM db_meta WHERE key = 'generation'
+    """)
+    create_change_triggers(cursor)
+
+
+def create_change_triggers(cursor):
+    """Crea i trigger che annotano in rda_changes le scritture su rda_data."""
+    next_generation = "(SELECT value + 1 FROM db_meta WHERE key = 'generation')"
+    for event, op, row in (("INSERT", "I", "new"), ("DELETE", "D", "old")):
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS rda_changes_{event.lower()} AFTER {event} ON rda_data BEGIN
+                INSERT INTO rda_changes (generation, op, row_id, site, row_key)
+                VALUES ({next_generation}, '{op}', {row}.id, {row}.site, {row}.row_key);
+            END
+        """)
+    # Solo se cambia il contenuto (row_hash), non per le colonne derivate
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS rda_changes_update AFTER UPDATE ON rda_data
+        WHEN old.row_hash IS NOT new.row_hash OR old.site IS NOT new.site BEGIN
+            INSERT INTO rda_changes (generation, op, row_id, site, row_key)
+            VALUES ({next_generation}, 'U', new.id, new.site, new.row_key);
+        END
+    """)
+
+
+def bump_generation(cursor):
+    """
+    Incrementa la generazione dei dati (da chiamare nella transazione di
+    scrittura) ed elimina dal registro delle modifiche le generazioni
+    oltre CHANGELOG_RETENTION.
+    """
+    cursor.execute("UPDATE db_meta SET value = value + 1 WHERE key = 'generation'")
+    floor = read_generation(cursor) - CHANGELOG_RETENTION
+    cursor.execute("SELECT value FROM db_meta WHERE key = 'changes_floor'")
+    row = cursor.fetchone()
+    if row is not None and row[0] < floor:
+        set_changes_floor(cursor, floor)
+
+
+def set_changes_floor(cursor, floor):
+    """Elimina le modifiche precedenti alla generazione floor e la registra come prima disponibile."""
+    cursor.execute("DELETE FROM rda_changes WHERE generation <= ?", (floor,))
+    cursor.execute("UPDATE db_meta SET value = ? WHERE key = 'changes_floor'", (floor,))
+
+
+def read_changes(cursor, generation, limit=CHANGES_LIMIT):
+    """
+    Come database.changes_since, sul database del cursore (es. una copia locale).
+    """
+    current = read_generation(cursor)
+    cursor.execute("SELECT value FROM db_meta WHERE key = 'changes_floor'")
+    row = cursor.fetchone()
+    if row is None or generation < row[0] or generation > current:
+        return None
+    
+    cursor.execute("""
+        SELECT op, row_id, site, row_key FROM rda_changes
+        WHERE generation > ? AND generation <= ?
+        ORDER BY seq
+        LIMIT ?
+    """, (generation, current, limit + 1))
+    entries = cursor.fetchall()
+    
+    if len(entries) > limit:
+        return None
+    
+    changes = {}  # row_id -> (primo op, ultimo op, site, row_key)
+    for op, row_id, site, row_key in entries:
+        first = changes[row_id][0] if row_id in changes else op
+        changes[row_id] = (first, op, site, row_key)
+    
+    result = []
+    for row_id, (first, last, site, row_key) in changes.items():
+        if first == "I" and last == "D":
+            continue
+        op = "I" if first == "I" else "D" if last == "D" else "U"
+        result.append({'op': op, 'id': row_id, 'site': site, 'row_key': row_key})
+    return current, result
+
+
+def read_generation(cursor):
+    """Generazione dei dati letta con il cursore indicato."""
+    cursor.execute("SELECT value FROM db_meta WHERE key = 'generation'")
+    row = cursor.fetchone()
+    return row[0] if row else 0
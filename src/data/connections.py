@@ -0,0 +1,191 @@
+"""
+Connessioni SQLite riutilizzate: una per thread e per file database
+"""
+
+import atexit
+import sqlite3
+import logging
+import threading
+from src.data import sql_metrics
+
+logger = logging.getLogger("RDA_Bot")
+
+# Pragma per database su disco locale: WAL e mmap riducono I/O e attese
+LOCAL_PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("cache_size", -20000),        # ~20 MB
+    ("mmap_size", 268435456),      # 256 MB
+    ("temp_store", "MEMORY"),
+)
+
+# Pragma per database su condivisione di rete: WAL e mmap non sono sicuri
+# su SMB, quindi si punta su una cache di pagine più grande
+NETWORK_PRAGMAS = (
+    ("journal_mode", "DELETE"),
+    ("synchronous", "FULL"),
+    ("cache_size", -50000),        # ~50 MB
+    ("mmap_size", 0),
+    ("temp_store", "MEMORY"),
+)
+
+# Pragma per le copie locali di sola lettura (replica.DatabaseReplica):
+# nessun journal da impostare, cache e mmap ampi sul file immutabile
+READ_ONLY_PRAGMAS = (
+    ("cache_size", -50000),        # ~50 MB
+    ("mmap_size", 268435456),      # 256 MB
+    ("temp_store", "MEMORY"),
+    ("query_only", "ON"),
+)
+
+_local = threading.local()
+_lock = threading.Lock()
+_registry = []  # (thread, percorso, connessione) di tutte le connessioni aperte
+_open_count = 0
+
+
+class PooledConnection(sqlite3.Connection):
+    """
+    Connessione condivisa tra le chiamate dello stesso thread.
+    close() non chiude la connessione ma annulla eventuali transazioni
+    rimaste aperte, così il codice esistente (connect/close per chiamata)
+    continua a funzionare senza riaprire il file ogni volta.
+    """
+    
+    def cursor(self, factory=None):
+        # Con la misura dei tempi SQL attiva (sql_metrics) le query passano
+        # da un cursore strumentato
+        if factory is None and sql_metrics.active is not None:
+            sql_metrics.install(self)
+            factory = sql_metrics.InstrumentedCursor
+        return super().cursor(factory) if factory else super().cursor()
+    
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+    
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+    
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+    
+    def close_for_real(self):
+        """Chiude davvero la connessione."""
+        super().close()
+
+
+def is_network_path(path):
+    """True se il percorso è su una condivisione di rete (UNC)."""
+    return path.startswith("\\\\") or path.startswith("//")
+
+
+def _apply_pragmas(conn, path, read_only=False):
+    """Imposta i pragma adatti al tipo di archiviazione del database."""
+    if read_only:
+        pragmas = READ_ONLY_PRAGMAS
+    else:
+        pragmas = NETWORK_PRAGMAS if is_network_path(path) else LOCAL_PRAGMAS
+    for name, value in pragmas:
+        try:
+            conn.execute(f"PRAGMA {name} = {value}")
+        except sqlite3.DatabaseError as e:
+            logger.warning(f"Pragma {name} non applicato: {e}")
+
+
+def _is_closed(conn):
+    """True se la connessione è stata chiusa (es. da close_all)."""
+    try:
+        conn.total_changes
+        return False
+    except sqlite3.ProgrammingError:
+        return True
+
+
+def _prune_dead_threads():
+    """Chiude le connessioni dei thread terminati (da chiamare con _lock)."""
+    alive = []
+    for thread, path, conn in _registry:
+        if thread.is_alive():
+            alive.append((thread, path, conn))
+        else:
+            conn.close_for_real()
+    _registry[:] = alive
+
+
+def get_pooled_connection(path, read_only=False):
+    """
+    Restituisce la connessione del thread corrente al database indicato,
+    aprendola (con i pragma) solo al primo utilizzo.
+    
+    Args:
+        path: Percorso del file SQLite, oppure URI "file:" con read_only
+        read_only: Se True path è un URI di sola lettura (es. mode=ro)
+    
+    Returns:
+        PooledConnection: Connessione con row_factory sqlite3.Row
+    """
+    global _open_count
+    
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    
+    conn = connections.get(path)
+    if conn is not None and not _is_closed(conn):
+        if conn.in_transaction:
+            conn.rollback()  # Transazione lasciata aperta da un errore precedente
+        return conn
+    
+    conn = sqlite3.connect(path, check_same_thread=False, factory=PooledConnection, uri=read_only)
+    conn.row_factory = sqlite3.Row
+    _apply_pragmas(conn, path, read_only)
+    connections[path] = conn
+    
+    with _lock:
+        _prune_dead_threads()
+        _registry.append((threading.current_thread(), path, conn))
+        _open_count += 1
+    
+    return conn
+
+
+def close_path(path):
+    """
+    Chiude le connessioni di tutti i thread al database indicato (es. una
+    copia locale non più in uso). Un thread che la richiede di nuovo
+    ottiene una connessione nuova.
+    """
+    with _lock:
+        remaining = []
+        for thread, conn_path, conn in _registry:
+            if conn_path == path:
+                try:
+                    conn.close_for_real()
+                except sqlite3.Error as e:
+                    logger.warning(f"Errore chiusura connessione database: {e}")
+            else:
+                remaining.append((thread, conn_path, conn))
+        _registry[:] = remaining
+
+
+def get_open_count():
+    """Numero di connessioni aperte dal processo (per diagnostica)."""
+    return _open_count
+
+
+def close_all():
+    """Chiude tutte le connessioni aperte, di qualsiasi thread."""
+    with _lock:
+        for _, _, conn in _registry:
+            try:
+                conn.close_for_real()
+            except sqlite3.Error as e:
+                logger.warning(f"Errore chiusura connessione database: {e}")
+        _registry.clear()
+    
+    # Le connessioni degli altri thread verranno riaperte al prossimo uso
+    _local.connections = {}
+
+
+atexit.register(close_all)
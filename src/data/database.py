@@ -2,17 +2,138 @@
 Modulo per la gestione del database SQLite
 """
 
-import sqlite3
 import logging
 import os
+import re
+import sqlite3
+import hashlib
+import uuid
+from datetime import datetime, timedelta
+from itertools import islice
 from src.utils.config import SQLITE_DB_PATH, DATABASE_DIR
+from src.data.connections import get_pooled_connection
+from src.data.query_cache import QueryCache
+from src.data.writer import WriterLease, create_lease_table
+from src.data.changelog import (
+    CHANGES_LIMIT, create_changelog, read_generation, bump_generation, set_changes_floor, read_changes
+)
+from src.data.alerts import alert_level
+from src.utils.utils import to_iso_date
 
 logger = logging.getLogger("RDA_Bot")
 
+# Colonne dati di rda_data nell'ordine delle tuple di sincronizzazione
+DATA_COLUMNS = (
+    "rda_number", "commessa", "descrizione_1", "descrizione_materiale",
+    "unita_misura", "quantita", "apf", "pdf_path", "data_rda",
+    "data_consegna", "alert_level", "richiedente"
+)
+
+# Righe scritte per ogni executemany durante la sincronizzazione
+WRITE_BATCH_SIZE = 1000
+
+# Sede delle righe quando è configurato un solo registro
+DEFAULT_SITE = ""
+
+# Date in formato ISO (yyyy-mm-dd) derivate da data_rda e data_consegna,
+# usate per ordinamenti e intervalli ("" se la data non è interpretabile)
+ISO_DATE_COLUMNS = ("data_rda_iso", "data_consegna_iso")
+
+_STORED_COLUMNS = DATA_COLUMNS + ISO_DATE_COLUMNS
+
+# Colonne di testo indicizzate per la ricerca (tabella FTS5 rda_fts)
+FTS_COLUMNS = (
+    "rda_number", "commessa", "descrizione_1", "descrizione_materiale",
+    "apf", "richiedente"
+)
+
+# Tabelle ricostruite da replace_all_data e pubblicate insieme
+# (i richiedenti prima delle testate che li referenziano)
+_SWAP_TABLES = ("rda_data", "rda_fts", "requester", "rda_header", "stat_summary")
+
+# Indici per tabella: (nome, colonne, univoco). Gli indici creati da
+# replace_all_data hanno il suffisso della generazione (es. idx_rda_number_g12)
+_INDEXES = {
+    "rda_data": (
+        ("idx_rda_number", "(rda_number)", False),
+        # Ordinamento per numero RDA della paginazione (pagination._NULLABLE_KEYS)
+        ("idx_page_rda_number", "(IFNULL(rda_number, ''))", False),
+        ("idx_richiedente", "(richiedente)", False),
+        ("idx_data_rda", "(data_rda)", False),
+        ("idx_alert_level", "(alert_level)", False),
+        ("idx_data_rda_iso", "(data_rda_iso)", False),
+        ("idx_data_consegna_iso", "(data_consegna_iso)", False),
+        # RDA aperte (con data): indice parziale per l'elenco delle scadute
+        ("idx_open_rda", "(data_rda_iso, data_consegna_iso) WHERE data_rda_iso != ''", False),
+        ("idx_site_rda_number", "(site, rda_number)", False),
+        # La chiave riga è univoca per sede
+        ("idx_site_row_key", "(site, row_key)", True),
+        # Righe precedenti alla chiave riga (vuoto dopo la prima sync): evita
+        # la scansione completa in "site = ? OR row_key IS NULL"
+        ("idx_legacy_rows", "(row_key) WHERE row_key IS NULL", False),
+    ),
+    "rda_header": (
+        ("idx_header_requester", "(requester_id)", False),
+        ("idx_header_alert_level", "(alert_level)", False),
+        ("idx_header_data_rda_iso", "(data_rda_iso)", False),
+    ),
+    "stat_summary": (
+        ("idx_stat_summary_cnt", "(stat, cnt)", False),
+    ),
+}
+
+# Nomi effettivi delle tabelle pubblicate (vedi _insert_headers)
+_LIVE_TABLES = {table: table for table in _SWAP_TABLES}
+
+# Statistiche pre-aggregate in stat_summary, aggiornate da trigger:
+# (nome, chiave, conteggio, quantità) come espressioni SQL sulla riga {r}
+# Gli alert dipendono dalla data odierna: si contano righe e testate per
+# giorno della RDA e il livello viene calcolato in lettura
+_LINE_STATS = (
+    ("rows", "''", "1", "0"),
+    ("apf", "IFNULL({r}.apf, '')", "1", "0"),
+    ("day", "IFNULL({r}.data_rda_iso, '')", "1", "0"),
+    ("material", "IFNULL({r}.descrizione_materiale, '')", "1", "IFNULL({r}.quantita, 0)"),
+)
+_HEADER_STATS = (
+    ("rda", "''", "1", "0"),
+    ("rda_day", "IFNULL({r}.data_rda_iso, '')", "1", "0"),
+    ("requester", "IFNULL({r}.requester_id, '')", "1", "0"),
+    ("month", "IFNULL(substr({r}.data_rda_iso, 1, 7), '')", "1", "0"),
+)
+
+# Firma delle statistiche: se cambia, stat_summary e trigger vengono ricreati
+_STATS_SIGNATURE = hashlib.sha1(repr((_LINE_STATS, _HEADER_STATS)).encode("utf-8")).hexdigest()
+
+# Il tokenizer trigram indicizza sottostringhe di almeno 3 caratteri:
+# i testi più corti vengono cercati con LIKE
+FTS_MIN_LENGTH = 3
+
+# Risultati delle letture (get_all_rows, search_rda, get_statistics),
+# validi finché il database non cambia
+query_cache = QueryCache()
+
+# Ruolo di scrittore unico: le funzioni che modificano le righe lo detengono
+# per tutta la scrittura, così bot, sync manuali e GUI non si contendono il
+# lock di SQLite (get_connection è risolta alla chiamata)
+writer_lease = WriterLease(lambda: get_connection())
+
+_INSERT_SQL = f"""
+    INSERT INTO rda_data ({", ".join(_STORED_COLUMNS)}, row_key, row_hash, site)
+    VALUES ({", ".join(["?"] * (len(_STORED_COLUMNS) + 3))})
+"""
+
+_UPDATE_SQL = f"""
+    UPDATE rda_data SET {", ".join(f"{col} = ?" for col in _STORED_COLUMNS)}, row_hash = ?
+    WHERE id = ?
+"""
+
 
 def get_connection():
     """
-    Ottiene una connessione al database SQLite.
+    Ottiene la connessione al database SQLite del thread corrente.
+    La connessione viene aperta una sola volta per thread e riutilizzata:
+    close() la restituisce al pool (vedi connections.PooledConnection).
     Crea il file database se non esiste.
     """
     try:
@@ -20,9 +141,7 @@ def get_connection():
         if not os.path.exists(DATABASE_DIR):
             os.makedirs(DATABASE_DIR)
         
-        conn = sqlite3.connect(SQLITE_DB_PATH, check_same_thread=False)
-        conn.row_factory = sqlite3.Row
-        return conn
+        return get_pooled_connection(SQLITE_DB_PATH)
     except Exception as e:
         logger.error(f"Errore connessione database: {e}")
         raise
@@ -31,10 +150,15 @@ def get_connection():
 def init_db():
     """
     Inizializza il database creando le tabelle necessarie.
-    Sicuro da chiamare più volte (CREATE IF NOT EXISTS).
+    Sicuro da chiamare più volte (CREATE IF NOT EXISTS). Se la struttura o
+    i dati derivati cambiano (migrazioni, statistiche ricalcolate) la
+    generazione dei dati viene incrementata, così le copie locali e i
+    lettori incrementali si aggiornano.
     """
     conn = get_connection()
     cursor = conn.cursor()
+    cursor.execute("PRAGMA schema_version")
+    schema_version = cursor.fetchone()[0]
     
     # Tabella principale RDA
     cursor.execute("""
@@ -56,67 +180,993 @@ def init_db():
         )
     """)
     
+    # Migrazione: chiave stabile e hash contenuto per la sync incrementale
+    _add_column_if_missing(cursor, "rda_data", "row_key", "TEXT")
+    _add_column_if_missing(cursor, "rda_data", "row_hash", "TEXT")
+    
+    # Migrazione: sede del registro di provenienza (più registri nello stesso DB)
+    _add_column_if_missing(cursor, "rda_data", "site", "TEXT NOT NULL DEFAULT ''")
+    
+    # Migrazione: date ISO per ordinamenti e intervalli sugli indici
+    for column in ISO_DATE_COLUMNS:
+        _add_column_if_missing(cursor, "rda_data", column, "TEXT")
+    changed = _backfill_iso_dates(cursor) > 0
+    
     # Indici per migliorare le performance delle query
+    # (la chiave riga, prima univoca su tutta la tabella, ora lo è per sede)
+    cursor.execute("DROP INDEX IF EXISTS idx_row_key")
+    _create_indexes(cursor, "rda_data")
+    
+    # Metadati del database (generazione dei dati, ecc.)
     cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_rda_number ON rda_data(rda_number)
-    """)
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_richiedente ON rda_data(richiedente)
+        CREATE TABLE IF NOT EXISTS db_meta (
+            key TEXT PRIMARY KEY,
+            value
+        )
     """)
+    cursor.execute("INSERT OR IGNORE INTO db_meta (key, value) VALUES ('generation', 0)")
+    # Identità del file: cambia se il database viene ricreato (vedi replica)
+    cursor.execute("INSERT OR IGNORE INTO db_meta (key, value) VALUES ('db_id', ?)", (uuid.uuid4().hex,))
+    
+    # Registro delle modifiche alle righe per i lettori incrementali
+    create_changelog(cursor)
+    
+    # Ricerca testuale: indice FTS5 trigram allineato da trigger
+    _create_fts(cursor)
+    
+    # Testate RDA e richiedenti derivati dalle righe (statistiche per RDA)
+    _create_headers(cursor)
+    
+    # Statistiche pre-aggregate per dashboard e GUI
+    changed = _create_statistics(cursor) or changed
+    
+    # Alert calcolati sulla data odierna e righe collegate alle testate
+    _create_views(cursor)
+    
+    # Anni chiusi spostati negli archivi (vedi archive_closed_years)
     cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_data_rda ON rda_data(data_rda)
+        CREATE TABLE IF NOT EXISTS archive_year (
+            year INTEGER PRIMARY KEY,
+            file_name TEXT NOT NULL,
+            row_count INTEGER NOT NULL DEFAULT 0,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
     """)
+    
+    # Lease dello scrittore unico (vedi writer.WriterLease)
+    create_lease_table(cursor)
+    
+    # Stato dell'ultima sincronizzazione per ogni registro Excel
     cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_alert_level ON rda_data(alert_level)
+        CREATE TABLE IF NOT EXISTS sync_state (
+            source TEXT PRIMARY KEY,
+            file_size INTEGER,
+            file_mtime REAL,
+            content_hash TEXT,
+            synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
     """)
     
+    cursor.execute("PRAGMA schema_version")
+    if changed or cursor.fetchone()[0] != schema_version:
+        # Le modifiche delle migrazioni non passano dal registro delle
+        # modifiche: chi legge in modo incrementale deve ricaricare tutto
+        bump_generation(cursor)
+        set_changes_floor(cursor, read_generation(cursor))
+    
     conn.commit()
     conn.close()
     logger.info("Database inizializzato correttamente")
 
 
-def replace_all_data(rows):
+def _add_column_if_missing(cursor, table, column, definition):
+    """Aggiunge una colonna alla tabella se non esiste già."""
+    cursor.execute(f"PRAGMA table_info({table})")
+    if column not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def _create_indexes(cursor, table, target=None, suffix="", schema="main"):
+    """
+    Crea gli indici di _INDEXES[table] che mancano sulla tabella target
+    (default table) del database schema (main o un archivio collegato).
+    Un indice conta come presente anche con il suffisso di generazione
+    aggiunto da replace_all_data.
+    """
+    target = target or table
+    cursor.execute(f"SELECT name FROM {schema}.sqlite_master WHERE type = 'index' AND tbl_name = ?", (target,))
+    existing = {re.sub(r"_g\d+$", "", name) for (name,) in cursor.fetchall()}
+    for name, columns, unique in _INDEXES[table]:
+        if name not in existing:
+            cursor.execute(
+                f"CREATE {'UNIQUE ' if unique else ''}INDEX {schema}.{name}{suffix} ON {target} {columns}"
+            )
+
+
+def _create_fts(cursor):
+    """
+    Crea l'indice FTS5 rda_fts sulle colonne FTS_COLUMNS e i trigger che lo
+    mantengono allineato a rda_data. L'indice viene popolato alla creazione.
+    Se SQLite non include FTS5 la ricerca continua a usare LIKE.
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rda_fts'")
+    if cursor.fetchone():
+        return
+    
+    columns = ", ".join(FTS_COLUMNS)
+    try:
+        cursor.execute(f"""
+            CREATE VIRTUAL TABLE rda_fts USING fts5(
+                {columns}, content='rda_data', content_rowid='id', tokenize='trigram'
+            )
+        """)
+    except sqlite3.OperationalError as e:
+        logger.warning(f"Ricerca FTS5 non disponibile, uso LIKE: {e}")
+        return
+    
+    _create_fts_triggers(cursor)
+    cursor.execute("INSERT INTO rda_fts (rda_fts) VALUES ('rebuild')")
+    logger.info("Indice di ricerca testuale creato")
+
+
+def _create_fts_triggers(cursor):
+    """Crea i trigger che allineano rda_fts alle scritture su rda_data."""
+    columns = ", ".join(FTS_COLUMNS)
+    new_values = ", ".join(f"new.{col}" for col in FTS_COLUMNS)
+    old_values = ", ".join(f"old.{col}" for col in FTS_COLUMNS)
+    
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS rda_fts_insert AFTER INSERT ON rda_data BEGIN
+            INSERT INTO rda_fts (rowid, {columns}) VALUES (new.id, {new_values});
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS rda_fts_delete AFTER DELETE ON rda_data BEGIN
+            INSERT INTO rda_fts (rda_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+        END
+    """)
+    # Solo se cambia un testo indicizzato: l'aggiornamento degli alert
+    # (che riscrive tutte le colonne) non tocca l'indice
+    changed = " OR ".join(f"old.{col} IS NOT new.{col}" for col in FTS_COLUMNS)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS rda_fts_update AFTER UPDATE OF {columns} ON rda_data
+        WHEN {changed} BEGIN
+            INSERT INTO rda_fts (rda_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO rda_fts (rowid, {columns}) VALUES (new.id, {new_values});
+        END
+    """)
+
+
+def _create_headers(cursor):
+    """
+    Crea le tabelle derivate da rda_data:
+    - rda_header: una riga per RDA e sede (data, richiedente e PDF della
+      prima riga, alert massimo, numero di righe)
+    - requester: richiedenti distinti, referenziati dalle testate
+    
+    I trigger annotano in rda_header_pending le RDA toccate da ogni
+    scrittura; _refresh_headers ricalcola solo quelle.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS requester (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+    """)
+    
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rda_header'")
+    created = cursor.fetchone() is None
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS rda_header (
+            id INTEGER PRIMARY KEY,
+            site TEXT NOT NULL,
+            rda_number TEXT NOT NULL,
+            data_rda TEXT,
+            data_rda_iso TEXT,
+            requester_id INTEGER REFERENCES requester(id),
+            pdf_path TEXT,
+            alert_level INTEGER,
+            line_count INTEGER NOT NULL,
+            UNIQUE (site, rda_number)
+        )
+    """)
+    _create_indexes(cursor, "rda_header")
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS rda_header_pending (
+            site TEXT NOT NULL,
+            rda_number TEXT NOT NULL,
+            PRIMARY KEY (site, rda_number)
+        ) WITHOUT ROWID
+    """)
+    _create_header_triggers(cursor)
+    
+    if created:
+        cursor.execute("""
+            INSERT OR IGNORE INTO rda_header_pending (site, rda_number)
+            SELECT DISTINCT site, rda_number FROM rda_data WHERE rda_number IS NOT NULL
+        """)
+        refreshed = _refresh_headers(cursor)
+        if refreshed:
+            logger.info(f"Testate RDA calcolate: {refreshed}")
+
+
+def _create_header_triggers(cursor):
+    """Crea i trigger che annotano in rda_header_pending le RDA modificate."""
+    mark_new = """
+        INSERT OR IGNORE INTO rda_header_pending (site, rda_number)
+        SELECT new.site, new.rda_number WHERE new.rda_number IS NOT NULL;
+    """
+    mark_old = mark_new.replace("new.", "old.")
+    header_columns = ("site", "rda_number", "data_rda", "richiedente", "pdf_path", "alert_level")
+    changed = " OR ".join(f"old.{col} IS NOT new.{col}" for col in header_columns)
+    
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS rda_header_insert AFTER INSERT ON rda_data BEGIN
+            {mark_new}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS rda_header_delete AFTER DELETE ON rda_data BEGIN
+            {mark_old}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS rda_header_update AFTER UPDATE ON rda_data
+        WHEN {changed} BEGIN
+            {mark_old}
+            {mark_new}
+        END
+    """)
+
+
+def _create_views(cursor):
+    """
+    Crea le viste su rda_data:
+    - rda_alert: giorni trascorsi e livello di alert sulla data odierna
+    - rda_line: righe articolo collegate alla propria testata
+    """
+    days_sql, level_sql = _alert_columns("date('now', 'localtime')")
+    cursor.execute(f"""
+        CREATE VIEW IF NOT EXISTS rda_alert AS
+        SELECT id, site, rda_number, data_rda, data_rda_iso, data_consegna_iso,
+               {days_sql} AS days_elapsed, {level_sql} AS alert_level
+        FROM rda_data
+    """)
+    cursor.execute("""
+        CREATE VIEW IF NOT EXISTS rda_line AS
+        SELECT d.id, h.id AS header_id, d.row_key, d.commessa, d.descrizione_1,
+               d.descrizione_materiale, d.unita_misura, d.quantita, d.apf,
+               d.data_consegna, d.data_consegna_iso
+        FROM rda_data d JOIN rda_header h ON h.site = d.site AND h.rda_number = d.rda_number
+    """)
+
+
+def _refresh_headers(cursor):
+    """
+    Ricalcola le testate delle RDA modificate (da chiamare nella transazione
+    di scrittura, dopo le modifiche a rda_data).
+    
+    Returns:
+        int: Numero di RDA ricalcolate
+    """
+    cursor.execute("SELECT COUNT(*) FROM rda_header_pending")
+    pending = cursor.fetchone()[0]
+    if not pending:
+        return 0
+    
+    cursor.execute("""
+        DELETE FROM rda_header
+        WHERE (site, rda_number) IN (SELECT site, rda_number FROM rda_header_pending)
+    """)
+    _insert_headers(cursor, """
+        WITH grouped AS (
+            SELECT d.site, d.rda_number, MIN(d.id) AS first_id,
+                   MAX(d.alert_level) AS alert_level, COUNT(*) AS line_count
+            FROM rda_header_pending p
+            JOIN {rda_data} d ON d.site = p.site AND d.rda_number = p.rda_number
+            GROUP BY d.site, d.rda_number
+        )
+    """, _LIVE_TABLES)
+    
+    # Richiedenti non più referenziati da nessuna testata
+    cursor.execute("""
+        DELETE FROM requester
+        WHERE NOT EXISTS (SELECT 1 FROM rda_header WHERE requester_id = requester.id)
+    """)
+    cursor.execute("DELETE FROM rda_header_pending")
+    return pending
+
+
+def _insert_headers(cursor, grouped, tables):
     """
-    Sostituisce tutti i dati nella tabella con le righe fornite.
-    Operazione atomica con transazione.
+    Inserisce richiedenti e testate dei gruppi di righe della CTE grouped
+    (site, rda_number, first_id, alert_level, line_count).
     
     Args:
-        rows: Lista di tuple con i dati (escludendo ID e created_at)
+        cursor: Cursore nella transazione di scrittura
+        grouped: CTE dei gruppi, con {rda_data} al posto del nome della tabella
+        tables: Nome effettivo di ogni tabella (pubblicata o di appoggio)
     """
-    if not rows:
-        logger.warning("Nessun dato da inserire")
-        return
+    cursor.execute((grouped + """
+        INSERT OR IGNORE INTO {requester} (name)
+        SELECT f.richiedente FROM grouped g JOIN {rda_data} f ON f.id = g.first_id
+        WHERE f.richiedente IS NOT NULL AND f.richiedente != ''
+    """).format(**tables))
+    cursor.execute((grouped + """
+        INSERT INTO {rda_header} (
+            site, rda_number, data_rda, data_rda_iso, requester_id,
+            pdf_path, alert_level, line_count
+        )
+        SELECT g.site, g.rda_number, f.data_rda, f.data_rda_iso,
+               (SELECT id FROM {requester} WHERE name = f.richiedente),
+               f.pdf_path, g.alert_level, g.line_count
+        FROM grouped g JOIN {rda_data} f ON f.id = g.first_id
+    """).format(**tables))
+
+
+def _stat_upserts(stats, row, sign):
+    """Istruzioni che sommano (sign "") o sottraggono (sign "-") una riga alle statistiche."""
+    return "\n".join(
+        f"""
+            INSERT INTO stat_summary (stat, key, cnt, qty)
+            VALUES ('{name}', {key.format(r=row)}, {sign}({cnt.format(r=row)}), {sign}({qty.format(r=row)}))
+            ON CONFLICT (stat, key) DO UPDATE SET cnt = cnt + excluded.cnt, qty = qty + excluded.qty;
+        """
+        for name, key, cnt, qty in stats
+    )
+
+
+def _create_statistics(cursor):
+    """
+    Crea stat_summary, con i conteggi per statistica e chiave (righe per
+    APF, giorno e materiale; testate per giorno, richiedente e mese), e i
+    trigger che la aggiornano in modo incrementale a ogni scrittura di
+    rda_data e rda_header. Alla creazione viene calcolata sui dati esistenti.
+    
+    Returns:
+        bool: True se stat_summary è stata ricalcolata
+    """
+    cursor.execute("SELECT value FROM db_meta WHERE key = 'stats_signature'")
+    row = cursor.fetchone()
+    created = row is None or row[0] != _STATS_SIGNATURE
+    if created:
+        # Statistiche assenti o di una versione precedente: si ricalcolano
+        cursor.execute("DROP TABLE IF EXISTS stat_summary")
+        for table in ("rda_data", "rda_header"):
+            for event in ("insert", "delete", "update"):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {table}_stats_{event}")
+        cursor.execute(
+            "INSERT OR REPLACE INTO db_meta (key, value) VALUES ('stats_signature', ?)",
+            (_STATS_SIGNATURE,)
+        )
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stat_summary (
+            stat TEXT NOT NULL,
+            key NOT NULL,
+            cnt INTEGER NOT NULL,
+            qty REAL NOT NULL,
+            PRIMARY KEY (stat, key)
+        ) WITHOUT ROWID
+    """)
+    _create_indexes(cursor, "stat_summary")
+    _create_stat_triggers(cursor)
+    
+    if created:
+        _fill_statistics(cursor, _LIVE_TABLES)
+        logger.info("Statistiche calcolate")
+    return created
+
+
+def _create_stat_triggers(cursor):
+    """Crea i trigger che aggiornano stat_summary dalle scritture su rda_data e rda_header."""
+    line_columns = "apf, data_rda_iso, descrizione_materiale, quantita"
+    header_columns = "data_rda_iso, requester_id"
+    for table, stats, columns in (
+        ("rda_data", _LINE_STATS, line_columns),
+        ("rda_header", _HEADER_STATS, header_columns)
+    ):
+        changed = " OR ".join(f"old.{col} IS NOT new.{col}" for col in columns.split(", "))
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_stats_insert AFTER INSERT ON {table} BEGIN
+                {_stat_upserts(stats, "new", "")}
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_stats_delete AFTER DELETE ON {table} BEGIN
+                {_stat_upserts(stats, "old", "-")}
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_stats_update AFTER UPDATE OF {columns} ON {table}
+            WHEN {changed} BEGIN
+                {_stat_upserts(stats, "old", "-")}
+                {_stat_upserts(stats, "new", "")}
+            END
+        """)
+
+
+def _fill_statistics(cursor, tables):
+    """
+    Calcola da zero stat_summary (vuota) dalle righe e dalle testate.
+    
+    Args:
+        cursor: Cursore nella transazione di scrittura
+        tables: Nome effettivo di ogni tabella (pubblicata o di appoggio)
+    """
+    for table, stats in (("rda_data", _LINE_STATS), ("rda_header", _HEADER_STATS)):
+        for name, key, cnt, qty in stats:
+            cursor.execute(f"""
+                INSERT INTO {tables['stat_summary']} (stat, key, cnt, qty)
+                SELECT '{name}', {key.format(r="r")}, SUM({cnt.format(r="r")}), SUM({qty.format(r="r")})
+                FROM {tables[table]} AS r GROUP BY 2
+            """)
+
+
+def _refresh_derived(cursor):
+    """
+    Aggiorna le tabelle derivate da rda_data (da chiamare nella transazione
+    di scrittura, dopo le modifiche): testate delle RDA toccate e pulizia
+    delle statistiche rimaste a zero.
+    """
+    _refresh_headers(cursor)
+    cursor.execute("DELETE FROM stat_summary WHERE cnt = 0")
+
+
+def read_statistics(cursor, top_requesters=None, today=None):
+    """
+    Legge le statistiche pre-aggregate da stat_summary.
+    
+    Args:
+        cursor: Cursore sul database da interrogare
+        top_requesters: Numero massimo di richiedenti (None = tutti)
+        today: Data di riferimento per gli alert (default oggi)
+    
+    Returns:
+        dict: total_rda, total_rows, overdue_rda, by_requester, by_month
+              (ultimi 12 mesi, etichetta mm/yyyy), by_apf, by_alert
+              (righe per livello, None senza data), top_materials
+    """
+    today = _midnight(today)
+    def counter(stat):
+        cursor.execute("SELECT cnt FROM stat_summary WHERE stat = ? AND key = ''", (stat,))
+        row = cursor.fetchone()
+        return row[0] if row else 0
+    
+    stats = {
+        'total_rda': counter('rda'),
+        'total_rows': counter('rows'),
+    }
+    
+    # RDA con alert attivo: data RDA di almeno 7 giorni fa
+    cursor.execute("""
+        SELECT SUM(cnt) FROM stat_summary
+        WHERE stat = 'rda_day' AND key != '' AND key <= ?
+    """, ((today - timedelta(days=7)).strftime("%Y-%m-%d"),))
+    stats['overdue_rda'] = cursor.fetchone()[0] or 0
+    
+    cursor.execute("""
+        SELECT r.name as richiedente, s.cnt as cnt
+        FROM stat_summary s JOIN requester r ON r.id = s.key
+        WHERE s.stat = 'requester'
+        ORDER BY s.cnt DESC
+        LIMIT ?
+    """, (top_requesters if top_requesters is not None else -1,))
+    stats['by_requester'] = cursor.fetchall()
+    
+    cursor.execute("""
+        SELECT substr(key, 6, 2) || '/' || substr(key, 1, 4) as mese, cnt
+        FROM stat_summary WHERE stat = 'month' AND key != ''
+        ORDER BY key DESC
+        LIMIT 12
+    """)
+    stats['by_month'] = cursor.fetchall()
+    
+    cursor.execute("""
+        SELECT key as apf, cnt FROM stat_summary
+        WHERE stat = 'apf' AND key != ''
+        ORDER BY cnt DESC
+    """)
+    stats['by_apf'] = cursor.fetchall()
+    
+    # Righe per livello di alert, dai conteggi per giorno della RDA
+    cursor.execute("SELECT key, cnt FROM stat_summary WHERE stat = 'day'")
+    by_alert = {}
+    for day, cnt in cursor.fetchall():
+        level = alert_level(datetime.strptime(day, "%Y-%m-%d"), today) if day else None
+        by_alert[level] = by_alert.get(level, 0) + cnt
+    stats['by_alert'] = sorted(by_alert.items(), key=lambda item: (item[0] is not None, item[0] or 0))
+    
+    cursor.execute("""
+        SELECT key as descrizione_materiale, ROUND(qty, 6) as tot_qty, cnt
+        FROM stat_summary WHERE stat = 'material' AND key != ''
+        ORDER BY cnt DESC
+        LIMIT 10
+    """)
+    stats['top_materials'] = cursor.fetchall()
+    
+    return stats
+
+
+def _midnight(today=None):
+    """Data di riferimento per gli alert, a mezzanotte (default oggi)."""
+    today = today or datetime.now()
+    return datetime(today.year, today.month, today.day)
+
+
+def _alert_columns(today_sql):
+    """
+    Espressioni SQL dei giorni trascorsi dalla data RDA e del livello di
+    alert (1 per ogni settimana, come alerts.alert_level). Senza data RDA
+    i giorni sono NULL e il livello resta quello salvato.
+    
+    Args:
+        today_sql: Espressione SQL della data odierna (yyyy-mm-dd)
+    
+    Returns:
+        tuple: (espressione giorni, espressione livello)
+    """
+    days = f"CAST(julianday({today_sql}) - julianday(NULLIF(data_rda_iso, '')) AS INTEGER)"
+    level = f"CASE WHEN data_rda_iso != '' THEN MAX({days}, 0) / 7 ELSE alert_level END"
+    return days, level
+
+
+def alert_columns_for(today=None):
+    """Espressioni SQL di giorni e livello alert rispetto alla data indicata."""
+    return _alert_columns(f"'{_midnight(today):%Y-%m-%d}'")
+
+
+def read_overdue(cursor, today=None):
+    """
+    RDA scadute (almeno 7 giorni) e non ancora consegnate, lette con una
+    scansione a intervallo sull'indice parziale idx_open_rda.
+    
+    Args:
+        cursor: Cursore sul database da interrogare
+        today: Data di riferimento (default oggi)
+    
+    Returns:
+        list: Righe nell'ordine del registro, con days_elapsed e alert_level
+    """
+    today = _midnight(today)
+    days_sql, level_sql = alert_columns_for(today)
+    # ORDER BY +id: senza "+" SQLite scorrerebbe l'intera tabella in ordine
+    # di id invece di usare l'indice parziale (le scadute da ordinare sono poche)
+    cursor.execute(f"""
+        SELECT rda_number, data_rda, data_rda_iso, commessa, descrizione_materiale,
+               unita_misura, quantita, apf, richiedente, site,
+               {days_sql} AS days_elapsed, {level_sql} AS alert_level
+        FROM rda_data
+        WHERE data_rda_iso != '' AND data_rda_iso <= ?
+          AND (data_consegna_iso = '' OR data_consegna_iso > ?)
+        ORDER BY +id
+    """, ((today - timedelta(days=7)).strftime("%Y-%m-%d"), today.strftime("%Y-%m-%d")))
+    return cursor.fetchall()
+
+
+def get_overdue_items(today=None):
+    """
+    Elenco delle RDA scadute per l'email di sollecito (stesso formato di
+    alerts.evaluate_alerts), calcolato dal database senza riscrivere gli alert.
+    
+    Args:
+        today: Data di riferimento (default oggi)
+    
+    Returns:
+        list: Lista di dict con le RDA scadute non consegnate
+    """
+    conn = get_connection()
+    try:
+        rows = read_overdue(conn.cursor(), today)
+    finally:
+        conn.close()
+    
+    return [
+        {
+            "N°RDA": row['rda_number'],
+            "Data RDA": datetime.strptime(row['data_rda_iso'], "%Y-%m-%d").strftime('%d/%m/%Y'),
+            "Commessa": row['commessa'],
+            "Descrizione Materiale": row['descrizione_materiale'],
+            "Unità di Misura": row['unita_misura'],
+            "Quantità Richiesta": row['quantita'],
+            "APF": row['apf'],
+            "richiesta da: (giorni)": row['days_elapsed'],
+            "Richiedente": row['richiedente']
+        }
+        for row in rows
+    ]
+
+
+def _fts_available(cursor):
+    """True se il database ha l'indice di ricerca rda_fts."""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rda_fts'")
+    return cursor.fetchone() is not None
+
+
+def text_search_clause(cursor, terms):
+    """
+    Costruisce le condizioni di ricerca testuale su rda_data.
+    
+    I testi di almeno FTS_MIN_LENGTH caratteri vengono cercati nell'indice
+    trigram rda_fts (sottostringhe, quindi anche prefissi e codici parziali),
+    quelli più corti con LIKE.
+    
+    Args:
+        cursor: Cursore sul database da interrogare
+        terms: Lista di (colonna, testo); colonna None cerca in tutte le FTS_COLUMNS
+    
+    Returns:
+        tuple: (clausola FROM, lista condizioni WHERE, parametri,
+                True se il risultato può essere ordinato per rilevanza)
+    """
+    use_fts = _fts_available(cursor)
+    phrases = []
+    conditions = []
+    params = []
+    
+    for column, text in terms:
+        text = str(text).strip()
+        if not text:
+            continue
+        
+        if use_fts and len(text) >= FTS_MIN_LENGTH:
+            phrase = '"' + text.replace('"', '""') + '"'
+            phrases.append(f"{column} : {phrase}" if column else phrase)
+        else:
+            like_columns = [column] if column else FTS_COLUMNS
+            conditions.append("(" + " OR ".join(f"rda_data.{col} LIKE ?" for col in like_columns) + ")")
+            params.extend([f"%{text}%"] * len(like_columns))
+    
+    if not phrases:
+        return "rda_data", conditions, params, False
+    
+    from_clause = "rda_data JOIN rda_fts ON rda_fts.rowid = rda_data.id"
+    return from_clause, ["rda_fts MATCH ?"] + conditions, [" AND ".join(phrases)] + params, True
+
+
+def _backfill_iso_dates(cursor):
+    """
+    Calcola le date ISO delle righe salvate prima della migrazione.
+    
+    Returns:
+        int: Numero di righe aggiornate
+    """
+    cursor.execute("""
+        SELECT id, data_rda, data_consegna FROM rda_data 
+        WHERE data_rda_iso IS NULL OR data_consegna_iso IS NULL
+    """)
+    updates = [
+        (to_iso_date(data_rda), to_iso_date(data_consegna), row_id)
+        for row_id, data_rda, data_consegna in cursor.fetchall()
+    ]
+    if updates:
+        cursor.executemany(
+            "UPDATE rda_data SET data_rda_iso = ?, data_consegna_iso = ? WHERE id = ?",
+            updates
+        )
+        logger.info(f"Date ISO calcolate per {len(updates)} righe")
+    return len(updates)
+
+
+def changes_since(generation, limit=CHANGES_LIMIT):
+    """
+    Righe modificate dopo la generazione indicata, una voce per riga con
+    l'effetto complessivo delle modifiche: "I" inserita, "U" modificata,
+    "D" eliminata (una riga inserita ed eliminata nel frattempo non compare).
+    
+    Args:
+        generation: Generazione dei dati già letti (vedi get_generation)
+        limit: Numero massimo di modifiche oltre il quale conviene rileggere tutto
+    
+    Returns:
+        tuple: (generazione corrente, lista di dict con op, id, site, row_key)
+               oppure None se le modifiche non sono più disponibili (registro
+               potato o dati sostituiti per intero) o sono più di limit
+    """
+    conn = get_connection()
+    try:
+        return read_changes(conn.cursor(), generation, limit)
+    finally:
+        conn.close()
+
+
+def get_generation():
+    """
+    Restituisce la generazione corrente dei dati. Cambia a ogni scrittura
+    di sincronizzazione che modifica rda_data.
+    
+    Returns:
+        int: Numero di generazione (0 se il database è vuoto)
+    """
+    conn = get_connection()
+    try:
+        return read_generation(conn.cursor())
+    finally:
+        conn.close()
+
+
+def _row_hash(row):
+    """Hash del contenuto di una riga, per rilevare le modifiche."""
+    return hashlib.sha1("\x1f".join(repr(v) for v in row).encode("utf-8")).hexdigest()
+
+
+def _stored_row(row):
+    """Valori da salvare per una riga: dati più date ISO derivate."""
+    row = tuple(row)
+    return row + (to_iso_date(row[8]), to_iso_date(row[9]))
+
+
+def _keyed_rows(rows):
+    """
+    Associa a ogni riga una chiave stabile e l'hash del contenuto.
+    La chiave è il numero RDA più la posizione della riga tra quelle della
+    stessa RDA (es. "25/01812#2"), nell'ordine del registro.
+    
+    Yields:
+        tuple: (row_key, row_hash, row)
+    """
+    occurrences = {}
+    for row in rows:
+        row = tuple(row)
+        rda_number = row[0]
+        occurrences[rda_number] = occurrences.get(rda_number, 0) + 1
+        yield f"{rda_number}#{occurrences[rda_number]}", _row_hash(row), row
+
+
+def _batched(iterable, size):
+    """Suddivide un iterabile in liste di al massimo size elementi."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+@writer_lease.exclusive
+def sync_rows(rows, site=DEFAULT_SITE):
+    """
+    Sincronizza la tabella con le righe fornite applicando solo le differenze:
+    INSERT per le righe nuove, UPDATE per quelle modificate e DELETE per
+    quelle non più presenti, in un'unica transazione. Le righe invariate
+    mantengono il proprio id.
+    
+    Le righe vengono consumate a lotti e scritte in un file di appoggio
+    locale (vedi staging.StagedRows), senza prendere il lock del database
+    condiviso: la lettura del registro non blocca lettori e scrittori. Le
+    differenze vengono poi calcolate e applicate in SQL in una transazione
+    breve, la cui durata non dipende dalla lettura del registro. Vengono
+    confrontate solo le righe della stessa sede: le altre sedi restano
+    invariate. Le righe degli anni archiviati vengono confrontate e scritte
+    negli archivi (vedi archive.ArchivedRows).
+    
+    Args:
+        rows: Iterabile di tuple con i dati (escludendo ID e created_at)
+        site: Sede del registro di provenienza
+    
+    Returns:
+        dict: Chiavi 'inserted', 'updated', 'deleted' (liste di row_key),
+              'unchanged' (numero di righe invariate) e 'archived' (righe
+              inserite, aggiornate o eliminate negli archivi), None se non
+              è arrivata nessuna riga (la tabella non viene svuotata)
+    """
+    # Import locali: archivi e appoggio dipendono da questo modulo
+    from src.data.archive import ArchivedRows
+    from src.data.staging import StagedRows
+    
+    summary = {'inserted': [], 'updated': [], 'deleted': [], 'unchanged': 0, 'archived': 0}
     
     conn = get_connection()
     cursor = conn.cursor()
     
     try:
-        cursor.execute("BEGIN TRANSACTION")
+        with StagedRows(cursor) as staged:
+            # Le righe degli anni archiviati si confrontano con gli archivi
+            archived = ArchivedRows(cursor, site)
+            seen = 0
+            
+            def current_rows():
+                nonlocal seen
+                for row_key, row_hash, row in _keyed_rows(rows):
+                    seen += 1
+                    if not archived.add(row_key, row_hash, row):
+                        yield row_key, row_hash, row
+            
+            written = staged.write(current_rows(), site)
+            if not seen:
+                logger.warning("Nessun dato da sincronizzare: database lasciato invariato")
+                return None
+            
+            cursor.execute("BEGIN IMMEDIATE")
+            summary['inserted'], summary['updated'], summary['deleted'], removed = staged.apply(site)
+            summary['unchanged'] = written - len(summary['inserted']) - len(summary['updated'])
+            
+            # Gli archivi vengono confermati prima del database principale: se
+            # questo fallisce, la sincronizzazione successiva li trova già allineati
+            summary['archived'] = archived.apply(cursor)
+            summary['unchanged'] += archived.unchanged
+            
+            _refresh_derived(cursor)
+            if removed or summary['inserted'] or summary['updated'] or summary['archived']:
+                bump_generation(cursor)
+            cursor.execute("COMMIT")
+        
+        logger.info(
+            f"Database sincronizzato{f' (sede {site})' if site else ''}: "
+            f"{len(summary['inserted'])} inserite, "
+            f"{len(summary['updated'])} aggiornate, {len(summary['deleted'])} eliminate, "
+            f"{summary['unchanged']} invariate"
+            + (f", {summary['archived']} modificate negli archivi" if summary['archived'] else "")
+        )
         
-        # Elimina tutti i dati esistenti
-        cursor.execute("DELETE FROM rda_data")
+    except Exception as e:
+        if conn.in_transaction:
+            cursor.execute("ROLLBACK")
+        logger.error(f"Errore durante la sincronizzazione incrementale: {e}")
+        raise
+    finally:
+        conn.close()
+    
+    return summary
+
+
+def get_sync_state(source):
+    """
+    Recupera l'impronta del registro salvata all'ultima sincronizzazione.
+    
+    Args:
+        source: Identificativo del registro (percorso del file Excel)
+    
+    Returns:
+        dict con chiavi 'size', 'mtime', 'hash' oppure None
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT file_size, file_mtime, content_hash 
+        FROM sync_state WHERE source = ?
+    """, (source,))
+    row = cursor.fetchone()
+    conn.close()
+    
+    if not row:
+        return None
+    return {'size': row[0], 'mtime': row[1], 'hash': row[2]}
+
+
+def save_sync_state(source, fingerprint):
+    """
+    Salva l'impronta del registro appena sincronizzato.
+    
+    Args:
+        source: Identificativo del registro (percorso del file Excel)
+        fingerprint: dict con chiavi 'size', 'mtime', 'hash'
+    """
+    conn = get_connection()
+    try:
+        conn.execute("""
+            INSERT OR REPLACE INTO sync_state (
+                source, file_size, file_mtime, content_hash, synced_at
+            ) VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+        """, (source, fingerprint['size'], fingerprint['mtime'], fingerprint['hash']))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def iter_data_rows():
+    """
+    Scorre le righe della tabella nell'ordine di inserimento, a lotti,
+    senza caricarle tutte in memoria.
+    
+    Yields:
+        tuple: (id, tupla dei dati nell'ordine di DATA_COLUMNS)
+    """
+    conn = get_connection()
+    try:
+        cursor = conn.execute(f"SELECT id, {', '.join(DATA_COLUMNS)} FROM rda_data ORDER BY id")
+        while True:
+            batch = cursor.fetchmany(WRITE_BATCH_SIZE)
+            if not batch:
+                return
+            for row in batch:
+                yield row[0], tuple(row[1:])
+    finally:
+        conn.close()
+
+
+@writer_lease.exclusive
+def append_rows(rows, site=DEFAULT_SITE):
+    """
+    Aggiunge righe in coda alla tabella (registro in modalità sqlite).
+    Le chiavi proseguono la numerazione delle righe già presenti per la
+    stessa RDA nella stessa sede.
+    
+    Args:
+        rows: Iterabile di tuple con i dati (escludendo ID e created_at)
+        site: Sede del registro
+    
+    Returns:
+        list: row_key delle righe inserite
+    """
+    keys = []
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute("BEGIN TRANSACTION")
         
-        # Reset contatore auto-increment
-        cursor.execute("DELETE FROM sqlite_sequence WHERE name='rda_data'")
+        last_position = {}
+        for row in rows:
+            row = tuple(row)
+            rda_number = row[0]
+            if rda_number not in last_position:
+                cursor.execute(
+                    "SELECT row_key FROM rda_data WHERE rda_number = ? AND site = ?",
+                    (rda_number, site)
+                )
+                last_position[rda_number] = max(
+                    (int(key.rsplit("#", 1)[1]) for (key,) in cursor.fetchall() if key),
+                    default=0
+                )
+            last_position[rda_number] += 1
+            
+            row_key = f"{rda_number}#{last_position[rda_number]}"
+            cursor.execute(_INSERT_SQL, _stored_row(row) + (row_key, _row_hash(row), site))
+            keys.append(row_key)
         
-        # Inserisci nuovi dati
-        cursor.executemany("""
-            INSERT INTO rda_data (
-                rda_number, commessa, descrizione_1, descrizione_materiale,
-                unita_misura, quantita, apf, pdf_path, data_rda,
-                data_consegna, alert_level, richiedente
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, rows)
+        if keys:
+            _refresh_derived(cursor)
+            bump_generation(cursor)
+        cursor.execute("COMMIT")
         
+    except Exception as e:
+        cursor.execute("ROLLBACK")
+        logger.error(f"Errore durante l'inserimento righe: {e}")
+        raise
+    finally:
+        conn.close()
+    
+    return keys
+
+
+@writer_lease.exclusive
+def update_rows(rows_by_id):
+    """
+    Aggiorna il contenuto di righe esistenti (registro in modalità sqlite).
+    
+    Args:
+        rows_by_id: Iterabile di tuple (id, tupla dei dati)
+    
+    Returns:
+        int: Numero di righe aggiornate
+    """
+    updates = [
+        _stored_row(row) + (_row_hash(tuple(row)), row_id) for row_id, row in rows_by_id
+    ]
+    if not updates:
+        return 0
+    
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute("BEGIN TRANSACTION")
+        for batch in _batched(updates, WRITE_BATCH_SIZE):
+            cursor.executemany(_UPDATE_SQL, batch)
+        _refresh_derived(cursor)
+        bump_generation(cursor)
         cursor.execute("COMMIT")
-        logger.info(f"Database sincronizzato: {len(rows)} righe inserite")
         
     except Exception as e:
         cursor.execute("ROLLBACK")
-        logger.error(f"Errore durante l'inserimento dati: {e}")
+        logger.error(f"Errore durante l'aggiornamento righe: {e}")
         raise
     finally:
         conn.close()
+    
+    return len(updates)
 
 
 def get_all_rows():
@@ -127,12 +1177,10 @@ def get_all_rows():
         Lista di righe come sqlite3.Row objects
     """
     conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
+    rows = query_cache.fetchall(conn, """
         SELECT * FROM rda_data 
-        ORDER BY data_rda DESC, rda_number
+        ORDER BY data_rda_iso DESC, rda_number
     """)
-    rows = cursor.fetchall()
     conn.close()
     return rows
 
@@ -145,35 +1193,50 @@ def get_statistics():
         Dictionary con varie statistiche
     """
     conn = get_connection()
-    cursor = conn.cursor()
+    try:
+        # Valori pre-aggregati in stat_summary (top 10 richiedenti)
+        # Gli alert dipendono dalla data: la chiave include il giorno
+        today = _midnight()
+        return query_cache.get_or_compute(
+            conn, ("statistics", 10, today), lambda: read_statistics(conn.cursor(), 10, today)
+        )
+    finally:
+        conn.close()
+
+
+def filter_clause(cursor, filters):
+    """
+    Traduce i filtri di ricerca in clausola FROM, condizioni e parametri.
     
-    stats = {}
+    Args:
+        cursor: Cursore sul database da interrogare
+        filters: Dictionary con chiavi filtro (vedi search_rda)
     
-    # Totale RDA univoche
-    cursor.execute("SELECT COUNT(DISTINCT rda_number) FROM rda_data")
-    stats['total_rda'] = cursor.fetchone()[0] or 0
+    Returns:
+        tuple: (clausola FROM, lista condizioni, parametri, True se ordinabile per rilevanza)
+    """
+    terms = [(None, filters['text'])] if filters.get('text') else []
+    terms += [(col, filters[col]) for col in ('rda_number', 'richiedente', 'apf') if filters.get(col)]
+    from_clause, conditions, params, ranked = text_search_clause(cursor, terms)
     
-    # Totale righe
-    cursor.execute("SELECT COUNT(*) FROM rda_data")
-    stats['total_rows'] = cursor.fetchone()[0] or 0
+    if filters.get('site') is not None:
+        conditions.append("rda_data.site = ?")
+        params.append(filters['site'])
     
-    # RDA con alert attivo
-    cursor.execute("SELECT COUNT(DISTINCT rda_number) FROM rda_data WHERE alert_level > 0")
-    stats['overdue_rda'] = cursor.fetchone()[0] or 0
+    if filters.get('only_overdue'):
+        # Alert calcolato dalla data (almeno 7 giorni), salvato per le righe senza data
+        conditions.append(
+            "((data_rda_iso != '' AND data_rda_iso <= ?) OR (data_rda_iso = '' AND alert_level > 0))"
+        )
+        params.append((_midnight() - timedelta(days=7)).strftime("%Y-%m-%d"))
     
-    # Top richiedenti
-    cursor.execute("""
-        SELECT richiedente, COUNT(DISTINCT rda_number) as cnt 
-        FROM rda_data 
-        WHERE richiedente IS NOT NULL AND richiedente != ''
-        GROUP BY richiedente 
-        ORDER BY cnt DESC
-        LIMIT 10
-    """)
-    stats['by_requester'] = cursor.fetchall()
+    if filters.get('data_from') or filters.get('data_to'):
+        # Intervallo sull'indice delle date ISO (le righe senza data sono escluse)
+        conditions.append("data_rda_iso BETWEEN ? AND ?")
+        params.append(to_iso_date(filters.get('data_from')) or "0000-00-00")
+        params.append(to_iso_date(filters.get('data_to')) or "9999-12-31")
     
-    conn.close()
-    return stats
+    return from_clause, conditions, params, ranked
 
 
 def search_rda(filters):
@@ -181,36 +1244,44 @@ def search_rda(filters):
     Ricerca RDA con filtri multipli.
     
     Args:
-        filters: Dictionary con chiavi filtro (rda_number, richiedente, data_from, data_to, apf)
+        filters: Dictionary con chiavi filtro (text, rda_number, richiedente,
+                 data_from, data_to, apf, site, only_overdue, order_by,
+                 include_archive); text cerca in tutte le colonne di testo,
+                 data_from e data_to sono in formato dd/mm/yyyy, order_by è
+                 "date" (default) o "relevance", include_archive cerca anche
+                 negli archivi degli anni chiusi compresi tra le date
     
     Returns:
         Lista di righe matching
     """
     conn = get_connection()
-    cursor = conn.cursor()
+    from_clause, conditions, params, ranked = filter_clause(conn.cursor(), filters)
     
-    query = "SELECT * FROM rda_data WHERE 1=1"
-    params = []
-    
-    if filters.get('rda_number'):
-        query += " AND rda_number LIKE ?"
-        params.append(f"%{filters['rda_number']}%")
-    
-    if filters.get('richiedente'):
-        query += " AND richiedente LIKE ?"
-        params.append(f"%{filters['richiedente']}%")
-    
-    if filters.get('apf'):
-        query += " AND apf LIKE ?"
-        params.append(f"%{filters['apf']}%")
-    
-    if filters.get('only_overdue'):
-        query += " AND alert_level > 0"
+    query = f"SELECT rda_data.* FROM {from_clause} WHERE 1=1"
+    for condition in conditions:
+        query += f" AND {condition}"
     
-    query += " ORDER BY data_rda DESC"
+    if ranked and filters.get('order_by') == "relevance":
+        query += " ORDER BY rda_fts.rank, data_rda_iso DESC"
+    else:
+        query += " ORDER BY data_rda_iso DESC"
     
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
-    conn.close()
+    try:
+        rows = query_cache.fetchall(conn, query, params)
+        if filters.get('include_archive'):
+            # Import locale: il modulo degli archivi dipende da questo
+            from src.data.archive import query_archives
+            # Gli archivi cambiano solo con l'archiviazione, che incrementa la generazione
+            years = [to_iso_date(filters.get(key))[:4] for key in ('data_from', 'data_to')]
+            first_year, last_year = (int(year) if year else None for year in years)
+            rows += query_cache.get_or_compute(
+                conn, ("archives", query, tuple(params), first_year, last_year),
+                lambda: query_archives(query, params, first_year, last_year)
+            )
+            if not (ranked and filters.get('order_by') == "relevance"):
+                rows.sort(key=lambda row: row['data_rda_iso'] or "", reverse=True)
+    finally:
+        conn.close()
     
     return rows
+
@@ -0,0 +1,142 @@
+"""
+Generazione del registro Excel a partire dal database SQLite
+(modalità register_mode = "sqlite")
+"""
+
+import os
+import re
+import logging
+import warnings
+from datetime import datetime
+from itertools import chain
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.worksheet.filters import AutoFilter
+from openpyxl.worksheet.table import Table, TableColumn, TableStyleInfo
+from src.utils.config import EXCEL_EXPORT_PATH, SHEET_PASSWORD, TABLE_NAME
+from src.data.database import DATA_COLUMNS
+from src.data.pagination import iter_query
+from src.data.archive import iter_archived_rows
+from src.data.sync_rows import parse_cell_date
+from src.data.alerts import alert_level
+
+logger = logging.getLogger("RDA_Bot")
+
+# Intestazioni e larghezze delle colonne A:L, come nel registro originale
+REGISTER_HEADERS = (
+    "N° RDA", "Commessa", "Articolo", "Descrizione Materiale", "UM",
+    "Quantita Richiesta", "APF", "Riferimento PDF", "Data RDA",
+    "Data di Consegna", "N° Alert", "Richiedente"
+)
+COLUMN_WIDTHS = (11, 14, 12, 60, 6, 10, 6, 14, 11, 11, 9, 24)
+
+# Formato data breve di Excel (dipende dalle impostazioni locali)
+DATE_FORMAT = "mm-dd-yy"
+
+# Colonne numeriche del registro (F quantità, K alert): le altre restano
+# testo, anche quando sembrano numeri (es. commessa con zeri iniziali)
+NUMBER_COLUMNS = (5, 10)
+
+_NUMBER_RE = re.compile(r"-?(0|[1-9]\d*)(\.\d+)?")
+
+
+def _as_number(value):
+    """Riporta a numero un valore numerico salvato come testo."""
+    if isinstance(value, str) and _NUMBER_RE.fullmatch(value):
+        number = float(value)
+        return int(number) if number.is_integer() else number
+    return value
+
+
+def _register_cells(ws, row, today):
+    """Converte una riga del database nelle celle A:L del registro."""
+    cells = [v if v != "" else None for v in row]
+    for col in NUMBER_COLUMNS:
+        cells[col] = _as_number(cells[col])
+    
+    # Colonna K: alert calcolato sulla data odierna (senza data resta quello salvato)
+    rda_date = parse_cell_date(row[8])
+    if rda_date:
+        cells[10] = alert_level(rda_date, today)
+    
+    # Colonna H: collegamento al PDF
+    cells[7] = f'=HYPERLINK("{row[7]}", "Apri PDF")' if row[7] else None
+    
+    # Colonne I e J: date vere, il testo non interpretabile resta com'è
+    for col in (8, 9):
+        date_value = parse_cell_date(row[col])
+        if date_value:
+            cell = WriteOnlyCell(ws, value=date_value)
+            cell.number_format = DATE_FORMAT
+            cells[col] = cell
+        elif row[col]:
+            cells[col] = row[col]
+    
+    return cells
+
+
+def export_register(path=None):
+    """
+    Rigenera il registro Excel dal database in modalità streaming: le righe
+    vengono lette a pagine e scritte man mano, quindi la memoria non cresce
+    con il registro. Il file mantiene colonne, collegamenti ai PDF, nome della
+    tabella e protezione del foglio del registro originale.
+    
+    Args:
+        path: File .xlsx da generare (default EXCEL_EXPORT_PATH)
+    
+    Returns:
+        int: Numero di righe esportate, None se il file non può essere scritto
+    """
+    path = path or EXCEL_EXPORT_PATH
+    
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Foglio1")
+    for i, width in enumerate(COLUMN_WIDTHS):
+        ws.column_dimensions[chr(ord("A") + i)].width = width
+    ws.freeze_panes = "A2"
+    
+    ws.append(REGISTER_HEADERS)
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    exported = 0
+    # Prima gli anni archiviati, poi le pagine a chiave nell'ordine del
+    # registro: memoria costante e nessuna lettura lunga che blocchi le
+    # scritture sul database condiviso
+    for db_row in chain(iter_archived_rows(), iter_query(sort="register")):
+        row = tuple(db_row[col] for col in DATA_COLUMNS)
+        ws.append(_register_cells(ws, row, today))
+        exported += 1
+    
+    # Una tabella Excel richiede almeno una riga dati
+    if not exported:
+        ws.append([None] * len(REGISTER_HEADERS))
+    
+    # In modalità write-only le colonne della tabella vanno dichiarate a mano
+    ref = f"A1:L{max(exported, 1) + 1}"
+    table = Table(
+        displayName=TABLE_NAME, ref=ref, autoFilter=AutoFilter(ref=ref),
+        tableColumns=[TableColumn(id=i, name=name) for i, name in enumerate(REGISTER_HEADERS, start=1)]
+    )
+    table.tableStyleInfo = TableStyleInfo(name="TableStyleLight9", showRowStripes=True)
+    with warnings.catch_warnings():
+        # Avviso emesso sempre in write-only, anche con le colonne dichiarate
+        warnings.simplefilter("ignore", UserWarning)
+        ws.add_table(table)
+    
+    ws.protection.sheet = True
+    ws.protection.password = SHEET_PASSWORD
+    
+    # Scrittura su file temporaneo: il registro esistente resta valido
+    # finché il nuovo non è completo
+    tmp_path = path + ".tmp"
+    try:
+        wb.save(tmp_path)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.error(f"Impossibile scrivere il registro Excel {path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+    
+    logger.info(f"Registro Excel generato: {exported} righe in {path}")
+    return exported
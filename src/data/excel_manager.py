@@ -4,16 +4,22 @@ Modulo per la gestione del file Excel tramite COM automation
 
 import win32com.client
 import logging
-import re
 from datetime import datetime
 from src.utils.config import (
     EXCEL_DB_PATH, SHEET_PASSWORD, TABLE_NAME, 
     RDA_REFERENCE_COLUMN_LETTER, RDA_REFERENCE_COLUMN_NUMBER
 )
-from src.utils.utils import safe_str, safe_float, safe_int, format_date
+from src.data.sync_rows import (
+    normalize_rda_number, build_sync_row, build_register_rows, SYNC_BLOCK_SIZE
+)
+from src.data.alerts import evaluate_alerts
 
 logger = logging.getLogger("RDA_Bot")
 
+# Oltre questo numero di blocchi modificati la colonna alert viene
+# riscritta con un'unica chiamata COM
+ALERT_WRITE_MAX_RUNS = 50
+
 
 class ExcelManager:
     """
@@ -21,16 +27,41 @@ class ExcelManager:
     Utilizza win32com per l'automazione COM.
     """
     
-    def __init__(self):
+    def __init__(self, path=None):
+        self.path = path or EXCEL_DB_PATH
         self.app = None
         self.workbook = None
         self.sheet = None
         self._is_open = False
+        self._rda_index = None
+        self._dirty = False
+        self._rows_added = 0
     
-    def open(self):
+    @property
+    def is_dirty(self):
+        """True se nella sessione corrente sono stati modificati dei valori."""
+        return self._dirty
+    
+    @property
+    def known_rda_numbers(self):
+        """
+        Numeri RDA (normalizzati) presenti nel foglio per la sessione corrente.
+        L'insieme è aggiornato da append_data e non va modificato dal chiamante.
+        
+        Returns:
+            set: Insieme dei numeri RDA, vuoto se l'indice non è disponibile
+        """
+        if self._rda_index is None:
+            return frozenset()
+        return self._rda_index
+    
+    def open(self, read_only=False):
         """
         Apre il file Excel e sblocca il foglio.
         
+        Args:
+            read_only: Se True, apre il file in sola lettura senza sbloccare il foglio
+        
         Returns:
             bool: True se apertura riuscita, False altrimenti
         """
@@ -41,16 +72,20 @@ class ExcelManager:
             self.app.DisplayAlerts = False
             
             # Apri workbook
-            self.workbook = self.app.Workbooks.Open(EXCEL_DB_PATH)
+            self.workbook = self.app.Workbooks.Open(self.path, ReadOnly=read_only)
             self.sheet = self.workbook.ActiveSheet
             
             # Sblocca foglio protetto
-            try:
-                self.sheet.Unprotect(Password=SHEET_PASSWORD)
-            except Exception as e:
-                logger.warning(f"Foglio non protetto o password errata: {e}")
+            if not read_only:
+                try:
+                    self.sheet.Unprotect(Password=SHEET_PASSWORD)
+                except Exception as e:
+                    logger.warning(f"Foglio non protetto o password errata: {e}")
             
             self._is_open = True
+            self._dirty = False
+            self._rows_added = 0
+            self._build_rda_index()
             return True
             
         except Exception as e:
@@ -63,9 +98,14 @@ class ExcelManager:
         Chiude il file Excel.
         
         Args:
-            save: Se True, salva le modifiche prima di chiudere
+            save: Se True, salva le modifiche prima di chiudere. Senza
+                  modifiche nella sessione il salvataggio viene saltato.
         """
         try:
+            if save and not self._dirty:
+                logger.info("Nessuna modifica al registro: salvataggio saltato")
+                save = False
+            
             if self.sheet and save:
                 try:
                     self.sheet.Protect(Password=SHEET_PASSWORD)
@@ -85,6 +125,9 @@ class ExcelManager:
             self.app = None
             self.sheet = None
             self._is_open = False
+            self._rda_index = None
+            self._dirty = False
+            self._rows_added = 0
     
     def check_if_exists(self, rda_number):
         """
@@ -96,33 +139,10 @@ class ExcelManager:
         Returns:
             bool: True se esiste, False altrimenti
         """
-        if not self._is_open:
+        if not self._is_open or self._rda_index is None:
             return True  # Fail safe
         
-        try:
-            last_row = self._get_last_row()
-            
-            # Leggi tutti i valori della colonna A per performance
-            if last_row >= 2:
-                rda_range = self.sheet.Range(f"A2:A{last_row}").Value
-                
-                # Normalizza struttura
-                if rda_range:
-                    if not isinstance(rda_range, tuple):
-                        rda_range = ((rda_range,),)
-                    elif not isinstance(rda_range[0], tuple):
-                        rda_range = (rda_range,)
-                    
-                    for cell_tuple in rda_range:
-                        cell_value = cell_tuple[0] if isinstance(cell_tuple, tuple) else cell_tuple
-                        if cell_value and str(cell_value).strip() == rda_number:
-                            return True
-            
-            return False
-            
-        except Exception as e:
-            logger.error(f"Errore verifica esistenza RDA: {e}")
-            return True  # Fail safe
+        return normalize_rda_number(rda_number) in self._rda_index
     
     def append_data(self, rda_data):
         """
@@ -137,56 +157,17 @@ class ExcelManager:
         try:
             first_empty_row = self._get_last_row() + 1
             
-            # Filtra righe vuote dalla tabella PDF
-            valid_rows = [
-                row for row in rda_data['table'] 
-                if any(cell is not None and str(cell).strip() != '' for cell in row)
-            ]
-            
-            for row_data in valid_rows:
-                # Pulisci dati
-                cleaned_row = [item if item is not None else "" for item in row_data]
-                
-                # Gestisci data di consegna
-                delivery_date_str = cleaned_row[8] if len(cleaned_row) > 8 else ""
-                delivery_date_obj = None
-                if delivery_date_str:
-                    try:
-                        delivery_date_obj = datetime.strptime(str(delivery_date_str), '%d/%m/%Y')
-                    except (ValueError, TypeError):
-                        delivery_date_obj = delivery_date_str
-                
-                # Gestisci quantità (converti formato italiano)
-                quantity_val = cleaned_row[5] if len(cleaned_row) > 5 else 0
-                try:
-                    quantity_str = str(quantity_val).replace('.', '').replace(',', '.')
-                    quantity_val = float(quantity_str)
-                except (ValueError, TypeError):
-                    pass
-                
-                # Costruisci riga da inserire
-                # Colonne: A=RDA, B=Commessa, C=Desc1, D=DescMat, E=UM, F=Qty, 
-                #          G=APF, H=Link, I=DataRDA, J=DataCons, K=Alert, L=Richiedente
-                new_row_values = [
-                    rda_data['rda_number_raw'],
-                    cleaned_row[1] if len(cleaned_row) > 1 else "",  # Commessa
-                    cleaned_row[2] if len(cleaned_row) > 2 else "",  # Descrizione 1
-                    cleaned_row[3] if len(cleaned_row) > 3 else "",  # Descrizione Materiale
-                    cleaned_row[4] if len(cleaned_row) > 4 else "",  # Unità Misura
-                    quantity_val,
-                    cleaned_row[7] if len(cleaned_row) > 7 else "",  # APF
-                    f'=HYPERLINK("{rda_data["pdf_final_path"]}", "Apri PDF")',
-                    rda_data['rda_date_obj'],
-                    delivery_date_obj,
-                    0,  # Alert level iniziale
-                    rda_data.get('requester', '')
-                ]
-                
+            for new_row_values in build_register_rows(rda_data):
                 # Inserisci valori
                 for i, value in enumerate(new_row_values):
                     self.sheet.Cells(first_empty_row, i + 1).Value = value
                 
                 first_empty_row += 1
+                self._dirty = True
+                self._rows_added += 1
+            
+            if self._rda_index is not None:
+                self._rda_index.add(normalize_rda_number(rda_data['rda_number_raw']))
             
             logger.info(f"Aggiunti dati per RDA {rda_data['rda_number_raw']}")
             
@@ -203,48 +184,22 @@ class ExcelManager:
         if not self._is_open:
             return []
         
-        overdue_items = []
         today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
         
         try:
             last_row = self._get_last_row()
+            if last_row < 2:
+                return []
             
-            for row in range(2, last_row + 1):
-                # Leggi data RDA (colonna I = 9)
-                rda_date = self._parse_cell_date(self.sheet.Cells(row, 9).Value)
-                
-                if not rda_date:
-                    continue
-                
-                # Calcola giorni trascorsi
-                days_diff = (today - rda_date).days
-                
-                # Calcola livello alert (1 per ogni settimana passata)
-                alert_level = days_diff // 7 if days_diff >= 7 else 0
-                
-                # Aggiorna cella alert (colonna K = 11)
-                self.sheet.Cells(row, 11).Value = alert_level
-                
-                # Se scaduta, aggiungi alla lista
-                if alert_level > 0:
-                    # Controlla se già consegnata
-                    delivery_date = self._parse_cell_date(self.sheet.Cells(row, 10).Value)
-                    if delivery_date and delivery_date <= today:
-                        continue  # Già consegnata, salta
-                    
-                    # Raccogli dati per email
-                    item_data = {
-                        "N°RDA": self.sheet.Cells(row, 1).Value,
-                        "Data RDA": rda_date.strftime('%d/%m/%Y'),
-                        "Commessa": self.sheet.Cells(row, 2).Value,
-                        "Descrizione Materiale": self.sheet.Cells(row, 4).Value,
-                        "Unità di Misura": self.sheet.Cells(row, 5).Value,
-                        "Quantità Richiesta": self.sheet.Cells(row, 6).Value,
-                        "APF": self.sheet.Cells(row, 7).Value,
-                        "richiesta da: (giorni)": days_diff,
-                        "Richiedente": self.sheet.Cells(row, 12).Value
-                    }
-                    overdue_items.append(item_data)
+            # Leggi A:L in un'unica chiamata COM
+            raw_values = self._normalize_range_data(
+                self.sheet.Range(f"A2:L{last_row}").Value
+            )
+            
+            levels, changed_rows, overdue_items = evaluate_alerts(raw_values, today)
+            alert_column = [(level,) for level in levels]
+            
+            self._write_alert_changes(alert_column, changed_rows, last_row)
             
             return overdue_items
             
@@ -252,6 +207,35 @@ class ExcelManager:
             logger.error(f"Errore aggiornamento alert: {e}")
             return []
     
+    def _write_alert_changes(self, alert_column, changed_rows, last_row):
+        """
+        Scrive in colonna K solo i blocchi contigui di alert modificati.
+        Con troppi blocchi sparsi riscrive la colonna in un'unica chiamata.
+        
+        Args:
+            alert_column: Valori alert per le righe 2..last_row
+            changed_rows: Indici (0-based) delle righe con alert modificato
+            last_row: Ultima riga del foglio con dati
+        """
+        if not changed_rows:
+            return
+        
+        runs = []
+        for i in changed_rows:
+            if runs and runs[-1][1] == i - 1:
+                runs[-1][1] = i
+            else:
+                runs.append([i, i])
+        
+        if len(runs) > ALERT_WRITE_MAX_RUNS:
+            self.sheet.Range(f"K2:K{last_row}").Value = tuple(alert_column)
+        else:
+            for start, end in runs:
+                self.sheet.Range(f"K{start + 2}:K{end + 2}").Value = tuple(alert_column[start:end + 1])
+        
+        self._dirty = True
+        logger.info(f"Aggiornati {len(changed_rows)} livelli di alert")
+    
     def delete_empty_rows(self):
         """
         Elimina le righe vuote dalla tabella Excel.
@@ -263,11 +247,26 @@ class ExcelManager:
             if self.sheet.ListObjects.Count > 0:
                 table = self.sheet.ListObjects(TABLE_NAME)
                 
-                # Itera al contrario per evitare problemi con gli indici
-                for i in range(table.ListRows.Count, 0, -1):
-                    list_row = table.ListRows(i)
-                    if self.app.WorksheetFunction.CountA(list_row.Range) == 0:
-                        list_row.Delete()
+                if table.ListRows.Count == 0:
+                    return
+                
+                # Leggi il corpo della tabella in un'unica chiamata COM
+                body_values = self._normalize_range_data(table.DataBodyRange.Value)
+                empty_runs = self._find_empty_runs(body_values)
+                
+                # Elimina ogni blocco contiguo con un solo Delete, dal basso
+                # verso l'alto per non spostare gli indici ancora da elaborare
+                for start, end in reversed(empty_runs):
+                    block = self.sheet.Range(
+                        table.ListRows(start).Range,
+                        table.ListRows(end).Range
+                    )
+                    block.Delete(Shift=-4162)  # xlShiftUp
+                
+                if empty_runs:
+                    self._dirty = True
+                    removed = sum(end - start + 1 for start, end in empty_runs)
+                    logger.info(f"Eliminate {removed} righe vuote in {len(empty_runs)} blocchi")
                         
         except Exception as e:
             logger.error(f"Errore eliminazione righe vuote: {e}")
@@ -285,57 +284,107 @@ class ExcelManager:
         data_rows = []
         
         try:
-            last_row = self._get_last_row()
-            if last_row < 2:
-                return []
-            
-            # Leggi valori e formule in batch
-            raw_values = self.sheet.Range(f"A2:L{last_row}").Value
-            formulas_col8 = self.sheet.Range(f"H2:H{last_row}").Formula
-            
-            # Normalizza struttura dati
-            raw_values = self._normalize_range_data(raw_values)
-            formulas_col8 = self._normalize_formula_data(formulas_col8, last_row - 1)
-            
-            for i, row_val in enumerate(raw_values):
-                if row_val is None or all(v is None for v in row_val):
-                    continue
-                
-                # Estrai path PDF dalla formula HYPERLINK
-                pdf_path = self._extract_hyperlink_path(formulas_col8[i])
-                
-                # Costruisci tupla per database
-                item = (
-                    safe_str(row_val[0]),          # RDA Number
-                    safe_str(row_val[1]),          # Commessa
-                    safe_str(row_val[2]),          # Descrizione 1
-                    safe_str(row_val[3]),          # Descrizione Materiale
-                    safe_str(row_val[4]),          # Unità Misura
-                    safe_float(row_val[5]),        # Quantità
-                    safe_str(row_val[6]),          # APF
-                    pdf_path,                      # PDF Path
-                    self._format_cell_date(row_val[8]),   # Data RDA
-                    self._format_cell_date(row_val[9]),   # Data Consegna
-                    safe_int(row_val[10]),         # Alert Level
-                    safe_str(row_val[11])          # Richiedente
-                )
-                data_rows.append(item)
-            
+            for block in self.iter_sync_blocks():
+                data_rows.extend(block)
         except Exception as e:
             logger.error(f"Errore lettura dati per sync: {e}")
         
         return data_rows
     
-    def fit_columns(self):
-        """Adatta la larghezza delle colonne al contenuto."""
+    def iter_sync_blocks(self, block_size=SYNC_BLOCK_SIZE):
+        """
+        Legge il foglio a blocchi di righe per la sincronizzazione con SQLite,
+        così la memoria resta limitata anche con registri molto grandi.
+        Gli errori di lettura vengono propagati: una lettura parziale non
+        deve essere scambiata per il registro completo.
+        
+        Args:
+            block_size: Numero di righe lette per ogni chiamata COM
+        
+        Yields:
+            list: Tuple dei dati del blocco (righe vuote escluse)
+        """
         if not self._is_open:
             return
         
+        last_row = self._get_last_row()
+        
+        for first in range(2, last_row + 1, block_size):
+            last = min(first + block_size - 1, last_row)
+            
+            # Valori e formule del blocco in due sole chiamate COM
+            raw_values = self._normalize_range_data(self.sheet.Range(f"A{first}:L{last}").Value)
+            formulas_col8 = self._normalize_formula_data(
+                self.sheet.Range(f"H{first}:H{last}").Formula, last - first + 1
+            )
+            
+            yield [
+                build_sync_row(row_val, formulas_col8[i])
+                for i, row_val in enumerate(raw_values)
+                if row_val is not None and not all(v is None for v in row_val)
+            ]
+    
+    def fit_columns(self):
+        """Adatta la larghezza delle colonne al contenuto (solo se sono state aggiunte righe)."""
+        if not self._is_open or not self._rows_added:
+            return
+        
         try:
             self.sheet.Columns.AutoFit()
         except:
             pass
     
+    def _build_rda_index(self):
+        """
+        Costruisce l'indice dei numeri RDA leggendo la colonna A in un'unica
+        chiamata COM. In caso di errore l'indice resta None e
+        check_if_exists torna al comportamento fail safe.
+        """
+        try:
+            index = set()
+            last_row = self._get_last_row()
+            
+            if last_row >= 2:
+                rda_range = self._normalize_range_data(
+                    self.sheet.Range(f"A2:A{last_row}").Value
+                )
+                for cell_tuple in rda_range:
+                    cell_value = cell_tuple[0] if isinstance(cell_tuple, (tuple, list)) else cell_tuple
+                    if cell_value:
+                        index.add(normalize_rda_number(cell_value))
+            
+            self._rda_index = index
+            
+        except Exception as e:
+            logger.error(f"Errore costruzione indice RDA: {e}")
+            self._rda_index = None
+    
+    def _find_empty_runs(self, rows):
+        """
+        Individua i blocchi contigui di righe completamente vuote.
+        
+        Args:
+            rows: Righe lette dal corpo della tabella
+        
+        Returns:
+            list: Tuple (inizio, fine) con indici 1-based inclusivi
+        """
+        runs = []
+        start = None
+        
+        for i, row_val in enumerate(rows, start=1):
+            if all(v is None for v in row_val):
+                if start is None:
+                    start = i
+            elif start is not None:
+                runs.append((start, i - 1))
+                start = None
+        
+        if start is not None:
+            runs.append((start, len(rows)))
+        
+        return runs
+    
     def _get_last_row(self):
         """Restituisce il numero dell'ultima riga con dati."""
         return self.sheet.Cells(
@@ -343,31 +392,6 @@ class ExcelManager:
             RDA_REFERENCE_COLUMN_LETTER
         ).End(-4162).Row
     
-    def _parse_cell_date(self, cell_value):
-        """Converte un valore cella in datetime."""
-        if cell_value is None:
-            return None
-        
-        # Se è già un datetime COM
-        if hasattr(cell_value, 'timestamp'):
-            return datetime.fromtimestamp(cell_value.timestamp())
-        
-        # Se è una stringa
-        if isinstance(cell_value, str):
-            try:
-                return datetime.strptime(cell_value, '%d/%m/%Y')
-            except ValueError:
-                pass
-        
-        return None
-    
-    def _format_cell_date(self, cell_value):
-        """Formatta un valore cella data come stringa dd/mm/yyyy."""
-        dt = self._parse_cell_date(cell_value)
-        if dt:
-            return dt.strftime("%d/%m/%Y")
-        return str(cell_value) if cell_value else ""
-    
     def _normalize_range_data(self, data):
         """Normalizza i dati letti da un range Excel."""
         if not data:
@@ -391,14 +415,3 @@ class ExcelManager:
                 return [formulas]
         
         return list(formulas)
-    
-    def _extract_hyperlink_path(self, formula_data):
-        """Estrae il path da una formula HYPERLINK."""
-        try:
-            formula = formula_data[0] if isinstance(formula_data, tuple) else formula_data
-            match = re.search(r'HYPERLINK\("([^"]+)"', str(formula))
-            if match:
-                return match.group(1)
-        except:
-            pass
-        return ""
@@ -0,0 +1,211 @@
+"""
+Lettura del registro Excel senza automazione COM (openpyxl, sola lettura)
+"""
+
+import logging
+from datetime import datetime, timezone
+import openpyxl
+from src.utils.config import EXCEL_DB_PATH
+from src.data.sync_rows import normalize_rda_number, build_sync_row, SYNC_BLOCK_SIZE
+
+logger = logging.getLogger("RDA_Bot")
+
+# Colonne A:L del registro
+REGISTER_COLUMNS = 12
+
+
+def _as_com_value(value):
+    """
+    Converte un valore openpyxl nel tipo restituito da Excel via COM, così
+    che le tuple generate coincidano con quelle di ExcelManager:
+    - i numeri sono sempre float
+    - le date sono datetime con tzinfo UTC, come i pywintypes.datetime
+    """
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int):
+        return float(value)
+    if isinstance(value, datetime) and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+class ExcelReader:
+    """
+    Lettore del registro RDA compatibile con ExcelManager per le sole
+    operazioni di lettura. Usa openpyxl in modalità read-only (streaming),
+    senza avviare Excel: funziona anche su Linux e con Excel occupato.
+    """
+    
+    def __init__(self, path=None):
+        self.path = path or EXCEL_DB_PATH
+        self.workbook = None
+        self.sheet = None
+        self._is_open = False
+        self._rda_index = None
+    
+    @property
+    def known_rda_numbers(self):
+        """Numeri RDA (normalizzati) presenti nel registro."""
+        if self._rda_index is None:
+            self._rda_index = {
+                normalize_rda_number(row_val[0])
+                for row_val in self._iter_register_rows()
+                if row_val[0]
+            }
+        return self._rda_index
+    
+    def open(self, read_only=True):
+        """
+        Apre il file Excel in sola lettura.
+        
+        Returns:
+            bool: True se apertura riuscita, False altrimenti
+        """
+        if not read_only:
+            logger.error("ExcelReader supporta solo l'apertura in sola lettura")
+            return False
+        
+        try:
+            # keep_vba non serve: il file non viene mai riscritto
+            self.workbook = openpyxl.load_workbook(
+                self.path, read_only=True, data_only=False, keep_links=False
+            )
+            self.sheet = self.workbook.active
+            self._is_open = True
+            return True
+            
+        except Exception as e:
+            logger.error(f"Errore apertura Excel (openpyxl): {e}")
+            self.close(save=False)
+            return False
+    
+    def close(self, save=False):
+        """
+        Chiude il file Excel.
+        
+        Args:
+            save: Ignorato, il lettore non modifica il file
+        """
+        if save:
+            logger.warning("ExcelReader è in sola lettura: salvataggio ignorato")
+        
+        try:
+            if self.workbook:
+                self.workbook.close()
+        except Exception as e:
+            logger.error(f"Errore chiusura Excel (openpyxl): {e}")
+        finally:
+            self.workbook = None
+            self.sheet = None
+            self._is_open = False
+            self._rda_index = None
+    
+    def check_if_exists(self, rda_number):
+        """
+        Verifica se un numero RDA esiste già nel registro.
+        
+        Returns:
+            bool: True se esiste (o se il file non è aperto), False altrimenti
+        """
+        if not self._is_open:
+            return True  # Fail safe
+        
+        return normalize_rda_number(rda_number) in self.known_rda_numbers
+    
+    def get_all_data_for_sync(self):
+        """
+        Legge tutti i dati dal foglio per la sincronizzazione con SQLite.
+        Restituisce le stesse tuple di ExcelManager.get_all_data_for_sync.
+        
+        Returns:
+            list: Lista di tuple con i dati
+        """
+        if not self._is_open:
+            return []
+        
+        data_rows = []
+        
+        try:
+            for block in self.iter_sync_blocks():
+                data_rows.extend(block)
+        except Exception as e:
+            logger.error(f"Errore lettura dati per sync (openpyxl): {e}")
+        
+        return data_rows
+    
+    def iter_sync_blocks(self, block_size=SYNC_BLOCK_SIZE):
+        """
+        Legge il foglio a blocchi di righe, come ExcelManager.iter_sync_blocks.
+        Gli errori di lettura vengono propagati.
+        
+        Args:
+            block_size: Numero massimo di righe per blocco
+        
+        Yields:
+            list: Tuple dei dati del blocco (righe vuote escluse)
+        """
+        if not self._is_open:
+            return
+        
+        block = []
+        for row_val in self._iter_register_rows():
+            if all(v is None for v in row_val):
+                continue
+            
+            # In modalità data_only=False la colonna H contiene la formula HYPERLINK
+            block.append(build_sync_row(row_val, row_val[7]))
+            if len(block) >= block_size:
+                yield block
+                block = []
+        
+        if block:
+            yield block
+    
+    def _iter_register_rows(self):
+        """
+        Scorre le righe A:L dalla riga 2 fino all'ultima con la colonna A
+        valorizzata, come ExcelManager._get_last_row (End(xlUp) sulla colonna A).
+        Le righe successive vengono trattenute finché non compare un nuovo
+        valore in colonna A, così la memoria resta limitata.
+        """
+        pending = []
+        
+        for raw in self.sheet.iter_rows(min_row=2, max_col=REGISTER_COLUMNS, values_only=True):
+            row_val = tuple(_as_com_value(v) for v in raw)
+            if len(row_val) < REGISTER_COLUMNS:
+                row_val += (None,) * (REGISTER_COLUMNS - len(row_val))
+            
+            pending.append(row_val)
+            if row_val[0] is not None:
+                yield from pending
+                pending = []
+
+
+def open_register_for_read(path=None):
+    """
+    Apre il registro per la sola lettura scegliendo il backend disponibile:
+    openpyxl (nessun processo Excel) e, se fallisce, Excel via COM.
+    Con il fallback COM il chiamante deve aver inizializzato COM nel thread.
+    
+    Args:
+        path: Percorso del file Excel (default EXCEL_DB_PATH)
+    
+    Returns:
+        ExcelReader o ExcelManager aperto, None se nessun backend è disponibile
+    """
+    reader = ExcelReader(path)
+    if reader.open():
+        return reader
+    
+    logger.warning("Lettura openpyxl non riuscita, uso Excel via COM")
+    try:
+        from src.data.excel_manager import ExcelManager
+    except ImportError as e:
+        logger.error(f"Automazione COM non disponibile: {e}")
+        return None
+    
+    excel_mgr = ExcelManager(path)
+    if excel_mgr.open(read_only=True):
+        return excel_mgr
+    return None
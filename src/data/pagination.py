@@ -0,0 +1,154 @@
+"""
+Paginazione a chiave (keyset) sulle righe di rda_data: ogni pagina riparte
+dalla chiave dell'ultima riga della precedente, sull'indice
+dell'ordinamento, senza OFFSET.
+"""
+
+import json
+import base64
+from src.data.database import get_connection, filter_clause
+
+# Righe per pagina nella paginazione a chiave (query_page)
+PAGE_SIZE = 500
+
+# Ordinamenti di query_page: colonne della chiave (l'ultima è id, univoca)
+# e direzione; ogni chiave è coperta da un indice
+PAGE_SORTS = {
+    "date": (("data_rda_iso", "id"), "DESC"),
+    "register": (("id",), "ASC"),
+    "rda": (("rda_number", "id"), "ASC"),
+}
+
+# Colonne della chiave che possono essere NULL (righe del registro senza
+# numero RDA): ordinate e confrontate come '', perché il confronto a chiave
+# con NULL non è mai vero e la paginazione si fermerebbe
+_NULLABLE_KEYS = ("rda_number",)
+
+# Oltre questo numero di righe count_rows smette di contare
+COUNT_CAP = 10000
+
+
+def _encode_page_token(sort, values):
+    """Token opaco con la chiave dell'ultima riga restituita."""
+    payload = json.dumps([sort, list(values)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def _decode_page_token(token, sort):
+    """Valori della chiave contenuti nel token (ValueError se non valido)."""
+    try:
+        token_sort, values = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Token di paginazione non valido: {e}") from None
+    if token_sort != sort or len(values) != len(PAGE_SORTS[sort][0]):
+        raise ValueError("Token di paginazione di un altro ordinamento")
+    return values
+
+
+def _key_sql(col):
+    """Espressione SQL di una colonna della chiave (vedi _NULLABLE_KEYS)."""
+    return f"IFNULL(rda_data.{col}, '')" if col in _NULLABLE_KEYS else f"rda_data.{col}"
+
+
+def _key_value(row, col):
+    """Valore di una colonna della chiave, come confrontato da _key_sql."""
+    value = row[col]
+    return "" if value is None and col in _NULLABLE_KEYS else value
+
+
+def query_page(filters=None, sort="date", after=None, limit=PAGE_SIZE):
+    """
+    Restituisce una pagina di righe con paginazione a chiave (keyset): la
+    pagina successiva riparte dalla chiave dell'ultima riga sull'indice
+    dell'ordinamento, senza OFFSET, quindi ogni pagina costa uguale anche
+    in fondo a un risultato molto grande.
+    
+    Args:
+        filters: Dictionary con chiavi filtro (vedi search_rda), None = tutte
+        sort: Ordinamento, una chiave di PAGE_SORTS
+        after: Token restituito dalla pagina precedente (None = prima pagina)
+        limit: Numero massimo di righe
+    
+    Returns:
+        tuple: (lista di righe, token della pagina successiva o None se finite)
+    
+    Raises:
+        ValueError: Se l'ordinamento o il token non sono validi
+    """
+    if sort not in PAGE_SORTS:
+        raise ValueError(f"Ordinamento non previsto: {sort}")
+    key_columns, direction = PAGE_SORTS[sort]
+    key = ", ".join(_key_sql(col) for col in key_columns)
+    
+    conn = get_connection()
+    try:
+        from_clause, conditions, params, _ = filter_clause(conn.cursor(), filters or {})
+        if after is not None:
+            values = _decode_page_token(after, sort)
+            placeholders = ", ".join("?" * len(values))
+            conditions.append(f"({key}) {'<' if direction == 'DESC' else '>'} ({placeholders})")
+            params.extend(values)
+        
+        where = " AND ".join(conditions) or "1=1"
+        order = ", ".join(f"{_key_sql(col)} {direction}" for col in key_columns)
+        rows = conn.execute(f"""
+            SELECT rda_data.* FROM {from_clause}
+            WHERE {where}
+            ORDER BY {order}
+            LIMIT ?
+        """, params + [limit + 1]).fetchall()
+    finally:
+        conn.close()
+    
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, _encode_page_token(sort, [_key_value(rows[-1], col) for col in key_columns])
+
+
+def iter_query(filters=None, sort="date", page_size=PAGE_SIZE):
+    """
+    Scorre tutte le righe del filtro pagina per pagina, con memoria costante.
+    Tra una pagina e l'altra il database non resta bloccato in lettura.
+    
+    Yields:
+        sqlite3.Row: Righe nell'ordine richiesto
+    """
+    after = None
+    while True:
+        rows, after = query_page(filters, sort, after, page_size)
+        yield from rows
+        if after is None:
+            return
+
+
+def count_rows(filters=None, cap=COUNT_CAP):
+    """
+    Conteggio approssimato delle righe di un filtro: senza filtri è il
+    totale pre-aggregato, altrimenti il conteggio si ferma a cap.
+    
+    Args:
+        filters: Dictionary con chiavi filtro (vedi search_rda)
+        cap: Numero massimo di righe contate
+    
+    Returns:
+        tuple: (numero di righe, True se esatto, False se sono almeno cap)
+    """
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        if not filters:
+            cursor.execute("SELECT cnt FROM stat_summary WHERE stat = 'rows' AND key = ''")
+            row = cursor.fetchone()
+            return (row[0] if row else 0), True
+        
+        from_clause, conditions, params, _ = filter_clause(cursor, filters)
+        where = " AND ".join(conditions) or "1=1"
+        cursor.execute(f"""
+            SELECT COUNT(*) FROM (SELECT 1 FROM {from_clause} WHERE {where} LIMIT ?)
+        """, params + [cap + 1])
+        count = cursor.fetchone()[0]
+    finally:
+        conn.close()
+    
+    return min(count, cap), count <= cap
@@ -0,0 +1,171 @@
+"""
+Cache dei risultati delle query di lettura, invalidata quando il database cambia
+"""
+
+import sys
+import sqlite3
+import threading
+import weakref
+from collections import OrderedDict
+
+# Memoria massima occupata dai risultati in cache
+QUERY_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Righe misurate per stimare la dimensione di un risultato grande
+SIZE_SAMPLE_ROWS = 100
+
+
+def _estimate_size(value):
+    """Stima (in byte) della memoria occupata da un risultato."""
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            _estimate_size(k) + _estimate_size(v) for k, v in value.items()
+        )
+    if isinstance(value, (list, tuple, sqlite3.Row)):
+        size = sys.getsizeof(value)
+        if len(value) > SIZE_SAMPLE_ROWS and isinstance(value, list):
+            sample = sum(_estimate_size(v) for v in value[:SIZE_SAMPLE_ROWS])
+            return size + sample * len(value) // SIZE_SAMPLE_ROWS
+        return size + sum(_estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class QueryCache:
+    """
+    Memorizza i risultati delle query per testo SQL e parametri.
+    
+    Prima di ogni lettura viene verificato che il database non sia cambiato:
+    - PRAGMA data_version della connessione cambia quando un'altra
+      connessione (anche di un altro processo o PC) conferma una scrittura
+    - la generazione in db_meta cambia a ogni scrittura di sincronizzazione,
+      comprese quelle fatte dalla stessa connessione (insieme a db_id, che
+      cambia se il file viene ricreato)
+    In entrambi i casi l'intera cache viene svuotata. Per una connessione
+    mai vista (es. quella di un nuovo thread della GUI) data_version non ha
+    un valore precedente con cui confrontarlo: vale solo la generazione.
+    Oltre max_bytes i risultati usati meno di recente vengono scartati.
+    
+    Le connessioni devono essere quelle del pool (PooledConnection): con
+    una sqlite3.Connection semplice le query vengono eseguite senza cache.
+    """
+    
+    def __init__(self, max_bytes=QUERY_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # chiave -> (risultato, dimensione)
+        self._size = 0
+        self._generation = None
+        self._epoch = 0  # Incrementato a ogni svuotamento
+        self._data_versions = weakref.WeakKeyDictionary()  # connessione -> data_version
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+    
+    def fetchall(self, conn, sql, params=()):
+        """
+        Esegue la query (o restituisce il risultato in cache).
+        
+        Returns:
+            list: Righe del risultato (copia della lista in cache)
+        """
+        rows = self.get_or_compute(conn, (sql, tuple(params)), lambda: conn.execute(sql, params).fetchall())
+        return list(rows)
+    
+    def get_or_compute(self, conn, key, compute):
+        """
+        Restituisce il valore in cache per key, calcolandolo con compute()
+        se assente o se il database è cambiato. Il valore restituito è
+        condiviso con la cache e non va modificato.
+        """
+        if not self._validate(conn):
+            with self._lock:
+                self.misses += 1
+            return compute()
+        
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            epoch = self._epoch
+        
+        value = compute()
+        size = _estimate_size(value)
+        
+        with self._lock:
+            # Non memorizzare se nel frattempo la cache è stata svuotata
+            if size <= self.max_bytes and epoch == self._epoch and key not in self._entries:
+                self._entries[key] = (value, size)
+                self._size += size
+                while self._size > self.max_bytes:
+                    _, (_, evicted_size) = self._entries.popitem(last=False)
+                    self._size -= evicted_size
+                    self.evictions += 1
+        return value
+    
+    def _validate(self, conn):
+        """
+        Svuota la cache se il database è cambiato dall'ultimo controllo.
+        
+        Returns:
+            bool: False se la connessione non può essere seguita (niente cache)
+        """
+        try:
+            weakref.ref(conn)
+        except TypeError:
+            return False
+        
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        try:
+            # Generazione e identità del file: un database ricreato riparte
+            # dalla stessa generazione con un altro db_id
+            meta = dict(conn.execute(
+                "SELECT key, value FROM db_meta WHERE key IN ('generation', 'db_id')"
+            ).fetchall())
+            generation = (meta.get('db_id'), meta.get('generation')) if meta else None
+        except sqlite3.OperationalError:
+            generation = None  # Database senza db_meta: vale solo data_version
+        
+        with self._lock:
+            previous = self._data_versions.get(conn)
+            changed = (previous is not None and previous != data_version) or generation != self._generation
+            self._data_versions[conn] = data_version
+            if changed:
+                if self._entries:
+                    self.invalidations += 1
+                self._clear()
+                self._generation = generation
+        return True
+    
+    def _clear(self):
+        """Svuota la cache (da chiamare con _lock)."""
+        self._entries.clear()
+        self._size = 0
+        self._epoch += 1
+    
+    def clear(self):
+        """Svuota la cache."""
+        with self._lock:
+            self._clear()
+    
+    def stats(self):
+        """
+        Metriche della cache.
+        
+        Returns:
+            dict: hits, misses, hit_rate, invalidations, evictions, entries, bytes
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'invalidations': self.invalidations,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._size,
+            }
@@ -0,0 +1,105 @@
+"""
+Copia locale del registro Excel per le sole letture.
+Il file sulla condivisione di rete viene letto una volta, in modo sequenziale,
+e la copia viene riutilizzata finché l'impronta del registro non cambia.
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import logging
+from src.utils.config import REGISTER_CACHE_DIR
+from src.utils.utils import file_fingerprint
+
+logger = logging.getLogger("RDA_Bot")
+
+# Dimensione dei blocchi nella copia sequenziale del registro
+COPY_BUFFER_SIZE = 8 * 1024 * 1024
+
+
+def _cache_path(path):
+    """Percorso della copia locale di un registro (uno per percorso sorgente)."""
+    source = os.path.normcase(os.path.abspath(path))
+    name, ext = os.path.splitext(os.path.basename(path))
+    digest = hashlib.sha1(source.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(REGISTER_CACHE_DIR, f"{name}_{digest}{ext}")
+
+
+def _load_meta(meta_path):
+    """Impronta del registro da cui è stata fatta la copia locale."""
+    try:
+        with open(meta_path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _copy_file(src, dst):
+    """
+    Copia src in dst con una lettura sequenziale a blocchi grandi.
+    La copia viene scritta su un file temporaneo e sostituita solo a fine
+    lettura, così una copia interrotta non sovrascrive quella precedente.
+    La data di modifica viene mantenuta (serve al confronto delle impronte).
+    """
+    tmp_path = dst + ".tmp"
+    try:
+        with open(src, 'rb') as fsrc, open(tmp_path, 'wb') as fdst:
+            shutil.copyfileobj(fsrc, fdst, COPY_BUFFER_SIZE)
+        shutil.copystat(src, tmp_path)
+        os.replace(tmp_path, dst)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def snapshot_register(path, fingerprint=None):
+    """
+    Restituisce una copia locale aggiornata del registro.
+    
+    La copia esistente viene riutilizzata se l'impronta del registro coincide
+    con quella da cui è stata fatta. Se il registro non è leggibile (file
+    bloccato o rete non raggiungibile) viene usata l'ultima copia locale.
+    
+    Args:
+        path: Percorso del registro Excel
+        fingerprint: Impronta attuale del registro (None se non disponibile)
+    
+    Returns:
+        tuple: (percorso della copia locale, impronta della copia)
+    
+    Raises:
+        OSError: Se il registro non è leggibile e non esiste una copia locale
+    """
+    cache_path = _cache_path(path)
+    meta_path = cache_path + ".json"
+    cached = _load_meta(meta_path) if os.path.exists(cache_path) else None
+    
+    if fingerprint is not None and cached == fingerprint:
+        logger.info("Copia locale del registro già aggiornata")
+        return cache_path, cached
+    
+    # exist_ok: più registri possono essere copiati in parallelo
+    os.makedirs(REGISTER_CACHE_DIR, exist_ok=True)
+    
+    try:
+        # L'impronta salvata va invalidata prima di sostituire la copia
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        _copy_file(path, cache_path)
+    except OSError as e:
+        if cached is None:
+            raise
+        logger.warning(f"Registro non leggibile ({e}): uso l'ultima copia locale")
+        with open(meta_path, 'w') as f:
+            json.dump(cached, f)
+        return cache_path, cached
+    
+    # Impronta del contenuto effettivamente copiato: se il registro è cambiato
+    # durante la copia, la differenza verrà rilevata alla prossima sync
+    snapshot_fp = file_fingerprint(cache_path)
+    with open(meta_path, 'w') as f:
+        json.dump(snapshot_fp, f)
+    
+    logger.info(f"Registro copiato in locale ({snapshot_fp['size'] / 1024:.0f} KB)")
+    return cache_path, snapshot_fp
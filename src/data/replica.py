@@ -0,0 +1,219 @@
+"""
+Copia locale di sola lettura del database condiviso, usata dalla GUI.
+Le letture avvengono sul disco locale (o in memoria) invece che sul file
+in rete; la copia viene rifatta con l'API di backup di SQLite solo quando
+cambia la versione del database condiviso (generazione dei dati, struttura
+o identità del file).
+"""
+
+import os
+import re
+import hashlib
+import logging
+import sqlite3
+import threading
+from urllib.request import pathname2url
+from src.utils.config import DB_REPLICA_DIR
+from src.data.connections import get_pooled_connection, close_path
+
+logger = logging.getLogger("RDA_Bot")
+
+# Attesa massima (secondi) del lock sul database condiviso durante la copia
+REPLICA_COPY_TIMEOUT = 30
+
+
+def _read_version(conn):
+    """
+    Versione di un database: (generazione dei dati, impronta di identità e
+    struttura). Cambia a ogni scrittura, migrazione o ricreazione del file.
+    """
+    meta = dict(conn.execute("SELECT key, value FROM db_meta WHERE key IN ('generation', 'db_id')").fetchall())
+    schema_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+    fingerprint = hashlib.sha1(f"{meta.get('db_id', '')}:{schema_version}".encode("utf-8")).hexdigest()[:12]
+    return meta.get('generation', 0), fingerprint
+
+
+class DatabaseReplica:
+    """
+    Copia locale del database condiviso, un file per versione
+    (<nome>_<hash del percorso>_g<generazione>_<impronta>.db). L'impronta
+    combina l'identità del database (db_id in db_meta, nuova se il file
+    viene ricreato) e la versione della struttura (PRAGMA schema_version):
+    la stessa generazione di un database ricreato o migrato dà un file
+    diverso. Un file non viene più modificato dopo la copia, quindi viene
+    aperto con mode=ro e immutable=1: nessun lock e nessun controllo di
+    modifiche a ogni lettura. Avere nomi diversi per versioni diverse evita
+    anche di sostituire un file ancora aperto (non consentito su Windows).
+    
+    A ogni aggiornamento le nuove connessioni usano la nuova copia; quelle
+    sulla copia precedente restano valide fino all'aggiornamento successivo,
+    quando la copia più vecchia viene chiusa ed eliminata.
+    """
+    
+    def __init__(self, source, replica_dir=None, in_memory=False):
+        """
+        Args:
+            source: Percorso del database condiviso
+            replica_dir: Cartella delle copie (default DB_REPLICA_DIR, in AppData)
+            in_memory: Se True la copia viene anche caricata in memoria
+        """
+        self.source = source
+        self.replica_dir = replica_dir or DB_REPLICA_DIR
+        self.in_memory = in_memory
+        name = os.path.splitext(os.path.basename(source))[0]
+        digest = hashlib.sha1(os.path.normcase(os.path.abspath(source)).encode("utf-8")).hexdigest()[:12]
+        self._prefix = f"{name}_{digest}"
+        self._lock = threading.Lock()
+        self._current = None   # (versione, uri, connessione che tiene la copia in memoria)
+        self._previous = None
+    
+    @property
+    def ready(self):
+        """True se è disponibile una copia da leggere."""
+        return self._current is not None
+    
+    @property
+    def generation(self):
+        """Generazione dei dati della copia in uso (None se non disponibile)."""
+        return self._current[0][0] if self._current else None
+    
+    def connect(self):
+        """Connessione del thread corrente alla copia in uso (sola lettura)."""
+        return get_pooled_connection(self._current[1], read_only=True)
+    
+    def open_existing(self):
+        """
+        Apre la copia locale più recente senza accedere al database
+        condiviso, per mostrare subito i dati all'avvio.
+        
+        Returns:
+            bool: True se una copia è disponibile
+        """
+        with self._lock:
+            if self._current is None:
+                versions = self._local_versions()
+                if not versions:
+                    return False
+                self._switch(versions[-1])
+            return True
+    
+    def refresh(self):
+        """
+        Rifà la copia se la versione del database condiviso è cambiata.
+        
+        Returns:
+            bool: True se la copia è stata aggiornata
+        """
+        with self._lock:
+            if self._current is not None and self._current[0] == self._source_version():
+                return False
+            
+            copied = self._copy()
+            self._switch(copied)
+            self._remove_old_copies()
+            return True
+    
+    def close(self):
+        """Chiude le connessioni alle copie (i file restano per il prossimo avvio)."""
+        with self._lock:
+            for copy in (self._previous, self._current):
+                self._close_copy(copy)
+            self._current = self._previous = None
+    
+    def _file_path(self, version):
+        generation, fingerprint = version
+        return os.path.join(self.replica_dir, f"{self._prefix}_g{generation}_{fingerprint}.db")
+    
+    def _local_versions(self):
+        """Versioni delle copie presenti nella cartella, dalla meno recente."""
+        pattern = re.compile(re.escape(self._prefix) + r"_g(\d+)_([0-9a-f]+)\.db$")
+        try:
+            names = os.listdir(self.replica_dir)
+        except OSError:
+            return []
+        copies = []
+        for match in map(pattern.match, names):
+            if match:
+                version = (int(match.group(1)), match.group(2))
+                try:
+                    copies.append((os.path.getmtime(self._file_path(version)), version))
+                except OSError:
+                    pass  # Eliminata nel frattempo
+        return [version for _, version in sorted(copies)]
+    
+    def _source_version(self):
+        """Versione del database condiviso (vedi _read_version)."""
+        conn = sqlite3.connect(self.source, timeout=REPLICA_COPY_TIMEOUT)
+        try:
+            return _read_version(conn)
+        finally:
+            conn.close()
+    
+    def _copy(self):
+        """
+        Copia il database condiviso con l'API di backup, in un solo passo:
+        la copia è coerente anche se nel frattempo qualcuno scrive.
+        
+        Returns:
+            tuple: Versione dei dati copiati
+        """
+        os.makedirs(self.replica_dir, exist_ok=True)
+        tmp_path = os.path.join(self.replica_dir, f"{self._prefix}.tmp")
+        
+        source = sqlite3.connect(self.source, timeout=REPLICA_COPY_TIMEOUT)
+        try:
+            # Versione letta prima della copia (il backup cambia lo
+            # schema_version del file copiato): una scrittura avvenuta nel
+            # frattempo fa solo ripetere la copia al prossimo aggiornamento
+            version = _read_version(source)
+            target = sqlite3.connect(tmp_path)
+            try:
+                source.backup(target)
+                # Journal classico: la copia immutabile non ha file -wal da leggere
+                target.execute("PRAGMA journal_mode = DELETE")
+            finally:
+                target.close()
+        finally:
+            source.close()
+        
+        # Un file rimasto con la stessa versione (es. da una sessione
+        # precedente) viene comunque sostituito dalla copia appena fatta
+        os.replace(tmp_path, self._file_path(version))
+        logger.info(f"Copia locale del database aggiornata (generazione {version[0]})")
+        return version
+    
+    def _switch(self, version):
+        """Rende la copia della versione indicata quella in uso."""
+        path = self._file_path(version)
+        uri = f"file:{pathname2url(path)}?mode=ro&immutable=1"
+        anchor = None
+        if self.in_memory:
+            # Database in memoria condiviso tra le connessioni del processo,
+            # vivo finché resta aperta la connessione anchor
+            uri = f"file:{self._prefix}_g{version[0]}_{version[1]}?mode=memory&cache=shared"
+            anchor = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            disk = sqlite3.connect(f"file:{pathname2url(path)}?mode=ro&immutable=1", uri=True)
+            try:
+                disk.backup(anchor)
+            finally:
+                disk.close()
+        
+        self._close_copy(self._previous)
+        self._previous = self._current
+        self._current = (version, uri, anchor)
+    
+    def _close_copy(self, copy):
+        if copy is not None:
+            close_path(copy[1])
+            if copy[2] is not None:
+                copy[2].close()
+    
+    def _remove_old_copies(self):
+        """Elimina i file delle copie né in uso né precedenti."""
+        keep = {copy[0] for copy in (self._current, self._previous) if copy}
+        for version in self._local_versions():
+            if version not in keep:
+                try:
+                    os.remove(self._file_path(version))
+                except OSError:
+                    pass  # Ancora aperta: verrà eliminata al prossimo aggiornamento
@@ -0,0 +1,304 @@
+"""
+Misura facoltativa dei tempi delle query SQL: numero di esecuzioni, tempo
+totale e p95 per istruzione normalizzata, log delle query lente e verifica
+dei piani di esecuzione (EXPLAIN QUERY PLAN)
+"""
+
+import re
+import json
+import time
+import atexit
+import sqlite3
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from src.utils.config import SQL_SLOW_QUERY_MS, SQL_SLOW_LOG_PATH, SQL_METRICS_PATH
+
+logger = logging.getLogger("RDA_Bot")
+
+# Durate conservate per istruzione per il calcolo del p95
+LATENCY_SAMPLES = 1000
+
+# Tabelle che non devono essere lette per intero dalle query principali
+SCAN_CHECKED_TABLES = ("rda_data", "rda_header", "stat_summary")
+
+# Misure in corso (None = strumentazione disattivata)
+active = None
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+
+def normalize_sql(sql):
+    """
+    Testo dell'istruzione senza valori letterali e spazi superflui, così
+    le esecuzioni con valori diversi vengono contate insieme.
+    """
+    sql = _STRING_LITERAL.sub("?", sql)
+    sql = _NUMBER_LITERAL.sub("?", sql)
+    sql = " ".join(sql.split())
+    return _PLACEHOLDER_LIST.sub("(?, ...)", sql)
+
+
+def _percentile(samples, fraction):
+    """Percentile (nearest rank) di una sequenza di durate."""
+    ordered = sorted(samples)
+    return ordered[max(0, int(len(ordered) * fraction + 0.999999) - 1)]
+
+
+class SqlMetrics:
+    """
+    Tempi delle istruzioni SQL eseguite dalle connessioni del pool.
+    
+    Ogni esecuzione comprende execute e lettura delle righe (fetch); le
+    istruzioni più lente di slow_ms vengono scritte nel log delle query
+    lente con i valori dei parametri.
+    """
+    
+    def __init__(self, slow_ms=200, slow_log=None):
+        self.slow_ms = slow_ms
+        self.slow_log = slow_log
+        self._stats = {}  # istruzione normalizzata -> dict delle misure
+        self._lock = threading.Lock()
+    
+    def record(self, sql, seconds, expanded=None):
+        """
+        Registra un'esecuzione.
+        
+        Args:
+            sql: Testo dell'istruzione
+            seconds: Durata in secondi
+            expanded: Istruzione con i valori dei parametri (per il log)
+        """
+        key = normalize_sql(sql)
+        with self._lock:
+            entry = self._stats.get(key)
+            if entry is None:
+                entry = self._stats[key] = {
+                    'sql': sql, 'count': 0, 'total': 0.0, 'max': 0.0,
+                    'samples': deque(maxlen=LATENCY_SAMPLES),
+                }
+            entry['count'] += 1
+            entry['total'] += seconds
+            entry['max'] = max(entry['max'], seconds)
+            entry['samples'].append(seconds)
+        
+        if seconds * 1000 >= self.slow_ms:
+            self._log_slow(expanded or sql, seconds)
+    
+    def _log_slow(self, sql, seconds):
+        """Scrive una query lenta nel log dedicato (o nel log generale)."""
+        text = " ".join(sql.split())
+        if not self.slow_log:
+            logger.warning(f"Query lenta ({seconds * 1000:.0f} ms): {text}")
+            return
+        try:
+            with open(self.slow_log, "a", encoding="utf-8") as f:
+                f.write(f"{datetime.now():%Y-%m-%d %H:%M:%S}\t{seconds * 1000:.1f} ms\t{text}\n")
+        except OSError as e:
+            logger.warning(f"Log query lente non scrivibile: {e}")
+    
+    def snapshot(self):
+        """
+        Misure per istruzione, dalla più costosa in tempo totale.
+        
+        Returns:
+            list: dict con statement, count, total_ms, avg_ms, p95_ms, max_ms
+        """
+        with self._lock:
+            items = [(key, dict(entry, samples=list(entry['samples']))) for key, entry in self._stats.items()]
+        
+        return sorted((
+            {
+                'statement': key,
+                'count': entry['count'],
+                'total_ms': round(entry['total'] * 1000, 3),
+                'avg_ms': round(entry['total'] * 1000 / entry['count'], 3),
+                'p95_ms': round(_percentile(entry['samples'], 0.95) * 1000, 3),
+                'max_ms': round(entry['max'] * 1000, 3),
+            }
+            for key, entry in items
+        ), key=lambda stat: stat['total_ms'], reverse=True)
+    
+    def statements(self):
+        """
+        Testo originale (il primo eseguito) di ogni istruzione misurata,
+        da usare con query_plan e full_scans.
+        """
+        with self._lock:
+            return [entry['sql'] for entry in self._stats.values()]
+    
+    def export(self, path):
+        """Salva le misure in un file JSON."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                'exported_at': datetime.now().isoformat(timespec="seconds"),
+                'slow_ms': self.slow_ms,
+                'statements': self.snapshot(),
+            }, f, indent=2, ensure_ascii=False)
+        logger.info(f"Misure SQL salvate in {path}")
+    
+    def reset(self):
+        """Azzera le misure."""
+        with self._lock:
+            self._stats.clear()
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """
+    Cursore che misura il tempo di ogni istruzione, dall'execute alla
+    lettura dell'ultima riga. L'esecuzione viene registrata quando le
+    righe sono finite, al successivo execute o alla chiusura del cursore.
+    """
+    
+    _sql = None
+    _elapsed = 0.0
+    
+    def _timed(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._elapsed += time.perf_counter() - start
+    
+    def _begin(self, sql):
+        self._flush()
+        self._sql = sql
+        self._elapsed = 0.0
+        if hasattr(self.connection, "traced_sql"):
+            self.connection.traced_sql = None
+    
+    def _flush(self):
+        metrics = active
+        if self._sql is None or metrics is None:
+            self._sql = None
+            return
+        expanded = getattr(self.connection, "traced_sql", None)
+        metrics.record(self._sql, self._elapsed, expanded)
+        self._sql = None
+    
+    def execute(self, sql, parameters=()):
+        self._begin(sql)
+        self._timed(super().execute, sql, parameters)
+        if self.description is None:
+            self._flush()  # Nessuna riga da leggere
+        return self
+    
+    def executemany(self, sql, seq_of_parameters):
+        self._begin(sql)
+        self._timed(super().executemany, sql, seq_of_parameters)
+        self._flush()
+        return self
+    
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if row is None:
+            self._flush()
+        return row
+    
+    def fetchmany(self, size=None):
+        rows = self._timed(super().fetchmany, self.arraysize if size is None else size)
+        if not rows:
+            self._flush()
+        return rows
+    
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        self._flush()
+        return rows
+    
+    def __next__(self):
+        try:
+            return self._timed(super().__next__)
+        except StopIteration:
+            self._flush()
+            raise
+    
+    def close(self):
+        self._flush()
+        super().close()
+    
+    def __del__(self):
+        self._flush()
+
+
+def install(conn):
+    """
+    Collega la connessione alla strumentazione: il trace callback conserva
+    l'ultima istruzione eseguita con i valori dei parametri, usata nel log
+    delle query lente.
+    """
+    if getattr(conn, "traced_sql", False) is not False:
+        return
+    conn.traced_sql = None
+    
+    def trace(statement):
+        if active is not None and conn.traced_sql is None:
+            conn.traced_sql = statement
+    
+    conn.set_trace_callback(trace)
+
+
+def enable(slow_ms=200, slow_log=None):
+    """
+    Attiva la strumentazione sulle connessioni del pool.
+    
+    Args:
+        slow_ms: Soglia (ms) oltre la quale una query finisce nel log delle query lente
+        slow_log: File del log delle query lente (None = log generale)
+    
+    Returns:
+        SqlMetrics: Le misure raccolte da ora in poi
+    """
+    global active
+    active = SqlMetrics(slow_ms, slow_log)
+    logger.info(f"Misura dei tempi SQL attiva (query lente oltre {slow_ms} ms)")
+    return active
+
+
+def disable():
+    """Disattiva la strumentazione (le misure raccolte restano nell'oggetto restituito da enable)."""
+    global active
+    active = None
+
+
+def export(path=SQL_METRICS_PATH):
+    """Salva le misure correnti (se la strumentazione è attiva)."""
+    if active is not None:
+        active.export(path)
+
+
+def query_plan(conn, sql, params=None):
+    """
+    Piano di esecuzione di un'istruzione. Senza parametri i segnaposto
+    vengono legati a NULL (il piano non dipende dai valori).
+    
+    Returns:
+        list: Righe di dettaglio di EXPLAIN QUERY PLAN
+    """
+    if params is None:
+        params = [None] * _STRING_LITERAL.sub("", sql).count("?")
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()]
+
+
+def full_scans(conn, sql, params=None, tables=SCAN_CHECKED_TABLES):
+    """
+    Tabelle lette per intero (SCAN senza indice) dall'istruzione.
+    
+    Returns:
+        list: Nomi delle tabelle di tables scansionate per intero
+    """
+    scans = []
+    for detail in query_plan(conn, sql, params):
+        match = re.match(r"SCAN (\w+)(?: AS \w+)?$", detail)
+        if match and match.group(1) in tables:
+            scans.append(match.group(1))
+    return scans
+
+
+# Strumentazione attivata da configurazione (sql_slow_query_ms)
+if SQL_SLOW_QUERY_MS:
+    enable(SQL_SLOW_QUERY_MS, SQL_SLOW_LOG_PATH)
+    atexit.register(export)
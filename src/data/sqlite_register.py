@@ -0,0 +1,148 @@
+"""
+Registro RDA su database SQLite (modalità register_mode = "sqlite")
+"""
+
+import logging
+from src.data import database
+from src.data.archive import query_archives
+from src.data.sync import site_for_path
+from src.utils.config import EXCEL_DB_PATH
+from src.data.sync_rows import normalize_rda_number, build_sync_row, build_register_rows
+
+logger = logging.getLogger("RDA_Bot")
+
+
+class SqliteRegister:
+    """
+    Registro RDA con il database SQLite come archivio principale.
+    Espone le stesse operazioni di ExcelManager usate dal bot, così il bot
+    può scrivere direttamente nel database; il file Excel viene poi
+    rigenerato con export_register.
+    """
+    
+    def __init__(self, site=None):
+        """
+        Args:
+            site: Sede delle righe aggiunte (default: quella configurata
+                  per il registro EXCEL_DB_PATH)
+        """
+        self._site = site_for_path(EXCEL_DB_PATH) if site is None else site
+        self._is_open = False
+        self._rda_index = None
+        self._dirty = False
+        self._rows_added = 0
+    
+    @property
+    def is_dirty(self):
+        """True se nella sessione corrente sono stati modificati dei dati."""
+        return self._dirty
+    
+    @property
+    def known_rda_numbers(self):
+        """Numeri RDA (normalizzati) presenti nel registro."""
+        if self._rda_index is None:
+            return frozenset()
+        return self._rda_index
+    
+    def open(self, read_only=False):
+        """
+        Prepara il registro e costruisce l'indice dei numeri RDA, compresi
+        quelli spostati negli archivi degli anni chiusi.
+        
+        Args:
+            read_only: Ignorato, presente per compatibilità con ExcelManager
+        
+        Returns:
+            bool: True se apertura riuscita, False altrimenti
+        """
+        try:
+            conn = database.get_connection()
+            try:
+                rows = conn.execute("SELECT DISTINCT rda_number FROM rda_data").fetchall()
+            finally:
+                conn.close()
+            rows += query_archives("SELECT DISTINCT rda_number FROM rda_data")
+            
+            self._rda_index = {normalize_rda_number(row[0]) for row in rows if row[0]}
+            self._dirty = False
+            self._rows_added = 0
+            self._is_open = True
+            return True
+        
+        except Exception as e:
+            logger.error(f"Errore apertura registro SQLite: {e}")
+            return False
+    
+    def close(self, save=True):
+        """
+        Chiude il registro. Le scritture sono già confermate nel database.
+        
+        Args:
+            save: Ignorato, presente per compatibilità con ExcelManager
+        """
+        self._is_open = False
+        self._rda_index = None
+        self._dirty = False
+        self._rows_added = 0
+    
+    def check_if_exists(self, rda_number):
+        """
+        Verifica se un numero RDA esiste già nel registro.
+        
+        Returns:
+            bool: True se esiste (o se il registro non è aperto), False altrimenti
+        """
+        if not self._is_open or self._rda_index is None:
+            return True  # Fail safe
+        
+        return normalize_rda_number(rda_number) in self._rda_index
+    
+    def append_data(self, rda_data):
+        """
+        Aggiunge i dati di una RDA al registro.
+        
+        Args:
+            rda_data: Dictionary con i dati RDA estratti dal PDF
+        """
+        if not self._is_open:
+            return
+        
+        try:
+            # Stesse righe scritte da ExcelManager, convertite come in sincronizzazione
+            rows = [build_sync_row(values, values[7]) for values in build_register_rows(rda_data)]
+            keys = database.append_rows(rows, site=self._site)
+            
+            if keys:
+                self._dirty = True
+                self._rows_added += len(keys)
+            self._rda_index.add(normalize_rda_number(rda_data['rda_number_raw']))
+            
+            logger.info(f"Aggiunti dati per RDA {rda_data['rda_number_raw']}")
+        
+        except Exception as e:
+            logger.error(f"Errore inserimento dati RDA: {e}")
+    
+    def update_alerts_and_get_overdue(self):
+        """
+        Restituisce le RDA scadute. I livelli di alert sono calcolati dal
+        database sulla data odierna (vista rda_alert), quindi non vengono
+        riscritti.
+        
+        Returns:
+            list: Lista di dict con RDA scadute
+        """
+        if not self._is_open:
+            return []
+        
+        try:
+            return database.get_overdue_items()
+        
+        except Exception as e:
+            logger.error(f"Errore aggiornamento alert: {e}")
+            return []
+    
+    def delete_empty_rows(self):
+        """Nessuna operazione: il database non contiene righe vuote."""
+    
+    def fit_columns(self):
+        """Nessuna operazione: la larghezza colonne è impostata dall'export."""
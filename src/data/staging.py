@@ -0,0 +1,351 @@
+"""
+Scritture preparate fuori dal lock del database condiviso:
+
+- sync_rows legge il registro in un file di appoggio locale (stage_rows)
+  e applica le differenze in una transazione breve;
+- replace_all_data scrive le righe in tabelle di appoggio, con commit
+  intermedi, e le pubblica scambiando i nomi delle tabelle in una
+  transazione breve.
+"""
+
+import os
+import re
+import logging
+import sqlite3
+import tempfile
+from src.data.database import (
+    get_connection, writer_lease, DEFAULT_SITE, WRITE_BATCH_SIZE, FTS_COLUMNS,
+    _STORED_COLUMNS, _INSERT_SQL, _INDEXES, _SWAP_TABLES, _fts_available, _create_indexes,
+    _create_fts_triggers, _create_header_triggers, _create_stat_triggers,
+    _create_views, _insert_headers, _fill_statistics, _keyed_rows, _stored_row,
+    _batched
+)
+from src.data.archive import ArchivedRows
+from src.data.changelog import read_generation, bump_generation, set_changes_floor, create_change_triggers
+
+logger = logging.getLogger("RDA_Bot")
+
+# Righe scritte nelle tabelle di appoggio tra un commit e l'altro
+# (i lettori non vedono le tabelle di appoggio)
+STAGING_COMMIT_ROWS = 20000
+
+# Nome del file di appoggio collegato alla connessione (ATTACH)
+STAGING_SCHEMA = "staging"
+
+
+class StagedRows:
+    """
+    Righe del registro scritte in un file di appoggio locale (temporaneo),
+    collegato alla connessione come schema "staging". La scrittura non
+    tocca il database condiviso, quindi non ne prende il lock: il
+    confronto con rda_data avviene poi in SQL nella transazione di
+    sync_rows, senza rileggere il registro.
+    """
+    
+    def __init__(self, cursor):
+        """
+        Args:
+            cursor: Cursore sul database principale (fuori da transazioni)
+        """
+        self.cursor = cursor
+        fd, self.path = tempfile.mkstemp(prefix="rda_staging_", suffix=".db")
+        os.close(fd)
+        cursor.execute(f"ATTACH DATABASE ? AS {STAGING_SCHEMA}", (self.path,))
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+    
+    def close(self):
+        """Scollega ed elimina il file di appoggio."""
+        if self.cursor.connection.in_transaction:
+            self.cursor.execute("ROLLBACK")
+        self.cursor.execute(f"DETACH DATABASE {STAGING_SCHEMA}")
+        try:
+            os.remove(self.path)
+        except OSError as e:
+            logger.warning(f"File di appoggio non eliminato ({self.path}): {e}")
+    
+    def write(self, keyed_rows, site):
+        """
+        Scrive le righe nella tabella staging.sync_rows, nell'ordine del
+        registro (colonna seq), e ne indicizza le chiavi.
+        
+        Args:
+            keyed_rows: Iterabile di (row_key, row_hash, row), consumato a lotti
+            site: Sede delle righe
+        
+        Returns:
+            int: Righe scritte
+        """
+        columns = ", ".join(_STORED_COLUMNS)
+        self.cursor.execute(f"""
+            CREATE TABLE {STAGING_SCHEMA}.sync_rows (
+                seq INTEGER PRIMARY KEY, {columns}, row_key TEXT, row_hash TEXT, site TEXT
+            )
+        """)
+        insert_sql = _INSERT_SQL.replace("INTO rda_data", f"INTO {STAGING_SCHEMA}.sync_rows", 1)
+        
+        written = 0
+        self.cursor.execute("BEGIN TRANSACTION")
+        for batch in _batched(keyed_rows, WRITE_BATCH_SIZE):
+            self.cursor.executemany(insert_sql, [
+                _stored_row(row) + (row_key, row_hash, site) for row_key, row_hash, row in batch
+            ])
+            written += len(batch)
+        self.cursor.execute(
+            f"CREATE UNIQUE INDEX {STAGING_SCHEMA}.idx_sync_rows_key ON sync_rows (row_key)"
+        )
+        self.cursor.execute("COMMIT")
+        return written
+    
+    def apply(self, site):
+        """
+        Applica a rda_data le differenze con le righe scritte, nella
+        transazione già aperta: UPDATE delle righe con hash diverso, INSERT
+        di quelle nuove (nell'ordine del registro), DELETE di quelle della
+        sede non più presenti e delle righe precedenti alla chiave riga.
+        
+        Returns:
+            tuple: (chiavi inserite, chiavi aggiornate, chiavi eliminate,
+                    righe eliminate comprese quelle senza chiave)
+        """
+        cursor = self.cursor
+        columns = ", ".join(_STORED_COLUMNS)
+        missing = f"""
+            NOT EXISTS (SELECT 1 FROM rda_data d WHERE d.site = ? AND d.row_key = s.row_key)
+        """
+        
+        cursor.execute(f"""
+            SELECT d.id, s.row_key FROM {STAGING_SCHEMA}.sync_rows s
+            JOIN rda_data d ON d.site = ? AND d.row_key = s.row_key
+            WHERE d.row_hash IS NOT s.row_hash
+            ORDER BY s.seq
+        """, (site,))
+        updated = cursor.fetchall()
+        cursor.execute(
+            f"SELECT row_key FROM {STAGING_SCHEMA}.sync_rows s WHERE {missing} ORDER BY s.seq",
+            (site,)
+        )
+        inserted = [row_key for (row_key,) in cursor.fetchall()]
+        cursor.execute(f"""
+            SELECT id, row_key FROM rda_data d
+            WHERE d.site = ? AND d.row_key IS NOT NULL AND NOT EXISTS (
+                SELECT 1 FROM {STAGING_SCHEMA}.sync_rows s WHERE s.row_key = d.row_key
+            )
+            ORDER BY d.id
+        """, (site,))
+        deleted = cursor.fetchall()
+        # Righe precedenti alla migrazione (senza chiave), di qualunque sede
+        cursor.execute("SELECT id FROM rda_data WHERE row_key IS NULL")
+        removed_ids = [row_id for (row_id,) in cursor.fetchall()] + [row_id for row_id, _ in deleted]
+        
+        cursor.executemany(f"""
+            UPDATE rda_data SET ({columns}, row_hash) = (
+                SELECT {columns}, row_hash FROM {STAGING_SCHEMA}.sync_rows WHERE row_key = ?
+            )
+            WHERE id = ?
+        """, [(row_key, row_id) for row_id, row_key in updated])
+        cursor.execute(f"""
+            INSERT INTO rda_data ({columns}, row_key, row_hash, site)
+            SELECT {columns}, row_key, row_hash, site FROM {STAGING_SCHEMA}.sync_rows s
+            WHERE {missing}
+            ORDER BY s.seq
+        """, (site,))
+        cursor.executemany("DELETE FROM rda_data WHERE id = ?", [(row_id,) for row_id in removed_ids])
+        
+        return inserted, [row_key for _, row_key in updated], [row_key for _, row_key in deleted], len(removed_ids)
+
+
+@writer_lease.exclusive
+def replace_all_data(rows, site=DEFAULT_SITE):
+    """
+    Sostituisce tutti i dati della sede nella tabella con le righe fornite.
+    
+    Le righe vengono scritte in tabelle di appoggio (rda_data_staging e le
+    tabelle derivate), con commit intermedi: chi legge nel frattempo vede
+    i dati precedenti, completi, senza attendere la scrittura. La
+    pubblicazione scambia le tabelle con ALTER TABLE RENAME in una
+    transazione breve, di durata indipendente dal numero di righe. Le
+    righe degli anni archiviati aggiornano gli archivi (vedi
+    archive.ArchivedRows).
+    
+    Args:
+        rows: Iterabile di tuple con i dati (escludendo ID e created_at),
+              consumato a lotti senza caricarlo tutto in memoria
+        site: Sede del registro di provenienza
+    
+    Raises:
+        RuntimeError: Se un'altra sincronizzazione ha modificato il database
+                      durante la preparazione (i dati non vengono pubblicati)
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    tables = [t for t in _SWAP_TABLES if t != "rda_fts" or _fts_available(cursor)]
+    staging = {table: f"{table}_staging" for table in tables}
+    
+    try:
+        # Tabelle lasciate da una sostituzione interrotta
+        _drop_swap_tables(cursor, tables)
+        
+        cursor.execute("BEGIN TRANSACTION")
+        generation = read_generation(cursor)
+        _create_staging_tables(cursor, staging)
+        
+        # Le righe delle altre sedi restano, con il proprio id
+        cursor.execute(
+            "INSERT INTO rda_data_staging SELECT * FROM rda_data WHERE site != ? AND row_key IS NOT NULL",
+            (site,)
+        )
+        
+        # Inserisci nuovi dati a lotti, con un commit ogni STAGING_COMMIT_ROWS
+        inserted = 0
+        uncommitted = 0
+        insert_sql = _INSERT_SQL.replace("INTO rda_data", "INTO rda_data_staging", 1)
+        # Le righe degli anni archiviati si confrontano con gli archivi
+        archived = ArchivedRows(cursor, site)
+        keyed = (
+            _stored_row(row) + (row_key, row_hash, site)
+            for row_key, row_hash, row in _keyed_rows(rows)
+            if not archived.add(row_key, row_hash, row)
+        )
+        for batch in _batched(keyed, WRITE_BATCH_SIZE):
+            cursor.executemany(insert_sql, batch)
+            inserted += len(batch)
+            uncommitted += len(batch)
+            if uncommitted >= STAGING_COMMIT_ROWS:
+                cursor.execute("COMMIT")
+                cursor.execute("BEGIN TRANSACTION")
+                uncommitted = 0
+        
+        if not inserted:
+            cursor.execute("ROLLBACK")
+            _drop_swap_tables(cursor, tables)
+            logger.warning("Nessun dato da inserire")
+            return
+        
+        _build_staging(cursor, staging, generation + 1)
+        cursor.execute("COMMIT")
+        
+        _publish_staging(cursor, tables, generation)
+        _drop_swap_tables(cursor, tables)
+        
+        # Archivi aggiornati solo dopo la pubblicazione: una sostituzione
+        # annullata non li modifica
+        cursor.execute("BEGIN TRANSACTION")
+        archived.apply(cursor)
+        cursor.execute("COMMIT")
+        logger.info(f"Database sincronizzato: {inserted} righe inserite")
+        
+    except Exception as e:
+        if conn.in_transaction:
+            cursor.execute("ROLLBACK")
+        logger.error(f"Errore durante l'inserimento dati: {e}")
+        try:
+            _drop_swap_tables(cursor, tables)
+        except sqlite3.Error:
+            pass  # Verranno eliminate alla prossima sostituzione
+        raise
+    finally:
+        conn.close()
+
+
+def _drop_swap_tables(cursor, tables):
+    """Elimina le tabelle di appoggio e quelle sostituite da replace_all_data."""
+    cursor.execute("BEGIN TRANSACTION")
+    for table in tables:
+        cursor.execute(f"DROP TABLE IF EXISTS {table}_old")
+        cursor.execute(f"DROP TABLE IF EXISTS {table}_staging")
+    cursor.execute("COMMIT")
+
+
+def _create_staging_tables(cursor, staging):
+    """
+    Crea le tabelle di appoggio con la stessa struttura di quelle pubblicate.
+    I riferimenti tra tabelle puntano alle tabelle di appoggio (lo scambio
+    dei nomi li riporta su quelle pubblicate), tranne il content dell'indice
+    FTS che resta rda_data.
+    """
+    names = re.compile(r"\b(" + "|".join(staging) + r")\b")
+    for table, staging_name in staging.items():
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        sql = cursor.fetchone()[0]
+        if sql.startswith("CREATE VIRTUAL TABLE"):
+            sql = re.sub(r'^CREATE VIRTUAL TABLE "?\w+"?', f"CREATE VIRTUAL TABLE {staging_name}", sql)
+        else:
+            sql = names.sub(lambda m: staging[m.group(1)], sql)
+        cursor.execute(sql)
+
+
+def _build_staging(cursor, staging, generation):
+    """
+    Completa le tabelle di appoggio dopo l'inserimento delle righe: indici
+    (con il suffisso della generazione che verrà pubblicata), indice di
+    ricerca, testate, richiedenti e statistiche.
+    """
+    for table, staging_name in staging.items():
+        if table in _INDEXES:
+            _create_indexes(cursor, table, staging_name, f"_g{generation}")
+    
+    if "rda_fts" in staging:
+        columns = ", ".join(FTS_COLUMNS)
+        cursor.execute(f"""
+            INSERT INTO rda_fts_staging (rowid, {columns})
+            SELECT id, {columns} FROM rda_data_staging
+        """)
+    
+    _insert_headers(cursor, """
+        WITH grouped AS (
+            SELECT site, rda_number, MIN(id) AS first_id,
+                   MAX(alert_level) AS alert_level, COUNT(*) AS line_count
+            FROM {rda_data} WHERE rda_number IS NOT NULL
+            GROUP BY site, rda_number
+        )
+    """, staging)
+    _fill_statistics(cursor, staging)
+
+
+def _publish_staging(cursor, tables, generation):
+    """
+    Pubblica le tabelle di appoggio in una transazione breve: scambio dei
+    nomi, trigger e viste ricreati sulle nuove tabelle, generazione
+    incrementata. Le tabelle sostituite restano con il suffisso _old.
+    
+    Raises:
+        RuntimeError: Se la generazione non è più quella letta all'inizio
+    """
+    cursor.execute("BEGIN IMMEDIATE")
+    if read_generation(cursor) != generation:
+        cursor.execute("ROLLBACK")
+        raise RuntimeError("Database modificato durante la preparazione dei dati: sostituzione annullata")
+    
+    # Viste e trigger seguirebbero le tabelle rinominate: si ricreano
+    placeholders = ", ".join("?" * len(tables))
+    cursor.execute(
+        f"SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name IN ({placeholders})",
+        tables
+    )
+    for (trigger,) in cursor.fetchall():
+        cursor.execute(f"DROP TRIGGER {trigger}")
+    cursor.execute("DROP VIEW IF EXISTS rda_alert")
+    cursor.execute("DROP VIEW IF EXISTS rda_line")
+    
+    for table in tables:
+        cursor.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+    for table in tables:
+        cursor.execute(f"ALTER TABLE {table}_staging RENAME TO {table}")
+    
+    if "rda_fts" in tables:
+        _create_fts_triggers(cursor)
+    _create_header_triggers(cursor)
+    _create_stat_triggers(cursor)
+    create_change_triggers(cursor)
+    _create_views(cursor)
+    bump_generation(cursor)
+    
+    # Le righe sostituite non passano dal registro delle modifiche:
+    # chi legge in modo incrementale deve ricaricare tutto
+    set_changes_floor(cursor, generation + 1)
+    cursor.execute("COMMIT")
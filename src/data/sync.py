@@ -0,0 +1,252 @@
+"""
+Sincronizzazione registro Excel -> database SQLite
+"""
+
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from src.utils.config import EXCEL_DB_PATH, REGISTERS
+from src.utils.utils import file_fingerprint
+from src.data.excel_reader import open_register_for_read
+from src.data.register_cache import snapshot_register
+from src.data.database import sync_rows, get_sync_state, save_sync_state, writer_lease, DEFAULT_SITE
+from src.data.writer import RequestCoalescer
+
+logger = logging.getLogger("RDA_Bot")
+
+# Registri copiati contemporaneamente da sync_all_registers
+MAX_SYNC_WORKERS = 4
+
+# Sincronizzazioni richieste mentre un'altra è in corso (es. avvio GUI e
+# pulsante di sincronizzazione): accorpate in un'unica esecuzione successiva
+_sync_requests = RequestCoalescer()
+
+
+def _source_key(path):
+    """Chiave del registro nella tabella sync_state."""
+    return os.path.normcase(os.path.abspath(path))
+
+
+def check_register_changed(path=None):
+    """
+    Confronta l'impronta attuale del registro con quella dell'ultima
+    sincronizzazione.
+    
+    Args:
+        path: Percorso del file Excel (default EXCEL_DB_PATH)
+    
+    Returns:
+        tuple: (modificato, impronta attuale)
+    """
+    path = path or EXCEL_DB_PATH
+    start = time.perf_counter()
+    
+    fingerprint = file_fingerprint(path)
+    changed = get_sync_state(_source_key(path)) != fingerprint
+    
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    status = "modificato" if changed else "invariato"
+    logger.info(f"Controllo modifiche registro: {status} ({elapsed_ms:.1f} ms)")
+    
+    return changed, fingerprint
+
+
+def record_register_synced(path=None):
+    """
+    Registra l'impronta attuale del registro come già sincronizzata.
+    Da usare dopo aver salvato un registro appena sincronizzato (es. bot).
+    
+    Args:
+        path: Percorso del file Excel (default EXCEL_DB_PATH)
+    """
+    path = path or EXCEL_DB_PATH
+    save_sync_state(_source_key(path), file_fingerprint(path))
+
+
+def site_for_path(path):
+    """
+    Sede configurata per un registro.
+    
+    Args:
+        path: Percorso del file Excel
+    
+    Returns:
+        str: Sede del registro in REGISTERS, DEFAULT_SITE se non configurato
+    """
+    key = _source_key(path)
+    for register in REGISTERS:
+        if _source_key(register['path']) == key:
+            return register['site']
+    return DEFAULT_SITE
+
+
+def _prepare_register(path, force):
+    """
+    Controlla se il registro va letto e ne prepara la copia locale.
+    
+    Returns:
+        tuple: (percorso della copia locale, impronta) oppure None se il
+               registro è invariato dall'ultima sincronizzazione
+    """
+    # L'impronta va calcolata prima della lettura: una modifica successiva
+    # verrà rilevata alla prossima sincronizzazione
+    try:
+        changed, fingerprint = check_register_changed(path)
+    except OSError as e:
+        # Registro bloccato o non raggiungibile: si prova con la copia locale
+        logger.warning(f"Impronta del registro non disponibile: {e}")
+        changed, fingerprint = True, None
+    
+    if not changed and not force:
+        logger.info("Registro invariato dall'ultima sincronizzazione. Sync saltata.")
+        return None
+    
+    # La lettura avviene sulla copia locale, non sul file in rete
+    local_path, fingerprint = snapshot_register(path, fingerprint)
+    if not force and get_sync_state(_source_key(path)) == fingerprint:
+        logger.info("Copia locale già sincronizzata. Sync saltata.")
+        return None
+    
+    return local_path, fingerprint
+
+
+@writer_lease.exclusive
+def sync_register(path=None, force=False, site=None):
+    """
+    Sincronizza il registro Excel nel database, saltando la lettura se il
+    file non è cambiato dall'ultima sincronizzazione. La lettura avviene su
+    una copia locale del registro (vedi snapshot_register).
+    
+    Il controllo dell'impronta avviene detenendo il ruolo di scrittore: chi
+    ha atteso la sincronizzazione di un altro processo trova il registro già
+    sincronizzato e non lo rilegge.
+    
+    Args:
+        path: Percorso del file Excel (default EXCEL_DB_PATH)
+        force: Se True, sincronizza anche se il registro risulta invariato
+        site: Sede delle righe (default: quella configurata per il percorso)
+    
+    Returns:
+        dict: Chiavi 'skipped' (bool), 'rows' (righe lette) e 'changes'
+              (riepilogo di sync_rows, None se la sync è stata saltata)
+    
+    Raises:
+        IOError: Se il registro non può essere aperto
+        OSError: Se il registro non è leggibile e non esiste una copia locale
+    """
+    path = path or EXCEL_DB_PATH
+    site = site_for_path(path) if site is None else site
+    
+    prepared = _prepare_register(path, force)
+    if not prepared:
+        return {'skipped': True, 'rows': 0, 'changes': None}
+    return _sync_snapshot(path, *prepared, site)
+
+
+def _sync_snapshot(path, local_path, fingerprint, site):
+    """
+    Legge la copia locale del registro a blocchi e la sincronizza nel
+    database (lettura con openpyxl, fallback su Excel via COM).
+    
+    Returns:
+        dict: Risultato come sync_register
+    """
+    excel_mgr = open_register_for_read(local_path)
+    if not excel_mgr:
+        raise IOError(f"Impossibile aprire il registro Excel: {path}")
+    
+    try:
+        # Righe lette e scritte a blocchi: la memoria non cresce con il registro
+        rows_read = 0
+        
+        def counted_rows():
+            nonlocal rows_read
+            for block in excel_mgr.iter_sync_blocks():
+                rows_read += len(block)
+                yield from block
+        
+        changes = sync_rows(counted_rows(), site=site)
+    finally:
+        excel_mgr.close(save=False)
+    
+    if changes is not None:
+        save_sync_state(_source_key(path), fingerprint)
+    else:
+        logger.warning(f"Nessun dato trovato nel registro {path}")
+    
+    return {'skipped': False, 'rows': rows_read, 'changes': changes}
+
+
+def sync_all_registers(force=False, registers=None):
+    """
+    Sincronizza nel database tutti i registri configurati (uno per sede).
+    Con più registri, le copie locali dei file in rete vengono fatte in
+    parallelo; ogni copia viene poi letta a blocchi e scritta nel database
+    una sede alla volta, man mano che le copie sono pronte, quindi in
+    memoria resta un solo blocco di righe. Un registro non leggibile non
+    blocca gli altri.
+    
+    Le richieste uguali arrivate durante una sincronizzazione in corso nello
+    stesso processo ne condividono una sola successiva; tra processi diversi
+    le sincronizzazioni si alternano con il ruolo di scrittore.
+    
+    Args:
+        force: Se True, sincronizza anche i registri invariati
+        registers: Lista di dict con chiavi 'site' e 'path' (default REGISTERS)
+    
+    Returns:
+        dict: Per ogni sede il risultato come sync_register, oppure
+              {'error': messaggio} se la sincronizzazione è fallita
+    
+    Raises:
+        ValueError: Se più registri hanno la stessa sede (ognuno
+                    eliminerebbe le righe dell'altro)
+    """
+    registers = registers or REGISTERS
+    sites = [register['site'] for register in registers]
+    repeated = sorted({site for site in sites if sites.count(site) > 1})
+    if repeated:
+        raise ValueError(f"Sedi ripetute nei registri configurati: {', '.join(map(repr, repeated))}")
+    key = (force, tuple((register['site'], _source_key(register['path'])) for register in registers))
+    return _sync_requests.run(key, lambda: _sync_registers(registers, force))
+
+
+@writer_lease.exclusive
+def _sync_registers(registers, force):
+    """Corpo di sync_all_registers, eseguito detenendo il ruolo di scrittore."""
+    results = {}
+    start = time.perf_counter()
+    
+    if len(registers) == 1:
+        site, path = registers[0]['site'], registers[0]['path']
+        try:
+            results[site] = sync_register(path, force=force, site=site)
+        except Exception as e:
+            logger.error(f"Sincronizzazione registro {path} non riuscita: {e}")
+            results[site] = {'error': str(e)}
+        return results
+    
+    # Nei thread solo le copie locali; lettura (anche via COM) e scrittura
+    # avvengono in questo thread, un registro alla volta
+    with ThreadPoolExecutor(max_workers=min(len(registers), MAX_SYNC_WORKERS)) as pool:
+        futures = {
+            pool.submit(_prepare_register, register['path'], force): register
+            for register in registers
+        }
+        
+        for future in as_completed(futures):
+            site, path = futures[future]['site'], futures[future]['path']
+            try:
+                prepared = future.result()
+                if prepared is None:
+                    results[site] = {'skipped': True, 'rows': 0, 'changes': None}
+                else:
+                    results[site] = _sync_snapshot(path, *prepared, site)
+            except Exception as e:
+                logger.error(f"Sincronizzazione registro {path} non riuscita: {e}")
+                results[site] = {'error': str(e)}
+    
+    elapsed = time.perf_counter() - start
+    logger.info(f"Sincronizzati {len(registers)} registri in {elapsed:.1f} s")
+    return results
@@ -0,0 +1,161 @@
+"""
+Conversione delle righe del registro RDA nelle tuple per il database SQLite.
+Funzioni condivise dai lettori del registro (COM e openpyxl), senza
+dipendenze da Excel.
+"""
+
+import re
+from datetime import datetime
+from src.utils.utils import safe_str, safe_float, safe_int
+
+_HYPERLINK_RE = re.compile(r'HYPERLINK\("([^"]+)"')
+
+# Righe lette dal registro per ogni blocco in lettura a blocchi
+SYNC_BLOCK_SIZE = 5000
+
+
+def normalize_rda_number(value):
+    """
+    Normalizza un numero RDA per i confronti (es. " 25/01812 " -> "25/01812").
+    
+    Args:
+        value: Valore letto dal foglio o estratto dal PDF
+    
+    Returns:
+        str: Numero RDA normalizzato
+    """
+    if value is None:
+        return ""
+    return str(value).strip()
+
+
+def parse_cell_date(cell_value):
+    """Converte un valore cella in datetime."""
+    if cell_value is None:
+        return None
+    
+    # Se è già un datetime (COM o openpyxl)
+    if hasattr(cell_value, 'timestamp'):
+        return datetime.fromtimestamp(cell_value.timestamp())
+    
+    # Se è una stringa
+    if isinstance(cell_value, str):
+        try:
+            return datetime.strptime(cell_value, '%d/%m/%Y')
+        except ValueError:
+            pass
+    
+    return None
+
+
+def format_cell_date(cell_value):
+    """Formatta un valore cella data come stringa dd/mm/yyyy."""
+    dt = parse_cell_date(cell_value)
+    if dt:
+        return dt.strftime("%d/%m/%Y")
+    return str(cell_value) if cell_value else ""
+
+
+def extract_hyperlink_path(formula_data):
+    """Estrae il path da una formula HYPERLINK."""
+    try:
+        formula = formula_data[0] if isinstance(formula_data, tuple) else formula_data
+        match = _HYPERLINK_RE.search(str(formula))
+        if match:
+            return match.group(1)
+    except:
+        pass
+    return ""
+
+
+# Convertitore per ciascuna colonna A:L (la colonna H usa la formula HYPERLINK)
+COLUMN_CONVERTERS = (
+    safe_str,            # RDA Number
+    safe_str,            # Commessa
+    safe_str,            # Descrizione 1
+    safe_str,            # Descrizione Materiale
+    safe_str,            # Unità Misura
+    safe_float,          # Quantità
+    safe_str,            # APF
+    None,                # PDF Path (da formula)
+    format_cell_date,    # Data RDA
+    format_cell_date,    # Data Consegna
+    safe_int,            # Alert Level
+    safe_str             # Richiedente
+)
+
+
+def build_sync_row(row_val, formula_h):
+    """
+    Costruisce la tupla per il database da una riga A:L del registro.
+    
+    Args:
+        row_val: Valori delle colonne A:L
+        formula_h: Formula della colonna H (HYPERLINK al PDF)
+    
+    Returns:
+        tuple: Dati nell'ordine delle colonne di rda_data
+    """
+    return tuple(
+        extract_hyperlink_path(formula_h) if convert is None else convert(value)
+        for convert, value in zip(COLUMN_CONVERTERS, row_val)
+    )
+
+
+def build_register_rows(rda_data):
+    """
+    Costruisce le righe A:L da aggiungere al registro per una RDA estratta
+    dal PDF, con i valori così come vanno scritti nelle celle.
+    
+    Args:
+        rda_data: Dictionary con i dati RDA estratti dal PDF (con 'pdf_final_path')
+    
+    Returns:
+        list: Liste di 12 valori, una per ogni riga non vuota della tabella PDF
+    """
+    # Filtra righe vuote dalla tabella PDF
+    valid_rows = [
+        row for row in rda_data['table'] 
+        if any(cell is not None and str(cell).strip() != '' for cell in row)
+    ]
+    
+    register_rows = []
+    for row_data in valid_rows:
+        # Pulisci dati
+        cleaned_row = [item if item is not None else "" for item in row_data]
+        
+        # Gestisci data di consegna
+        delivery_date_str = cleaned_row[8] if len(cleaned_row) > 8 else ""
+        delivery_date_obj = None
+        if delivery_date_str:
+            try:
+                delivery_date_obj = datetime.strptime(str(delivery_date_str), '%d/%m/%Y')
+            except (ValueError, TypeError):
+                delivery_date_obj = delivery_date_str
+        
+        # Gestisci quantità (converti formato italiano)
+        quantity_val = cleaned_row[5] if len(cleaned_row) > 5 else 0
+        try:
+            quantity_str = str(quantity_val).replace('.', '').replace(',', '.')
+            quantity_val = float(quantity_str)
+        except (ValueError, TypeError):
+            pass
+        
+        # Colonne: A=RDA, B=Commessa, C=Desc1, D=DescMat, E=UM, F=Qty, 
+        #          G=APF, H=Link, I=DataRDA, J=DataCons, K=Alert, L=Richiedente
+        register_rows.append([
+            rda_data['rda_number_raw'],
+            cleaned_row[1] if len(cleaned_row) > 1 else "",  # Commessa
+            cleaned_row[2] if len(cleaned_row) > 2 else "",  # Descrizione 1
+            cleaned_row[3] if len(cleaned_row) > 3 else "",  # Descrizione Materiale
+            cleaned_row[4] if len(cleaned_row) > 4 else "",  # Unità Misura
+            quantity_val,
+            cleaned_row[7] if len(cleaned_row) > 7 else "",  # APF
+            f'=HYPERLINK("{rda_data["pdf_final_path"]}", "Apri PDF")',
+            rda_data['rda_date_obj'],
+            delivery_date_obj,
+            0,  # Alert level iniziale
+            rda_data.get('requester', '')
+        ])
+    
+    return register_rows
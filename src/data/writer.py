@@ -0,0 +1,296 @@
+"""
+Scrittore unico sul database condiviso: bot, sincronizzazioni manuali e
+GUI scrivono uno alla volta detenendo un lease registrato nel database
+stesso (tabella writer_lease), invece di contendersi il lock di SQLite sul
+file in rete. Le richieste di sincronizzazione uguali arrivate mentre una
+è in corso vengono accorpate. I lettori non sono coinvolti.
+"""
+
+import os
+import time
+import socket
+import logging
+import sqlite3
+import threading
+from functools import wraps
+
+logger = logging.getLogger("RDA_Bot")
+
+# Tempo senza rinnovi dopo il quale il lease di un processo terminato torna
+# libero, misurato dall'orologio di chi attende (non serve che gli orologi
+# dei PC concordino)
+LEASE_SECONDS = 120
+
+# Intervallo tra i tentativi di acquisizione del lease: parte da
+# LEASE_POLL_MIN_SECONDS e raddoppia fino a LEASE_POLL_SECONDS
+LEASE_POLL_MIN_SECONDS = 0.02
+LEASE_POLL_SECONDS = 0.5
+
+# Attesa massima del lease prima di rinunciare alla scrittura
+LEASE_WAIT_SECONDS = 600
+
+
+def create_lease_table(cursor):
+    """Crea la tabella dei lease (una riga per ruolo, detenuta da un processo)."""
+    cursor.execute("PRAGMA table_info(writer_lease)")
+    columns = [row[1] for row in cursor.fetchall()]
+    if columns and 'heartbeat' not in columns:
+        # Versione con scadenza a orario: i lease sono temporanei, si ricrea
+        cursor.execute("DROP TABLE writer_lease")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS writer_lease (
+            name TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            heartbeat INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+
+
+class WriterLease:
+    """
+    Ruolo di scrittore sul database, detenuto al più da un processo alla
+    volta e rinnovato in background finché viene usato.
+    
+    Nello stesso processo i thread si alternano con un lock; il thread che
+    detiene il lease può riacquisirlo (chiamate annidate).
+    
+    Il detentore incrementa un contatore (heartbeat) a ogni rinnovo; chi
+    attende considera scaduto il lease quando il contatore resta fermo per
+    LEASE_SECONDS secondi del proprio orologio monotono. La scadenza non
+    confronta quindi orari di PC diversi: un processo terminato senza
+    rilasciare il lease lo libera dopo al più LEASE_SECONDS dall'inizio
+    dell'attesa di un altro processo. Durante una transazione del detentore
+    l'heartbeat non può avanzare (il lock di SQLite è occupato): chi trova
+    il database bloccato considera vivo il lease e riparte da zero.
+    """
+    
+    def __init__(self, connect, name="writer"):
+        """
+        Args:
+            connect: Funzione che restituisce la connessione al database
+            name: Nome del ruolo in writer_lease
+        """
+        self.connect = connect
+        self.name = name
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._stop = threading.Event()
+        self._heartbeat = None
+        self.acquisitions = 0
+        self.wait_seconds = 0.0
+    
+    def acquire(self, timeout=LEASE_WAIT_SECONDS):
+        """
+        Attende il lease (prima dagli altri thread, poi dagli altri processi).
+        
+        Raises:
+            TimeoutError: Se il lease non si libera entro timeout secondi
+        """
+        start = time.monotonic()
+        if not self._lock.acquire(timeout=timeout):
+            raise TimeoutError("Scrittura sul database occupata da un altro thread")
+        
+        try:
+            if self._depth == 0:
+                self._take_lease(start + timeout)
+                self.acquisitions += 1
+                self.wait_seconds += time.monotonic() - start
+                self._start_heartbeat()
+            self._depth += 1
+        except BaseException:
+            self._lock.release()
+            raise
+    
+    def release(self):
+        """Rilascia il lease (all'uscita dell'acquisizione più esterna)."""
+        try:
+            self._depth -= 1
+            if self._depth == 0:
+                self._stop_heartbeat()
+                self._release_lease()
+        finally:
+            self._lock.release()
+    
+    def __enter__(self):
+        self.acquire()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+    
+    def exclusive(self, func):
+        """Decoratore: la funzione viene eseguita detenendo il lease."""
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with self:
+                return func(*args, **kwargs)
+        return wrapper
+    
+    def _take_lease(self, deadline):
+        """Riprova finché il lease non è libero, scaduto o già nostro."""
+        holder = None
+        delay = LEASE_POLL_MIN_SECONDS
+        seen, seen_at = None, time.monotonic()
+        conn = self.connect()
+        # Nessuna attesa del lock di SQLite: un database bloccato va notato
+        busy_timeout = conn.execute("PRAGMA busy_timeout").fetchone()[0]
+        conn.execute("PRAGMA busy_timeout = 0")
+        try:
+            while True:
+                stale = seen if time.monotonic() - seen_at >= LEASE_SECONDS else None
+                try:
+                    state = self._try_take(conn, stale)
+                except sqlite3.OperationalError as e:
+                    holder = str(e)
+                    if "locked" in holder or "busy" in holder:
+                        # Scrittura in corso, probabilmente del detentore
+                        # (che intanto non può rinnovare): il lease è vivo
+                        seen_at = time.monotonic()
+                else:
+                    if state is None:
+                        return
+                    holder = state[0]
+                    if state != seen:
+                        # Detentore o heartbeat cambiati: il lease è vivo
+                        seen, seen_at = state, time.monotonic()
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"Scrittura sul database occupata da {holder}")
+                time.sleep(delay)
+                delay = min(delay * 2, LEASE_POLL_SECONDS)
+        finally:
+            conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout)}")
+            conn.close()
+    
+    def _try_take(self, conn, stale=None):
+        """
+        Tentativo di acquisizione in una transazione breve.
+        
+        Args:
+            conn: Connessione al database
+            stale: (detentore, heartbeat) rimasto invariato per LEASE_SECONDS:
+                se il lease è ancora in quello stato viene ripreso
+        
+        Returns:
+            tuple: (detentore, heartbeat) se il lease è occupato, None se acquisito
+        """
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute("SELECT owner, heartbeat FROM writer_lease WHERE name = ?", (self.name,))
+            row = cursor.fetchone()
+            if row and row[0] != self.owner and tuple(row) != stale:
+                cursor.execute("COMMIT")
+                return tuple(row)
+            if row and row[0] != self.owner:
+                logger.warning(f"Lease di scrittura scaduto ({row[0]}): ripreso da {self.owner}")
+            cursor.execute(
+                "INSERT OR REPLACE INTO writer_lease (name, owner, heartbeat) VALUES (?, ?, 0)",
+                (self.name, self.owner)
+            )
+            cursor.execute("COMMIT")
+            return None
+        except Exception:
+            if conn.in_transaction:
+                cursor.execute("ROLLBACK")
+            raise
+    
+    def _release_lease(self):
+        conn = self.connect()
+        try:
+            conn.execute("DELETE FROM writer_lease WHERE name = ? AND owner = ?", (self.name, self.owner))
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Lease di scrittura non rilasciato (scadrà da solo): {e}")
+        finally:
+            conn.close()
+    
+    def _start_heartbeat(self):
+        self._stop.clear()
+        self._heartbeat = threading.Thread(target=self._renew_loop, name="writer-lease", daemon=True)
+        self._heartbeat.start()
+    
+    def _stop_heartbeat(self):
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+            self._heartbeat = None
+    
+    def _renew_loop(self):
+        """Incrementa l'heartbeat del lease finché il ruolo è detenuto."""
+        while not self._stop.wait(LEASE_SECONDS / 4):
+            conn = None
+            try:
+                conn = self.connect()
+                conn.execute(
+                    "UPDATE writer_lease SET heartbeat = heartbeat + 1 WHERE name = ? AND owner = ?",
+                    (self.name, self.owner)
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                # Riprova al giro successivo (es. durante una transazione lunga)
+                logger.debug(f"Rinnovo lease di scrittura non riuscito: {e}")
+            finally:
+                if conn is not None:
+                    conn.close()
+
+
+class RequestCoalescer:
+    """
+    Accorpa le richieste uguali (stessa chiave) di un'operazione costosa:
+    chi arriva mentre l'operazione è in corso attende una sola esecuzione
+    successiva, condivisa con tutte le richieste arrivate nel frattempo,
+    che vede quindi ogni modifica precedente alla richiesta.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}  # chiave -> esecuzione in corso o in attesa
+        self.runs = 0
+        self.joined = 0
+    
+    def run(self, key, func):
+        """
+        Esegue func() o si accoda all'esecuzione in attesa con la stessa chiave.
+        
+        Returns:
+            Il risultato di func() (condiviso tra le richieste accorpate)
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None and not flight['started']:
+                self.joined += 1
+                owner = False
+            else:
+                flight = {
+                    'previous': flight, 'started': False, 'done': threading.Event(),
+                    'result': None, 'error': None,
+                }
+                self._flights[key] = flight
+                owner = True
+        
+        if not owner:
+            flight['done'].wait()
+            if flight['error'] is not None:
+                raise flight['error']
+            return flight['result']
+        
+        # Una sola esecuzione per chiave alla volta: si attende quella in corso
+        if flight['previous'] is not None:
+            flight['previous']['done'].wait()
+        with self._lock:
+            flight['started'] = True
+            flight['previous'] = None
+            self.runs += 1
+        
+        try:
+            flight['result'] = func()
+            return flight['result']
+        except BaseException as e:
+            flight['error'] = e
+            raise
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight['done'].set()
@@ -14,6 +14,7 @@ import pythoncom
 import logging
 import sys
 import os
+from itertools import chain
 
 # Aggiungi la directory ROOT al path per permettere import relativi come 'src.utils...'
 # Risaliamo da src/main_bot.py a ROOT
@@ -21,11 +22,15 @@ SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if SCRIPT_DIR not in sys.path:
     sys.path.insert(0, SCRIPT_DIR)
 
-from src.utils.config import PDF_SAVE_PATH, ensure_directories
+from src.utils.config import PDF_SAVE_PATH, REGISTER_MODE, EXCEL_EXPORT_PATH, ensure_directories
 from src.data.excel_manager import ExcelManager
+from src.data.sqlite_register import SqliteRegister
+from src.data.excel_export import export_register
 from src.services.email_scanner import EmailScanner
 from src.services.pdf_parser import extract_rda_data, save_pdf_to_archive
-from src.data.database import init_db, replace_all_data
+from src.data.database import init_db, sync_rows
+from src.data.archive import archive_closed_years
+from src.data.sync import record_register_synced, site_for_path
 from src.utils.utils import logger
 
 # Moduli Licenza
@@ -44,8 +49,11 @@ def process_pdf_callback(excel_mgr):
         Funzione callback
     """
     def callback(temp_pdf_path):
-        # Estrai dati dal PDF
-        rda_data = extract_rda_data(temp_pdf_path)
+        # Estrai dati dal PDF (i duplicati noti vengono scartati subito)
+        rda_data = extract_rda_data(
+            temp_pdf_path,
+            known_rda_numbers=excel_mgr.known_rda_numbers
+        )
         if not rda_data:
             return
         
@@ -122,13 +130,19 @@ def main():
     exit_code = 0
     
     try:
-        # 4. Apri Excel
-        excel_mgr = ExcelManager()
-        if not excel_mgr.open():
-            logger.error("Impossibile aprire il file Excel. Verifica che il percorso sia corretto.")
-            return 1
-        
-        logger.info("File Excel aperto correttamente")
+        # 4. Apri il registro: file Excel oppure database (register_mode = "sqlite")
+        if REGISTER_MODE == "sqlite":
+            excel_mgr = SqliteRegister()
+            if not excel_mgr.open():
+                logger.error("Impossibile aprire il registro nel database.")
+                return 1
+            logger.info("Registro SQLite aperto correttamente")
+        else:
+            excel_mgr = ExcelManager()
+            if not excel_mgr.open():
+                logger.error("Impossibile aprire il file Excel. Verifica che il percorso sia corretto.")
+                return 1
+            logger.info("File Excel aperto correttamente")
         
         # 5. Scansiona email
         scanner = EmailScanner()
@@ -159,19 +173,47 @@ def main():
         excel_mgr.delete_empty_rows()
         excel_mgr.fit_columns()
         
-        # 9. Sincronizza Excel -> SQLite
-        logger.info("Sincronizzazione Excel -> Database SQLite...")
-        all_data = excel_mgr.get_all_data_for_sync()
-        if all_data:
-            replace_all_data(all_data)
-            logger.info(f"Database sincronizzato: {len(all_data)} righe")
+        if REGISTER_MODE == "sqlite":
+            # 9. Il database è già aggiornato: rigenera l'Excel solo se è cambiato qualcosa
+            changed = excel_mgr.is_dirty
+            excel_mgr.close()
+            if changed or not os.path.exists(EXCEL_EXPORT_PATH):
+                export_register()
+            else:
+                logger.info("Registro invariato: export Excel non necessario")
         else:
-            logger.warning("Nessun dato trovato in Excel per la sincronizzazione")
-        
-        # 10. Salva e chiudi Excel
-        excel_mgr.close(save=True)
-        logger.info("File Excel salvato e chiuso")
+            # 9. Sincronizza Excel -> SQLite
+            logger.info("Sincronizzazione Excel -> Database SQLite...")
+            # Lettura a blocchi: le righe passano al database senza caricare tutto il foglio
+            synced = False
+            try:
+                synced = sync_rows(
+                    chain.from_iterable(excel_mgr.iter_sync_blocks()),
+                    site=site_for_path(excel_mgr.path)
+                ) is not None
+            except Exception as e:
+                # Il registro va comunque salvato: la sync verrà ripetuta dalla GUI
+                logger.error(f"Sincronizzazione database non riuscita: {e}")
+            if not synced:
+                logger.warning("Database non sincronizzato con il registro Excel")
+            
+            # 10. Salva e chiudi Excel
+            # Il salvataggio viene saltato se nella sessione non è cambiato nulla
+            saved = excel_mgr.is_dirty
+            excel_mgr.close(save=True)
+            logger.info("File Excel salvato e chiuso" if saved else "File Excel chiuso senza modifiche")
+            
+            # Il DB riflette già il registro salvato: evita una nuova sync all'avvio della GUI
+            if synced:
+                record_register_synced()
         
+        # 11. Sposta negli archivi per anno le RDA degli anni chiusi
+        try:
+            archive_closed_years()
+        except Exception as e:
+            # Nessun dato perso: l'archiviazione riprende alla prossima esecuzione
+            logger.warning(f"Archiviazione anni chiusi non riuscita: {e}")
+            
     except Exception as e:
         logger.error(f"Errore generale: {e}")
         exit_code = 1
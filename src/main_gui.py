@@ -5,7 +5,6 @@ Versione completamente rifattorizzata con interfaccia moderna e reattiva
 
 import tkinter as tk
 from tkinter import ttk, messagebox
-import sqlite3
 import os
 import sys
 import subprocess
@@ -27,9 +26,20 @@ from src.core import license_updater
 from src.core import license_validator
 from src.core import config_manager
 from src.utils import config
-from src.data.excel_manager import ExcelManager
-from src.data.database import replace_all_data, get_connection, init_db
-from src.utils.utils import format_number, format_date
+from src.data.database import (
+    get_connection, init_db, get_generation, text_search_clause, read_statistics,
+    read_overdue, alert_columns_for
+)
+from src.data.changelog import read_changes
+from src.data.archive import query_archives
+from src.data.connections import get_pooled_connection
+from src.data.replica import DatabaseReplica
+from src.data.query_cache import QueryCache
+from src.data.sync import sync_all_registers
+from src.utils.utils import format_number, format_date, to_iso_date
+
+# Pausa nella digitazione (ms) dopo la quale parte la ricerca
+SEARCH_DEBOUNCE_MS = 300
 
 # Setup logging
 def setup_logging():
@@ -37,13 +47,13 @@ def setup_logging():
     # Usa AppData per i log
     data_dir = config_manager.get_data_path()
     log_dir = os.path.join(data_dir, "Logs")
-
+    
     if not os.path.exists(log_dir):
         try:
             os.makedirs(log_dir)
         except:
             return 
-
+    
     log_file = os.path.join(log_dir, "app_error.log")
     
     # Redirezione stderr su file
@@ -217,105 +227,135 @@ class ModernStyle:
 class DatabaseManager:
     """Gestisce connessione e operazioni sul database SQLite"""
     
-    def __init__(self, db_path):
+    # Colonne delle righe mostrate dalla GUI (indici usati da tabella e filtri);
+    # {alert_level} è il livello calcolato sulla data odierna
+    ROW_COLUMNS = """
+        rda_data.rda_number, rda_data.commessa, rda_data.descrizione_materiale,
+        rda_data.unita_misura, rda_data.quantita, rda_data.apf, rda_data.data_rda,
+        rda_data.data_consegna, {alert_level} AS alert_level, rda_data.richiedente,
+        rda_data.pdf_path, rda_data.site, rda_data.data_rda_iso, rda_data.data_consegna_iso,
+        rda_data.id
+    """
+    
+    def __init__(self, db_path, replica=None):
         self.db_path = db_path
         self._connection = None
+        # Copia locale da cui leggere al posto del database condiviso
+        self.replica = replica
+        # Risultati riutilizzati finché il database non cambia
+        self.cache = QueryCache()
     
     def get_connection(self):
-        """Ottiene connessione al database"""
+        """Ottiene connessione al database (alla copia locale, se disponibile)"""
         try:
-            conn = sqlite3.connect(self.db_path, check_same_thread=False)
-            conn.row_factory = sqlite3.Row
-            return conn
+            # Connessione riutilizzata per thread (close() la restituisce al pool)
+            if self.replica is not None and self.replica.ready:
+                return self.replica.connect()
+            return get_pooled_connection(self.db_path)
         except Exception as e:
             raise Exception(f"Errore connessione database: {e}")
     
+    def get_generation(self):
+        """Generazione dei dati letti (quella della copia locale, se in uso)"""
+        if self.replica is not None and self.replica.ready:
+            return self.replica.generation
+        return get_generation()
+    
+    def changes_since(self, generation):
+        """Righe modificate dopo la generazione indicata (vedi database.changes_since)"""
+        conn = self.get_connection()
+        try:
+            return read_changes(conn.cursor(), generation)
+        finally:
+            conn.close()
+    
+    def _row_columns(self):
+        """Colonne delle righe con l'alert calcolato alla data odierna"""
+        return self.ROW_COLUMNS.format(alert_level=alert_columns_for()[1])
+    
     def fetch_all_data(self):
         """Recupera tutti i dati dal database"""
         conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT rda_number, commessa, descrizione_materiale, unita_misura, 
-                   quantita, apf, data_rda, data_consegna, alert_level, 
-                   richiedente, pdf_path 
+        rows = self.cache.fetchall(conn, f"""
+            SELECT {self._row_columns()}
             FROM rda_data
-            ORDER BY data_rda DESC
+            ORDER BY data_rda_iso DESC
         """)
-        rows = cursor.fetchall()
         conn.close()
         return rows
     
-    def get_statistics(self):
-        """Calcola statistiche dai dati"""
+    def fetch_rows(self, ids):
+        """Rilegge le righe con gli id indicati (a blocchi di 500)"""
+        ids = list(ids)
+        rows = []
+        conn = self.get_connection()
+        try:
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                rows.extend(conn.execute(f"""
+                    SELECT {self._row_columns()}
+                    FROM rda_data
+                    WHERE id IN ({", ".join("?" * len(chunk))})
+                """, chunk).fetchall())
+        finally:
+            conn.close()
+        return rows
+    
+    def apply_changes(self, rows, changes):
+        """
+        Applica alle righe in memoria le modifiche restituite da changes_since:
+        le righe eliminate vengono tolte, quelle inserite o modificate rilette.
+        Restituisce una nuova lista, nello stesso ordine di fetch_all_data.
+        """
+        touched = {change['id'] for change in changes}
+        fresh = self.fetch_rows(change['id'] for change in changes if change['op'] != "D")
+        merged = [row for row in rows if row['id'] not in touched] + fresh
+        merged.sort(key=lambda row: row['data_rda_iso'] or "", reverse=True)
+        return merged
+    
+    def search(self, text, include_archive=False):
+        """
+        Ricerca testuale (indice FTS), righe ordinate per rilevanza e data.
+        Con include_archive cerca anche negli archivi degli anni chiusi
+        (letti in parallelo), dopo le righe del database principale.
+        """
         conn = self.get_connection()
         cursor = conn.cursor()
-        
-        stats = {}
-        
-        # Totale RDA
-        cursor.execute("SELECT COUNT(DISTINCT rda_number) FROM rda_data")
-        stats['total_rda'] = cursor.fetchone()[0] or 0
-        
-        # Totale righe/articoli
-        cursor.execute("SELECT COUNT(*) FROM rda_data")
-        stats['total_rows'] = cursor.fetchone()[0] or 0
-        
-        # RDA scadute (alert_level > 0)
-        cursor.execute("SELECT COUNT(DISTINCT rda_number) FROM rda_data WHERE alert_level > 0")
-        stats['overdue_rda'] = cursor.fetchone()[0] or 0
-        
-        # RDA per richiedente
-        cursor.execute("""
-            SELECT richiedente, COUNT(DISTINCT rda_number) as cnt 
-            FROM rda_data 
-            WHERE richiedente IS NOT NULL AND richiedente != ''
-            GROUP BY richiedente 
-            ORDER BY cnt DESC
-        """)
-        stats['by_requester'] = cursor.fetchall()
-        
-        # RDA per mese (ultimi 12 mesi)
-        cursor.execute("""
-            SELECT substr(data_rda, 4, 7) as mese, COUNT(DISTINCT rda_number) as cnt
-            FROM rda_data
-            WHERE data_rda IS NOT NULL AND data_rda != ''
-            GROUP BY mese
-            ORDER BY substr(data_rda, 7, 4) DESC, substr(data_rda, 4, 2) DESC
-            LIMIT 12
-        """)
-        stats['by_month'] = cursor.fetchall()
-        
-        # APF distribution
-        cursor.execute("""
-            SELECT apf, COUNT(*) as cnt 
-            FROM rda_data 
-            WHERE apf IS NOT NULL AND apf != ''
-            GROUP BY apf
-        """)
-        stats['by_apf'] = cursor.fetchall()
-        
-        # Alert level distribution
-        cursor.execute("""
-            SELECT alert_level, COUNT(*) as cnt 
-            FROM rda_data 
-            GROUP BY alert_level
-            ORDER BY alert_level
-        """)
-        stats['by_alert'] = cursor.fetchall()
-        
-        # Top articoli richiesti
-        cursor.execute("""
-            SELECT descrizione_materiale, SUM(quantita) as tot_qty, COUNT(*) as cnt
-            FROM rda_data
-            WHERE descrizione_materiale IS NOT NULL AND descrizione_materiale != ''
-            GROUP BY descrizione_materiale
-            ORDER BY cnt DESC
-            LIMIT 10
-        """)
-        stats['top_materials'] = cursor.fetchall()
-        
-        conn.close()
-        return stats
+        from_clause, conditions, params, ranked = text_search_clause(cursor, [(None, text)])
+        order = "rda_fts.rank, data_rda_iso DESC" if ranked else "data_rda_iso DESC"
+        query = f"""
+            SELECT {self._row_columns()}
+            FROM {from_clause}
+            WHERE {" AND ".join(conditions)}
+            ORDER BY {order}
+        """
+        try:
+            rows = self.cache.fetchall(conn, query, params)
+            if include_archive:
+                rows += self.cache.get_or_compute(
+                    conn, ("archives", query, tuple(params)), lambda: query_archives(query, params)
+                )
+        finally:
+            conn.close()
+        return rows
+    
+    def get_statistics(self):
+        """Statistiche pre-aggregate (tabella stat_summary, aggiornata in sync)"""
+        conn = self.get_connection()
+        today = datetime.now().date()
+        try:
+            return self.cache.get_or_compute(conn, ("statistics", today), lambda: read_statistics(conn.cursor()))
+        finally:
+            conn.close()
+    
+    def fetch_overdue(self):
+        """RDA scadute non consegnate, con giorni e alert calcolati dal database"""
+        conn = self.get_connection()
+        today = datetime.now().date()
+        try:
+            return self.cache.get_or_compute(conn, ("overdue", today), lambda: read_overdue(conn.cursor()))
+        finally:
+            conn.close()
 
 
 class RDAViewerApp:
@@ -331,17 +371,25 @@ class RDAViewerApp:
         ModernStyle.apply(root)
         self.root.configure(bg=ModernStyle.BG_SECONDARY)
         
-        # Database manager
-        self.db = DatabaseManager(config.SQLITE_DB_PATH)
+        # Database manager: letture dalla copia locale in AppData, se attiva
+        replica = None
+        if config.DB_REPLICA:
+            replica = DatabaseReplica(config.SQLITE_DB_PATH, in_memory=config.DB_REPLICA_MEMORY)
+        self.db = DatabaseManager(config.SQLITE_DB_PATH, replica)
         
         # Dati in memoria per performance
         self.all_data = []
         self.filtered_data = []
         self.path_map = {}
+        self.loaded_generation = None
+        self.loaded_date = None
         
         # Variabili di stato
         self.loading = False
         self.search_var = tk.StringVar()
+        self.include_archive_var = tk.BooleanVar(value=False)
+        self._search_job = None   # Ricerca programmata (after), annullata a ogni tasto
+        self._search_seq = 0      # Numero dell'ultima ricerca avviata
         self.status_var = tk.StringVar(value="Avvio in corso...")
         
         # Costruisci interfaccia
@@ -387,7 +435,7 @@ class RDAViewerApp:
         self.search_tab = ttk.Frame(self.notebook)
         self.notebook.add(self.search_tab, text="  🔍 Ricerca Avanzata  ")
         self._build_search_tab()
-
+        
         # Tab 6: Configurazione
         self.config_tab = ttk.Frame(self.notebook)
         self.notebook.add(self.config_tab, text="  ⚙️ Configurazione  ")
@@ -444,6 +492,10 @@ class RDAViewerApp:
         search_entry.pack(side="left", fill="x", expand=True, padx=(0, 10))
         search_entry.bind("<KeyRelease>", self._on_search)
         
+        # Ricerca anche negli archivi degli anni chiusi (più lenta)
+        ttk.Checkbutton(search_frame, text="Includi archivio", variable=self.include_archive_var,
+                        command=self._on_search).pack(side="left", padx=(0, 10))
+        
         # Info risultati
         self.results_label = ttk.Label(search_frame, text="", style="TLabel")
         self.results_label.pack(side="right", padx=10)
@@ -455,11 +507,17 @@ class RDAViewerApp:
         # Colonne
         columns = (
             "rda_number", "commessa", "desc_materiale", "unita", "qty",
-            "apf", "data_rda", "data_consegna", "alert", "richiedente"
+            "apf", "data_rda", "data_consegna", "alert", "richiedente", "sede"
         )
         
         self.tree = ttk.Treeview(table_frame, columns=columns, show="headings")
         
+        # La colonna Sede compare (per prima) solo con più registri configurati
+        if len(config.REGISTERS) > 1:
+            self.tree.configure(displaycolumns=("sede",) + columns[:-1])
+        else:
+            self.tree.configure(displaycolumns=columns[:-1])
+        
         # Intestazioni e larghezze
         headers = {
             "rda_number": ("N° RDA", 100),
@@ -471,7 +529,8 @@ class RDAViewerApp:
             "data_rda": ("Data RDA", 100),
             "data_consegna": ("Data Consegna", 100),
             "alert": ("Alert", 60),
-            "richiedente": ("Richiedente", 150)
+            "richiedente": ("Richiedente", 150),
+            "sede": ("Sede", 90)
         }
         
         for col, (text, width) in headers.items():
@@ -715,54 +774,105 @@ class RDAViewerApp:
         def sync_task():
             self.root.after(0, lambda: self._set_loading(True, "Sincronizzazione in corso..."))
             
-            import pythoncom
-            pythoncom.CoInitialize()
+            try:
+                import pythoncom
+                pythoncom.CoInitialize()
+            except ImportError:
+                pythoncom = None
             
             try:
+                # Copia locale dell'ultima sessione: dati mostrati subito,
+                # senza attendere database condiviso e registri
+                replica = self.db.replica
+                if replica is not None and not self.all_data and replica.open_existing():
+                    self._load_data()
+                    self.root.after(0, lambda: self.status_var.set("Dati locali caricati, sincronizzazione in corso..."))
+                
                 # Assicura che il database sia pronto
                 init_db()
                 
-                # Tenta sincronizzazione con Excel se disponibile
-                if os.path.exists(config.EXCEL_DB_PATH):
+                # Tenta sincronizzazione con i registri Excel disponibili
+                # In modalità "sqlite" il database è già il registro
+                registers = [r for r in config.REGISTERS if os.path.exists(r['path'])]
+                if config.REGISTER_MODE == "excel" and registers:
                     try:
-                        self.root.after(0, lambda: self.status_var.set("Apertura Excel..."))
-                        excel_mgr = ExcelManager()
-                        if excel_mgr.open():
-                            all_data = excel_mgr.get_all_data_for_sync()
-                            if all_data:
-                                replace_all_data(all_data)
-                                self.root.after(0, lambda: self.status_var.set("Database sincronizzato"))
-                            excel_mgr.close(save=False)
-                        else:
-                            self.root.after(0, lambda: self.status_var.set("Sync fallito: Excel non apribile"))
+                        self.root.after(0, lambda: self.status_var.set("Controllo registri Excel..."))
+                        results = sync_all_registers(registers=registers)
+                        errors = [result['error'] for result in results.values() if 'error' in result]
+                        n_changes = sum(
+                            len(changes['inserted']) + len(changes['updated']) + len(changes['deleted'])
+                            for changes in (result.get('changes') for result in results.values())
+                            if changes
+                        )
+                        if errors:
+                            self.root.after(0, lambda: self.status_var.set(f"Sync fallita: {errors[0][:30]}..."))
+                        elif n_changes:
+                            self.root.after(0, lambda: self.status_var.set(
+                                f"Database sincronizzato: {n_changes} righe modificate"))
                     except Exception as e:
                         self.root.after(0, lambda: self.status_var.set(f"Sync fallita: {str(e)[:30]}..."))
                 
-                # Carica i dati dal database
-                self.root.after(0, lambda: self.status_var.set("Caricamento dati..."))
-                self.all_data = self.db.fetch_all_data()
-                self.filtered_data = list(self.all_data)
+                # Copia locale rifatta solo se il database condiviso è cambiato;
+                # se non riesce si continua a leggere quella precedente
+                if replica is not None:
+                    try:
+                        replica.refresh()
+                    except Exception as e:
+                        message = f"Copia locale non aggiornata: {str(e)[:30]}..."
+                        self.root.after(0, lambda: self.status_var.set(message))
                 
-                # Aggiorna interfaccia nel thread principale
-                self.root.after(0, self._update_ui_after_load)
+                self._load_data()
                 
             except Exception as e:
                 self.root.after(0, lambda: messagebox.showerror("Errore", f"Errore caricamento: {e}"))
             finally:
-                pythoncom.CoUninitialize()
+                if pythoncom:
+                    pythoncom.CoUninitialize()
                 self.root.after(0, lambda: self._set_loading(False, "Pronto"))
         
         # Esegui in thread separato
         threading.Thread(target=sync_task, daemon=True).start()
     
+    def _load_data(self):
+        """
+        Carica i dati (dal thread di sincronizzazione) e aggiorna l'interfaccia:
+        solo le righe modificate se il registro delle modifiche copre l'ultimo
+        caricamento (lo stesso giorno, perché gli alert dipendono dalla data)
+        """
+        # Nessuna scrittura dall'ultimo caricamento: i dati in memoria sono attuali
+        generation = self.db.get_generation()
+        if self.all_data and generation == self.loaded_generation:
+            return
+        
+        self.root.after(0, lambda: self.status_var.set("Caricamento dati..."))
+        today = datetime.now().date()
+        changes = None
+        if self.all_data and self.loaded_date == today:
+            changes = self.db.changes_since(self.loaded_generation)
+        if changes is not None:
+            generation, changed = changes
+            self.all_data = self.db.apply_changes(self.all_data, changed)
+        else:
+            self.all_data = self.db.fetch_all_data()
+        self.loaded_generation = generation
+        self.loaded_date = today
+        self.filtered_data = list(self.all_data)
+        
+        # Aggiorna interfaccia nel thread principale
+        self.root.after(0, self._update_ui_after_load)
+    
     def _update_ui_after_load(self):
         """Aggiorna l'interfaccia dopo il caricamento dei dati"""
         # Aggiorna tabella principale
         self._refresh_table(self.filtered_data)
         
-        # Aggiorna statistiche
-        self._update_dashboard()
-        self._update_stats()
+        # Aggiorna statistiche (una sola lettura per dashboard e tab statistiche)
+        try:
+            stats = self.db.get_statistics()
+        except Exception:
+            stats = None
+        self._update_dashboard(stats)
+        self._update_stats(stats)
         self._update_overdue()
         self._update_advanced_filters()
         
@@ -801,36 +911,65 @@ class RDAViewerApp:
                 row[6],  # Data RDA
                 row[7],  # Data Consegna
                 format_number(row[8]) if row[8] else "",  # Alert
-                row[9]   # Richiedente
+                row[9],  # Richiedente
+                row[11] if len(row) > 11 else ""  # Sede
             ]
             
             item_id = self.tree.insert("", "end", values=values)
             self.path_map[item_id] = row[10] if len(row) > 10 else ""
     
     def _on_search(self, event=None):
-        """Gestisce la ricerca in tempo reale"""
-        query = self.search_var.get().lower().strip()
+        """Gestisce la ricerca in tempo reale: parte dopo una pausa nella digitazione"""
+        if self._search_job is not None:
+            self.root.after_cancel(self._search_job)
+        self._search_job = self.root.after(SEARCH_DEBOUNCE_MS, self._run_search)
+    
+    def _run_search(self):
+        """Esegue la ricerca in un thread separato, senza bloccare l'interfaccia"""
+        self._search_job = None
+        self._search_seq += 1
+        seq = self._search_seq
+        query = self.search_var.get().strip()
         
         if not query:
-            self.filtered_data = list(self.all_data)
-        else:
-            self.filtered_data = []
-            for row in self.all_data:
-                for field in row[:10]:
-                    if query in str(field).lower():
-                        self.filtered_data.append(row)
-                        break
+            self._show_search_results(seq, list(self.all_data))
+            return
         
+        include_archive = self.include_archive_var.get()
+        self.results_label.config(text="Ricerca...")
+        
+        def search_task():
+            try:
+                rows = self.db.search(query, include_archive)
+            except Exception as e:
+                message = f"Errore ricerca: {str(e)[:30]}..."
+                self.root.after(0, lambda: self._show_search_error(seq, message))
+                return
+            self.root.after(0, lambda: self._show_search_results(seq, rows))
+        
+        threading.Thread(target=search_task, daemon=True).start()
+    
+    def _show_search_results(self, seq, rows):
+        """Mostra i risultati, solo se sono dell'ultima ricerca avviata"""
+        if seq != self._search_seq:
+            return
+        self.filtered_data = rows
         self._refresh_table(self.filtered_data)
         self.results_label.config(text=f"{len(self.filtered_data)} risultati")
     
+    def _show_search_error(self, seq, message):
+        """Segnala l'errore di ricerca, solo se è dell'ultima ricerca avviata"""
+        if seq == self._search_seq:
+            self.status_var.set(message)
+            self.results_label.config(text="")
+    
     def _sort_column(self, col):
         """Ordina la tabella per colonna"""
         # Mappa colonne a indici
         col_map = {
             "rda_number": 0, "commessa": 1, "desc_materiale": 2, "unita": 3,
             "qty": 4, "apf": 5, "data_rda": 6, "data_consegna": 7,
-            "alert": 8, "richiedente": 9
+            "alert": 8, "richiedente": 9, "sede": 11
         }
         
         idx = col_map.get(col, 0)
@@ -839,15 +978,10 @@ class RDAViewerApp:
         def sort_key(row):
             val = row[idx]
             
-            # Gestione colonne DATA (6: data_rda, 7: data_consegna)
+            # Colonne DATA (6: data_rda, 7: data_consegna): ordina sulle date
+            # ISO (12, 13), "" per le date mancanti o non interpretabili
             if idx in (6, 7):
-                if not val or str(val).strip() == "":
-                    return datetime.min
-                try:
-                    # Tenta il parsing della data in formato italiano
-                    return datetime.strptime(str(val).strip(), "%d/%m/%Y")
-                except:
-                    return datetime.min
+                return row[idx + 6] or ""
             
             if val is None:
                 return ""
@@ -911,15 +1045,13 @@ class RDAViewerApp:
         self.search_var.set(str(rda))
         self._on_search()
     
-    def _update_dashboard(self):
+    def _update_dashboard(self, stats):
         """Aggiorna il tab dashboard"""
         # Pulisci frame esistente
         for widget in self.stats_cards_frame.winfo_children():
             widget.destroy()
         
-        try:
-            stats = self.db.get_statistics()
-        except:
+        if not stats:
             return
         
         # Card statistiche principali
@@ -953,15 +1085,13 @@ class RDAViewerApp:
                 ttk.Label(row_frame, text=f"👤 {req or 'N/D'}").pack(side="left")
                 ttk.Label(row_frame, text=f"{cnt} RDA").pack(side="right")
     
-    def _update_stats(self):
+    def _update_stats(self, stats):
         """Aggiorna il tab statistiche"""
         # Pulisci contenuto esistente
         for widget in self.stats_content_frame.winfo_children():
             widget.destroy()
         
-        try:
-            stats = self.db.get_statistics()
-        except:
+        if not stats:
             return
         
         # Distribuzione Alert
@@ -1012,36 +1142,25 @@ class RDAViewerApp:
         """Aggiorna il tab RDA scadute"""
         self.overdue_tree.delete(*self.overdue_tree.get_children())
         
-        today = datetime.now()
+        try:
+            rows = self.db.fetch_overdue()
+        except Exception:
+            return
         
-        for row in self.all_data:
-            alert_level = row[8] if len(row) > 8 else 0
+        for row in rows:
+            alert_level = row['alert_level']
             
-            try:
-                alert_level = int(alert_level) if alert_level else 0
-            except:
-                alert_level = 0
+            # Determina tag per colore
+            if alert_level >= 10:
+                tag = "high"
+            elif alert_level >= 5:
+                tag = "medium"
+            else:
+                tag = "low"
             
-            if alert_level > 0:
-                # Calcola giorni trascorsi dalla data RDA
-                data_rda_str = row[6]
-                giorni = 0
-                try:
-                    data_rda = datetime.strptime(data_rda_str, "%d/%m/%Y")
-                    giorni = (today - data_rda).days
-                except:
-                    pass
-                
-                # Determina tag per colore
-                if alert_level >= 10:
-                    tag = "high"
-                elif alert_level >= 5:
-                    tag = "medium"
-                else:
-                    tag = "low"
-                
-                values = (row[0], row[2], row[6], alert_level, row[9], giorni)
-                self.overdue_tree.insert("", "end", values=values, tags=(tag,))
+            values = (row['rda_number'], row['descrizione_materiale'], row['data_rda'],
+                      alert_level, row['richiedente'], row['days_elapsed'])
+            self.overdue_tree.insert("", "end", values=values, tags=(tag,))
     
     def _update_advanced_filters(self):
         """Aggiorna i filtri della ricerca avanzata"""
@@ -1069,15 +1188,10 @@ class RDAViewerApp:
         apf_filter = self.adv_apf_var.get().strip().lower()
         only_overdue = self.adv_overdue_var.get()
         
-        # Parse date filters
-        date_from_obj = None
-        date_to_obj = None
-        try:
-            if date_from:
-                date_from_obj = datetime.strptime(date_from, "%d/%m/%Y")
-            if date_to:
-                date_to_obj = datetime.strptime(date_to, "%d/%m/%Y")
-        except ValueError:
+        # Parse date filters (confronto sulle date ISO delle righe)
+        date_from_iso = to_iso_date(date_from)
+        date_to_iso = to_iso_date(date_to)
+        if (date_from and not date_from_iso) or (date_to and not date_to_iso):
             messagebox.showwarning("Attenzione", "Formato data non valido. Usa: gg/mm/aaaa")
             return
         
@@ -1094,15 +1208,12 @@ class RDAViewerApp:
             if apf_filter and apf_filter not in str(row[5]).lower():
                 continue
             
-            # Filtro date
-            try:
-                row_date = datetime.strptime(row[6], "%d/%m/%Y") if row[6] else None
-                if date_from_obj and row_date and row_date < date_from_obj:
-                    continue
-                if date_to_obj and row_date and row_date > date_to_obj:
-                    continue
-            except:
-                pass
+            # Filtro date (le righe senza data non vengono escluse)
+            row_date = row[12]
+            if date_from_iso and row_date and row_date < date_from_iso:
+                continue
+            if date_to_iso and row_date and row_date > date_to_iso:
+                continue
             
             # Filtro scadute
             if only_overdue:
@@ -1179,72 +1290,74 @@ class RDAViewerApp:
             messagebox.showinfo("Esportazione", f"File esportato con successo:\n{filepath}")
         except Exception as e:
             messagebox.showerror("Errore", f"Errore durante l'esportazione: {e}")
-
+    
     def _build_config_tab(self):
         """Costruisce il tab di configurazione"""
         from tkinter import filedialog
-
+        
         # Container
         container = ttk.Frame(self.config_tab, padding=20)
         container.pack(fill="both", expand=True)
-
+        
         ttk.Label(container, text="⚙️ Configurazione Applicazione", style="Title.TLabel").pack(anchor="w", pady=(0, 20))
-
+        
         # Frame paths
         path_frame = ttk.LabelFrame(container, text="Percorsi File", padding=15)
         path_frame.pack(fill="x", pady=10)
-
+        
         # Excel Path
         ttk.Label(path_frame, text="File Excel Database:").grid(row=0, column=0, sticky="w", pady=5)
         self.config_excel_var = tk.StringVar(value=config.EXCEL_DB_PATH)
         ttk.Entry(path_frame, textvariable=self.config_excel_var, width=70).grid(row=0, column=1, padx=10, pady=5)
         ttk.Button(path_frame, text="Sfoglia...", command=lambda: self._browse_file(self.config_excel_var, "Excel Files", "*.xlsm")).grid(row=0, column=2, pady=5)
-
+        
         # PDF Folder
         ttk.Label(path_frame, text="Cartella PDF RDA:").grid(row=1, column=0, sticky="w", pady=5)
         self.config_pdf_var = tk.StringVar(value=config.PDF_SAVE_PATH)
         ttk.Entry(path_frame, textvariable=self.config_pdf_var, width=70).grid(row=1, column=1, padx=10, pady=5)
         ttk.Button(path_frame, text="Sfoglia...", command=lambda: self._browse_folder(self.config_pdf_var)).grid(row=1, column=2, pady=5)
-
+        
         # Database Dir (Optional/Advanced)
         ttk.Label(path_frame, text="Cartella Database:").grid(row=2, column=0, sticky="w", pady=5)
         self.config_db_dir_var = tk.StringVar(value=config.DATABASE_DIR)
         ttk.Entry(path_frame, textvariable=self.config_db_dir_var, width=70).grid(row=2, column=1, padx=10, pady=5)
         ttk.Button(path_frame, text="Sfoglia...", command=lambda: self._browse_folder(self.config_db_dir_var)).grid(row=2, column=2, pady=5)
-
+        
         # Buttons
         btn_frame = ttk.Frame(container, padding=20)
         btn_frame.pack(fill="x")
         ttk.Button(btn_frame, text="💾 Salva Configurazione", style="Success.TButton", command=self._save_configuration).pack(side="right")
         ttk.Button(btn_frame, text="🔄 Ripristina Default", command=self._reset_configuration).pack(side="right", padx=10)
-
+        
         info_lbl = ttk.Label(container, text="Nota: Le modifiche richiedono il riavvio dell'applicazione.", foreground=ModernStyle.TEXT_MUTED)
         info_lbl.pack(pady=10)
-
+    
     def _browse_file(self, var, file_desc, file_ext):
         from tkinter import filedialog
         path = filedialog.askopenfilename(filetypes=[(file_desc, file_ext), ("All Files", "*.*")])
         if path:
             var.set(path.replace('/', '\\'))
-
+    
     def _browse_folder(self, var):
         from tkinter import filedialog
         path = filedialog.askdirectory()
         if path:
             var.set(path.replace('/', '\\'))
-
+    
     def _save_configuration(self):
-        new_config = {
+        # Mantiene le chiavi non modificabili dalla GUI (es. register_mode)
+        new_config = dict(config_manager.current_config)
+        new_config.update({
             "excel_path": self.config_excel_var.get(),
             "pdf_folder": self.config_pdf_var.get(),
             "database_dir": self.config_db_dir_var.get()
-        }
-
+        })
+        
         if config_manager.save_config(new_config):
             messagebox.showinfo("Successo", "Configurazione salvata correttamente.\nRiavvia l'applicazione per applicare le modifiche.")
         else:
             messagebox.showerror("Errore", "Impossibile salvare la configurazione. Verifica i permessi.")
-
+    
     def _reset_configuration(self):
         if messagebox.askyesno("Conferma", "Vuoi ripristinare la configurazione predefinita?"):
              defaults = config_manager.DEFAULT_CONFIG
@@ -1264,7 +1377,7 @@ def main():
         app_updater.check_for_updates(silent=True)
     except Exception as e:
         print(f"[ERRORE] Check updates: {e}")
-
+    
     # -------------------------------------------------------------------------
     # 2. AGGIORNAMENTO LICENZA
     # -------------------------------------------------------------------------
@@ -1272,12 +1385,12 @@ def main():
         license_updater.run_update()
     except Exception as e:
         print(f"[ERRORE] License update: {e}")
-
+    
     # -------------------------------------------------------------------------
     # 3. VERIFICA LICENZA BLOCCANTE
     # -------------------------------------------------------------------------
     is_valid, message = license_validator.verify_license()
-
+    
     if not is_valid:
         root.withdraw() # Nascondi finestra principale
         messagebox.showerror(
@@ -1285,11 +1398,11 @@ def main():
             f"Impossibile avviare l'applicazione.\n\n{message}"
         )
         sys.exit(1)
-
+    
     # -------------------------------------------------------------------------
     # AVVIO APP
     # -------------------------------------------------------------------------
-
+    
     # Imposta icona se disponibile
     try:
         root.iconbitmap(default="")
@@ -1,28 +1,44 @@
 """
 Script per la sincronizzazione manuale Excel -> SQLite
-Utile per aggiornare il database senza eseguire l'intero bot
+Utile per aggiornare il database senza eseguire l'intero bot.
+Con register_mode = "sqlite" rigenera invece il file Excel dal database.
 
 Uso:
-    python run_sync.py
+    python run_sync.py [--force]
+
+Opzioni:
+    --force    Sincronizza anche se il registro non è cambiato
 """
 
-import pythoncom
+import argparse
 import sys
 import os
 
+try:
+    import pythoncom
+except ImportError:  # Non Windows: disponibile solo la lettura openpyxl
+    pythoncom = None
+
 # Aggiungi directory al path
 # Risaliamo da src/run_sync.py
 SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if SCRIPT_DIR not in sys.path:
     sys.path.insert(0, SCRIPT_DIR)
 
-from src.data.excel_manager import ExcelManager
-from src.data.database import init_db, replace_all_data
+from src.data.database import init_db
+from src.data.sync import sync_all_registers
+from src.data.excel_export import export_register
+from src.utils.config import REGISTER_MODE
 from src.utils.utils import logger
 
 
-def run_sync():
-    """Esegue la sincronizzazione Excel -> Database SQLite."""
+def run_sync(force=False):
+    """
+    Esegue la sincronizzazione Excel -> Database SQLite.
+    
+    Args:
+        force: Se True, ignora il controllo sull'impronta del registro
+    """
     logger.info("=" * 50)
     logger.info("Avvio sincronizzazione manuale Excel -> DB")
     logger.info("=" * 50)
@@ -34,42 +50,35 @@ def run_sync():
         logger.error(f"Errore inizializzazione database: {e}")
         return 1
     
-    # 2. Inizializza COM
-    pythoncom.CoInitialize()
+    # Il database è il registro: l'Excel è solo un export da rigenerare
+    if REGISTER_MODE == "sqlite":
+        logger.info("Registro in modalità SQLite: generazione file Excel dal database")
+        return 0 if export_register() is not None else 1
+    
+    # 2. Inizializza COM (necessario solo per il fallback su Excel)
+    if pythoncom:
+        pythoncom.CoInitialize()
     
-    excel_mgr = None
     exit_code = 0
     
     try:
-        # 3. Apri Excel in sola lettura
-        excel_mgr = ExcelManager()
-        if not excel_mgr.open():
-            logger.error("Impossibile aprire il file Excel.")
-            return 1
-        
-        # 4. Leggi tutti i dati
-        logger.info("Lettura dati dal file Excel...")
-        all_data = excel_mgr.get_all_data_for_sync()
-        
-        # 5. Aggiorna database
-        if all_data:
-            logger.info(f"Trovate {len(all_data)} righe. Aggiornamento DB...")
-            replace_all_data(all_data)
-            logger.info("Database aggiornato con successo!")
-        else:
-            logger.warning("Nessun dato trovato nel file Excel.")
-        
-        # 6. Chiudi senza salvare (lettura only)
-        excel_mgr.close(save=False)
+        # 3. Leggi i registri (se modificati) e aggiorna il database
+        results = sync_all_registers(force=force)
+        for site, result in results.items():
+            label = f"Sede {site}" if site else "Registro"
+            if 'error' in result:
+                logger.error(f"{label}: sincronizzazione fallita ({result['error']})")
+                exit_code = 1
+            elif not result['skipped']:
+                logger.info(f"{label}: database aggiornato con successo! ({result['rows']} righe)")
         
     except Exception as e:
         logger.error(f"Errore durante la sincronizzazione: {e}")
         exit_code = 1
-        if excel_mgr:
-            excel_mgr.close(save=False)
     
     finally:
-        pythoncom.CoUninitialize()
+        if pythoncom:
+            pythoncom.CoUninitialize()
         logger.info("=" * 50)
         logger.info("Sincronizzazione completata")
         logger.info("=" * 50)
@@ -78,4 +87,8 @@ def run_sync():
 
 
 if __name__ == "__main__":
-    sys.exit(run_sync())
+    parser = argparse.ArgumentParser(description="Sincronizzazione manuale Excel -> DB")
+    parser.add_argument("--force", action="store_true",
+                        help="sincronizza anche se il registro non è cambiato")
+    args = parser.parse_args()
+    sys.exit(run_sync(force=args.force))
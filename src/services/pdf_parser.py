@@ -13,12 +13,15 @@ from src.utils.config import PDF_SAVE_PATH
 logger = logging.getLogger("RDA_Bot")
 
 
-def extract_rda_data(pdf_path):
+def extract_rda_data(pdf_path, known_rda_numbers=None):
     """
     Estrae i dati dal PDF RDA.
     
     Args:
         pdf_path: Percorso del file PDF
+        known_rda_numbers: Insieme opzionale di numeri RDA già registrati;
+            se il numero letto è presente, l'estrazione della tabella
+            viene saltata e la funzione restituisce None
     
     Returns:
         dict: Dizionario con metadati e tabella articoli, None se errore
@@ -62,6 +65,11 @@ def extract_rda_data(pdf_path):
             rda_number_raw = rda_match.group(1).strip()
             rda_date_raw = date_match.group(1).strip()
             
+            # Scarta i duplicati prima dell'estrazione della tabella
+            if known_rda_numbers and rda_number_raw in known_rda_numbers:
+                logger.warning(f"RDA {rda_number_raw} già esistente in Excel. Saltata.")
+                return None
+            
             # Valida e converti data
             try:
                 rda_date_obj = datetime.strptime(rda_date_raw, '%d/%m/%Y')
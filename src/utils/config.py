@@ -37,6 +37,37 @@ DATABASE_DIR = _db_dir or os.path.dirname(EXCEL_DB_PATH)
 PDF_SAVE_PATH = _pdf_folder
 SQLITE_DB_PATH = os.path.join(DATABASE_DIR, "database_RDA.db")
 
+# Copie locali del registro per le letture (evita I/O di rete durante la sync)
+REGISTER_CACHE_DIR = os.path.join(config_manager.get_data_path(), "Cache")
+
+# Copia locale di sola lettura del database per la GUI, aggiornata solo
+# quando i dati cambiano (db_replica_memory: caricata anche in memoria)
+DB_REPLICA = CONFIG.get("db_replica", True)
+DB_REPLICA_MEMORY = CONFIG.get("db_replica_memory", False)
+DB_REPLICA_DIR = os.path.join(config_manager.get_data_path(), "Replica")
+
+# Registri sincronizzati nel database, uno per sede. Senza la chiave
+# "registers" si usa il solo EXCEL_DB_PATH, senza sede
+REGISTERS = [
+    {"site": reg.get("site") or "", "path": reg["path"]}
+    for reg in CONFIG.get("registers") or []
+    if reg.get("path")
+] or [{"site": "", "path": EXCEL_DB_PATH}]
+
+# --- MISURA TEMPI SQL ---
+# Strumentazione facoltativa delle query: con sql_slow_query_ms > 0 le
+# istruzioni più lente finiscono in slow_queries.log e le misure vengono
+# salvate in sql_metrics.json all'uscita (0 = disattivata)
+SQL_SLOW_QUERY_MS = CONFIG.get("sql_slow_query_ms") or 0
+SQL_SLOW_LOG_PATH = os.path.join(config_manager.get_data_path(), "Logs", "slow_queries.log")
+SQL_METRICS_PATH = os.path.join(config_manager.get_data_path(), "Logs", "sql_metrics.json")
+
+# --- MODALITÀ REGISTRO ---
+# "excel": il file .xlsm è il registro principale (sincronizzato nel database)
+# "sqlite": il database è il registro principale, l'Excel è un export generato
+REGISTER_MODE = CONFIG.get("register_mode") or "excel"
+EXCEL_EXPORT_PATH = CONFIG.get("excel_export_path") or os.path.splitext(EXCEL_DB_PATH)[0] + ".xlsx"
+
 # --- EXCEL SETTINGS ---
 SHEET_PASSWORD = "coemi"
 TABLE_NAME = "Tabella1"
@@ -6,6 +6,7 @@ import logging
 import sys
 import os
 import re
+import hashlib
 from datetime import datetime
 
 from src.utils.config import LOG_FORMAT, LOG_LEVEL
@@ -130,6 +131,21 @@ def parse_date(date_str, format="%d/%m/%Y"):
         return None
 
 
+def to_iso_date(date_str):
+    """
+    Converte una data dd/mm/yyyy in formato ISO (yyyy-mm-dd), ordinabile
+    come testo.
+    
+    Args:
+        date_str: Stringa data dd/mm/yyyy
+    
+    Returns:
+        Stringa ISO, "" se la data non è interpretabile
+    """
+    dt = parse_date(date_str)
+    return dt.strftime("%Y-%m-%d") if dt else ""
+
+
 def safe_str(value, default=""):
     """
     Conversione sicura a stringa.
@@ -208,3 +224,33 @@ def truncate_string(text, max_length=50, suffix="..."):
         return text
     
     return text[:max_length - len(suffix)] + suffix
+
+
+def file_fingerprint(path, sample_size=1024 * 1024):
+    """
+    Calcola un'impronta economica di un file: dimensione, data di modifica
+    e hash SHA-1 del primo e dell'ultimo blocco. Per i file .xlsm/.xlsx
+    (archivi zip) la coda contiene la directory centrale con i CRC di tutte
+    le parti, quindi l'hash parziale cambia con qualsiasi modifica al contenuto.
+    
+    Args:
+        path: Percorso del file
+        sample_size: Byte letti all'inizio e alla fine del file
+    
+    Returns:
+        dict: Chiavi 'size', 'mtime', 'hash'
+    """
+    stat = os.stat(path)
+    digest = hashlib.sha1()
+    
+    with open(path, 'rb') as f:
+        digest.update(f.read(sample_size))
+        if stat.st_size > sample_size:
+            f.seek(max(sample_size, stat.st_size - sample_size))
+            digest.update(f.read(sample_size))
+    
+    return {
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'hash': digest.hexdigest()
+    }
@@ -55,3 +55,31 @@ def mock_settings(monkeypatch):
 
     # Mock messagebox to avoid hanging
     pass
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """
+    Database SQLite temporaneo al posto di quello configurato.
+    """
+    from src.data import database
+
+    db_dir = tmp_path / "DATABASE"
+    db_dir.mkdir()
+    db_path = db_dir / "database_RDA.db"
+    monkeypatch.setattr(database, "DATABASE_DIR", str(db_dir))
+    monkeypatch.setattr(database, "SQLITE_DB_PATH", str(db_path))
+    database.init_db()
+    return db_path
+
+
+@pytest.fixture(autouse=True)
+def temp_register_cache(tmp_path, monkeypatch):
+    """
+    Copie locali del registro in una directory temporanea (non in AppData).
+    """
+    from src.data import register_cache
+
+    cache_dir = tmp_path / "Cache"
+    monkeypatch.setattr(register_cache, "REGISTER_CACHE_DIR", str(cache_dir))
+    return cache_dir
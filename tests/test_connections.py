@@ -0,0 +1,44 @@
+import threading
+
+from src.data import connections, database
+
+
+def test_connection_is_reused_within_thread(temp_db):
+    opened = connections.get_open_count()
+
+    for _ in range(5):
+        conn = database.get_connection()
+        conn.execute("SELECT COUNT(*) FROM rda_data").fetchone()
+        conn.close()
+
+    assert database.get_connection() is conn
+    assert connections.get_open_count() - opened <= 1
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_close_rolls_back_pending_transaction(temp_db):
+    conn = database.get_connection()
+    conn.execute("INSERT INTO rda_data (rda_number) VALUES ('25/1')")
+    conn.close()
+
+    assert database.get_connection().execute("SELECT COUNT(*) FROM rda_data").fetchone()[0] == 0
+
+
+def test_threads_get_own_connection_and_close_all(temp_db):
+    main_conn = database.get_connection()
+    other = []
+    thread = threading.Thread(target=lambda: other.append(database.get_connection()))
+    thread.start()
+    thread.join()
+
+    assert other[0] is not main_conn
+
+    connections.close_all()
+    reopened = database.get_connection()
+    assert reopened is not main_conn
+    assert reopened.execute("SELECT COUNT(*) FROM rda_data").fetchone()[0] == 0
+
+
+def test_network_paths_use_network_pragmas():
+    assert connections.is_network_path(r"\\192.168.11.251\Condivisa\DATABASE\database_RDA.db")
+    assert not connections.is_network_path(r"C:\RDA\database_RDA.db")
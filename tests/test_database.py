@@ -0,0 +1,554 @@
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from src.data import archive, changelog, database, pagination, staging
+
+
+def _row(rda, desc, qty=1.0, alert=0):
+    return (rda, "C1", "GEN", desc, "PZ", qty, "No", "x.pdf", "02/01/2025", "", alert, "Rossi")
+
+
+def _ids_by_key():
+    conn = database.get_connection()
+    rows = conn.execute("SELECT row_key, id FROM rda_data").fetchall()
+    conn.close()
+    return dict(rows)
+
+
+def test_sync_rows_applies_only_differences(temp_db):
+    first = database.sync_rows([_row("25/1", "A"), _row("25/1", "B"), _row("25/2", "C")])
+    assert first['inserted'] == ["25/1#1", "25/1#2", "25/2#1"]
+    ids_before = _ids_by_key()
+    generation = database.get_generation()
+
+    second = database.sync_rows([_row("25/1", "A"), _row("25/1", "B", qty=3.0), _row("25/3", "D")])
+
+    assert second == {
+        'inserted': ["25/3#1"],
+        'updated': ["25/1#2"],
+        'deleted': ["25/2#1"],
+        'unchanged': 1,
+        'archived': 0,
+    }
+    ids_after = _ids_by_key()
+    assert ids_after["25/1#1"] == ids_before["25/1#1"]
+    assert ids_after["25/1#2"] == ids_before["25/1#2"]
+    assert "25/2#1" not in ids_after
+    assert database.get_generation() == generation + 1
+
+
+def test_sync_rows_without_changes_keeps_generation(temp_db):
+    rows = [_row("25/1", "A"), _row("25/2", "B")]
+    database.sync_rows(rows)
+    generation = database.get_generation()
+
+    summary = database.sync_rows(rows)
+
+    assert summary['unchanged'] == 2
+    assert not (summary['inserted'] or summary['updated'] or summary['deleted'])
+    assert database.get_generation() == generation
+
+
+def test_sync_rows_after_full_replace(temp_db):
+    staging.replace_all_data([_row("25/1", "A"), _row("25/2", "B")])
+
+    summary = database.sync_rows([_row("25/1", "A"), _row("25/2", "B")])
+
+    assert summary['unchanged'] == 2
+
+
+def _schema(kind):
+    conn = database.get_connection()
+    rows = conn.execute("SELECT name, tbl_name FROM sqlite_master WHERE type = ? ORDER BY name", (kind,)).fetchall()
+    conn.close()
+    return [tuple(r) for r in rows]
+
+
+def test_replace_all_data_publishes_staging_tables(temp_db):
+    database.sync_rows([_row("25/9", "Flangia")], site="Priolo")
+    staging.replace_all_data([_row("25/1", "Valvola"), _row("25/2", "Raccordo")])
+    indexes = _schema("index")
+    triggers = _schema("trigger")
+
+    staging.replace_all_data([_row("25/1", "Valvola"), _row("25/3", "Guarnizione")])
+
+    rows = database.get_all_rows()
+    assert sorted((r['site'], r['rda_number']) for r in rows) == [
+        ("", "25/1"), ("", "25/3"), ("Priolo", "25/9")
+    ]
+    assert [r['rda_number'] for r in database.search_rda({'text': "guarniz"})] == ["25/3"]
+    assert [h[0] for h in _headers()] == ["25/1", "25/3", "25/9"]
+    assert database.get_statistics()['total_rda'] == 3
+
+    # Stessa struttura di prima: nessuna tabella di appoggio rimasta,
+    # stessi indici (con un altro suffisso) e trigger, init_db non li duplica
+    database.init_db()
+    tables = [name for name, _ in _schema("table")]
+    assert not [t for t in tables if t.endswith(("_staging", "_old"))]
+    assert len(_schema("index")) == len(indexes)
+    assert _schema("trigger") == triggers
+    conn = database.get_connection()
+    header_sql = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'rda_header'").fetchone()[0]
+    conn.close()
+    assert "REFERENCES requester(id)" in header_sql.replace('"', '')
+
+    # I trigger ricreati seguono le scritture successive
+    database.sync_rows([_row("25/1", "Valvola"), _row("25/4", "Manicotto")])
+    assert [r['rda_number'] for r in database.search_rda({'text': "manicotto"})] == ["25/4"]
+    assert [h[0] for h in _headers()] == ["25/1", "25/4", "25/9"]
+
+
+def test_readers_see_previous_data_during_replace(temp_db, monkeypatch):
+    monkeypatch.setattr(staging, "WRITE_BATCH_SIZE", 1)
+    monkeypatch.setattr(staging, "STAGING_COMMIT_ROWS", 1)
+    staging.replace_all_data([_row("25/1", "A"), _row("25/2", "B")])
+    seen = []
+
+    def rows():
+        for n in range(5):
+            yield _row(f"26/{n}", "C")
+            reader = sqlite3.connect(str(temp_db))
+            seen.append(reader.execute("SELECT COUNT(*) FROM rda_data").fetchone()[0])
+            reader.close()
+
+    staging.replace_all_data(rows())
+
+    assert seen == [2] * 5
+    assert len(database.get_all_rows()) == 5
+
+
+def test_replace_all_data_aborts_on_concurrent_sync(temp_db, monkeypatch):
+    monkeypatch.setattr(staging, "WRITE_BATCH_SIZE", 1)
+    monkeypatch.setattr(staging, "STAGING_COMMIT_ROWS", 1)
+    staging.replace_all_data([_row("25/1", "A")])
+
+    def rows():
+        yield _row("25/2", "B")
+        other = sqlite3.connect(str(temp_db))
+        other.execute("UPDATE db_meta SET value = value + 1 WHERE key = 'generation'")
+        other.commit()
+        other.close()
+
+    with pytest.raises(RuntimeError):
+        staging.replace_all_data(rows())
+
+    assert [r['rda_number'] for r in database.get_all_rows()] == ["25/1"]
+    assert not [t for t, _ in _schema("table") if t.endswith("_staging")]
+
+
+def test_changes_since_reports_net_row_changes(temp_db):
+    database.sync_rows([_row("25/1", "A"), _row("25/2", "B")])
+    ids = _ids_by_key()
+    start = database.get_generation()
+    assert database.changes_since(start) == (start, [])
+
+    database.sync_rows([_row("25/1", "A2"), _row("25/3", "C")])
+    database.sync_rows([_row("25/1", "A2"), _row("25/3", "C"), _row("25/4", "D")])
+    database.sync_rows([_row("25/1", "A2"), _row("25/3", "C")])
+
+    generation, changes = database.changes_since(start)
+    assert generation == start + 3
+    assert sorted((c['op'], c['row_key']) for c in changes) == [
+        ("D", "25/2#1"), ("I", "25/3#1"), ("U", "25/1#1")
+    ]
+    assert {c['id'] for c in changes if c['op'] == "U"} == {ids["25/1#1"]}
+    assert database.changes_since(start, limit=2) is None
+
+
+def test_changes_since_requires_reload_after_replace_or_pruning(temp_db, monkeypatch):
+    database.sync_rows([_row("25/1", "A")])
+    before = database.get_generation()
+
+    staging.replace_all_data([_row("25/1", "A"), _row("25/2", "B")])
+    assert database.changes_since(before) is None
+    assert database.changes_since(database.get_generation()) == (database.get_generation(), [])
+
+    monkeypatch.setattr(changelog, "CHANGELOG_RETENTION", 1)
+    after_replace = database.get_generation()
+    database.sync_rows([_row("25/1", "A"), _row("25/2", "B2")])
+    database.sync_rows([_row("25/1", "A2"), _row("25/2", "B2")])
+
+    assert database.changes_since(after_replace) is None
+    assert [c['row_key'] for c in database.changes_since(after_replace + 1)[1]] == ["25/1#1"]
+    conn = database.get_connection()
+    assert conn.execute("SELECT COUNT(*) FROM rda_changes").fetchone()[0] == 1
+    conn.close()
+
+
+def test_sync_rows_streams_in_batches(temp_db, monkeypatch):
+    monkeypatch.setattr(staging, "WRITE_BATCH_SIZE", 2)
+    rows = (_row(f"25/{i}", "A") for i in range(5))
+
+    summary = database.sync_rows(rows)
+
+    assert len(summary['inserted']) == 5
+    assert len(_ids_by_key()) == 5
+
+
+def test_sync_rows_reads_register_without_write_lock(temp_db, monkeypatch):
+    monkeypatch.setattr(staging, "WRITE_BATCH_SIZE", 1)
+    database.sync_rows([_row("25/1", "A")])
+
+    def rows():
+        yield _row("25/1", "B")
+        # Durante la lettura del registro un altro processo può scrivere
+        other = sqlite3.connect(str(temp_db), timeout=0)
+        other.execute("BEGIN IMMEDIATE")
+        other.execute("ROLLBACK")
+        other.close()
+        yield _row("25/2", "C")
+
+    summary = database.sync_rows(rows())
+
+    assert summary['updated'] == ["25/1#1"]
+    assert summary['inserted'] == ["25/2#1"]
+
+
+def test_sync_rows_without_rows_keeps_table(temp_db):
+    database.sync_rows([_row("25/1", "A")])
+    generation = database.get_generation()
+
+    assert database.sync_rows(iter([])) is None
+    assert list(_ids_by_key()) == ["25/1#1"]
+    assert database.get_generation() == generation
+
+
+def test_iso_dates_stored_and_used_for_ranges(temp_db):
+    older = _row("25/1", "A")[:8] + ("15/12/2024", "") + _row("25/1", "A")[10:]
+    undated = _row("25/3", "C")[:8] + ("", "") + _row("25/3", "C")[10:]
+    database.sync_rows([older, _row("25/2", "B"), undated])
+
+    conn = database.get_connection()
+    stored = dict(conn.execute("SELECT rda_number, data_rda_iso FROM rda_data").fetchall())
+    conn.close()
+    assert stored == {"25/1": "2024-12-15", "25/2": "2025-01-02", "25/3": ""}
+
+    assert [r["rda_number"] for r in database.get_all_rows()] == ["25/2", "25/1", "25/3"]
+    found = database.search_rda({'data_from': "01/01/2025"})
+    assert [r['rda_number'] for r in found] == ["25/2"]
+    found = database.search_rda({'data_to': "31/12/2024"})
+    assert [r['rda_number'] for r in found] == ["25/1"]
+
+
+def test_init_db_backfills_iso_dates(temp_db):
+    database.sync_rows([_row("25/1", "A")])
+    conn = database.get_connection()
+    conn.execute("UPDATE rda_data SET data_rda_iso = NULL, data_consegna_iso = NULL")
+    conn.commit()
+    conn.close()
+
+    database.init_db()
+
+    conn = database.get_connection()
+    row = conn.execute("SELECT data_rda_iso, data_consegna_iso FROM rda_data").fetchone()
+    conn.close()
+    assert tuple(row) == ("2025-01-02", "")
+
+
+def test_search_rda_uses_text_index(temp_db):
+    database.sync_rows([
+        _row("25/101", "Valvola a sfera DN50"),
+        _row("25/102", "Guarnizione piana"),
+        _row("26/7", "Valvola di ritegno"),
+    ])
+
+    found = database.search_rda({'text': "valvola"})
+    assert sorted(r['rda_number'] for r in found) == ["25/101", "26/7"]
+
+    # Codice parziale (trigram) e testo corto (LIKE) sul numero RDA
+    found = database.search_rda({'rda_number': "5/10"})
+    assert sorted(r['rda_number'] for r in found) == ["25/101", "25/102"]
+    assert [r['rda_number'] for r in database.search_rda({'rda_number': "26"})] == ["26/7"]
+
+    conn = database.get_connection()
+    plan = " ".join(r[3] for r in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT rowid FROM rda_fts WHERE rda_fts MATCH ?", ('"valvola"',)))
+    conn.close()
+    assert "VIRTUAL TABLE INDEX" in plan
+
+
+def test_text_index_follows_updates_and_deletes(temp_db):
+    database.sync_rows([_row("25/1", "Valvola"), _row("25/2", "Flangia")])
+    database.sync_rows([_row("25/1", "Raccordo")])
+
+    assert database.search_rda({'text': "valvola"}) == []
+    assert database.search_rda({'text': "flangia"}) == []
+    assert [r['rda_number'] for r in database.search_rda({'text': "raccordo"})] == ["25/1"]
+
+
+def test_alert_update_does_not_touch_text_index(temp_db):
+    database.sync_rows([_row("25/1", "Valvola")])
+    conn = database.get_connection()
+    segments = conn.execute("SELECT COUNT(*) FROM rda_fts_data").fetchone()[0]
+    conn.close()
+
+    database.sync_rows([_row("25/1", "Valvola", alert=2)])
+
+    conn = database.get_connection()
+    assert conn.execute("SELECT COUNT(*) FROM rda_fts_data").fetchone()[0] == segments
+    conn.close()
+    assert [r['rda_number'] for r in database.search_rda({'text': "valvola"})] == ["25/1"]
+
+
+def _headers():
+    conn = database.get_connection()
+    rows = conn.execute("""
+        SELECT h.rda_number, h.line_count, h.alert_level, r.name
+        FROM rda_header h LEFT JOIN requester r ON r.id = h.requester_id
+        ORDER BY h.rda_number
+    """).fetchall()
+    conn.close()
+    return [tuple(r) for r in rows]
+
+
+def test_headers_follow_line_changes(temp_db):
+    database.sync_rows([_row("25/1", "A"), _row("25/1", "B", alert=2), _row("25/2", "C")])
+    assert _headers() == [("25/1", 2, 2, "Rossi"), ("25/2", 1, 0, "Rossi")]
+
+    changed = _row("25/2", "C")[:11] + ("Bianchi",)
+    database.sync_rows([_row("25/1", "A"), changed])
+    assert _headers() == [("25/1", 1, 0, "Rossi"), ("25/2", 1, 0, "Bianchi")]
+
+    database.append_rows([_row("25/3", "D")[:11] + ("Verdi",)])
+    stats = database.get_statistics()
+    assert stats['total_rda'] == 3
+    assert sorted(tuple(r) for r in stats['by_requester']) == [("Bianchi", 1), ("Rossi", 1), ("Verdi", 1)]
+
+    conn = database.get_connection()
+    assert conn.execute("SELECT COUNT(*) FROM requester").fetchone()[0] == 3
+    assert conn.execute("SELECT COUNT(*) FROM rda_line").fetchone()[0] == 3
+    conn.close()
+
+
+def test_init_db_builds_headers_for_existing_rows(temp_db):
+    database.sync_rows([_row("25/1", "A"), _row("25/2", "B")])
+    conn = database.get_connection()
+    conn.execute("DROP TABLE rda_header")
+    conn.commit()
+    conn.close()
+
+    database.init_db()
+
+    assert [h[0] for h in _headers()] == ["25/1", "25/2"]
+
+
+def _statistics(today):
+    conn = database.get_connection()
+    stats = database.read_statistics(conn.cursor(), 10, today)
+    conn.close()
+    return {name: value if isinstance(value, int) else [tuple(r) for r in value] for name, value in stats.items()}
+
+
+def test_statistics_follow_incremental_changes(temp_db):
+    today = datetime(2025, 1, 20)
+    recent = _row("25/3", "C")[:8] + ("15/01/2025", "") + _row("25/3", "C")[10:11] + ("Verdi",)
+    database.sync_rows([_row("25/1", "A", 2.0), _row("25/1", "B", alert=1), _row("25/2", "A", 3.0)])
+    database.sync_rows([_row("25/1", "A", 5.0, alert=1), recent])
+    database.update_rows([(1, _row("25/1", "A", 5.0, alert=3))])
+
+    stats = _statistics(today)
+    assert stats['total_rda'] == 2
+    assert stats['total_rows'] == 2
+    assert stats['overdue_rda'] == 1
+    assert sorted(stats['top_materials']) == [("A", 5.0, 1), ("C", 1.0, 1)]
+    assert stats['by_alert'] == [(0, 1), (2, 1)]
+    assert stats['by_month'] == [("01/2025", 2)]
+
+    # Stessi valori ricalcolando stat_summary da zero
+    conn = database.get_connection()
+    conn.execute("DELETE FROM db_meta WHERE key = 'stats_signature'")
+    conn.commit()
+    conn.close()
+    database.init_db()
+    assert _statistics(today) == stats
+
+
+def test_overdue_items_computed_from_dates(temp_db):
+    delivered = _row("25/2", "B")[:9] + ("10/01/2025",) + _row("25/2", "B")[10:]
+    future = _row("25/3", "C")[:9] + ("30/01/2025",) + _row("25/3", "C")[10:]
+    recent = _row("25/4", "D")[:8] + ("15/01/2025", "") + _row("25/4", "D")[10:]
+    database.sync_rows([_row("25/1", "A"), delivered, future, recent])
+
+    items = database.get_overdue_items(datetime(2025, 1, 20))
+
+    assert [item["N°RDA"] for item in items] == ["25/1", "25/3"]
+    assert items[0]["Data RDA"] == "02/01/2025"
+    assert items[0]["richiesta da: (giorni)"] == 18
+
+    conn = database.get_connection()
+    plan = " ".join(r[3] for r in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM rda_data WHERE data_rda_iso != '' AND data_rda_iso <= '2025-01-13'"
+    ))
+    levels = dict(conn.execute("SELECT rda_number, alert_level FROM rda_alert").fetchall())
+    conn.close()
+    assert "idx_open_rda" in plan
+    assert levels["25/1"] >= 2
+
+
+def test_query_page_walks_keyset_pages(temp_db):
+    rows = [
+        _row(f"25/{n}", f"Valvola {n}")[:8] + (f"{1 + n % 5:02d}/01/2025",) + _row("x", "x")[9:]
+        for n in range(23)
+    ]
+    database.sync_rows(rows)
+
+    for sort in pagination.PAGE_SORTS:
+        seen, after = [], None
+        while True:
+            page, after = pagination.query_page(sort=sort, after=after, limit=5)
+            assert len(page) <= 5
+            seen += [row['id'] for row in page]
+            if after is None:
+                break
+        assert len(seen) == len(set(seen)) == 23
+        if sort == "date":
+            keys = sorted(((r['data_rda_iso'], r['id']) for r in database.get_all_rows()), reverse=True)
+            assert seen == [row_id for _, row_id in keys]
+
+    filtered = list(pagination.iter_query({'data_from': "04/01/2025"}, page_size=2))
+    assert {r['data_rda_iso'] for r in filtered} == {"2025-01-04", "2025-01-05"}
+    assert pagination.count_rows({'data_from': "04/01/2025"}) == (len(filtered), True)
+    assert pagination.count_rows({'text': "valvola"}, cap=10) == (10, False)
+    assert pagination.count_rows() == (23, True)
+
+    _, token = pagination.query_page(sort="date", limit=5)
+    with pytest.raises(ValueError):
+        pagination.query_page(sort="rda", after=token)
+
+    conn = database.get_connection()
+    plan = " ".join(r[3] for r in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM rda_data WHERE (data_rda_iso, id) < ('2025-01-03', 9) "
+        "ORDER BY data_rda_iso DESC, id DESC LIMIT 5"
+    ))
+    conn.close()
+    assert "idx_data_rda_iso" in plan and "TEMP B-TREE" not in plan
+
+
+def test_query_page_includes_rows_without_rda_number(temp_db):
+    database.sync_rows([
+        _row("25/1", "A"), _row(None, "B"), _row("25/2", "C"),
+        _row(None, "D"), _row(None, "E"), _row("25/3", "F"),
+    ])
+
+    rows = list(pagination.iter_query(sort="rda", page_size=2))
+
+    assert [r['descrizione_materiale'] for r in rows] == ["B", "D", "E", "A", "C", "F"]
+
+
+def _dated_row(rda, desc, date):
+    return (rda, "C1", "GEN", desc, "PZ", 1.0, "No", "x.pdf", date, "", 0, "Rossi")
+
+
+def test_archive_closed_years_moves_rows_to_year_files(temp_db):
+    rows = [
+        _dated_row("23/1", "valvola vecchia", "10/03/2023"),
+        _dated_row("24/1", "valvola", "10/03/2024"),
+        _dated_row("25/1", "valvola nuova", "10/03/2025"),
+        _dated_row("26/1", "guarnizione", "10/03/2026"),
+    ]
+    database.sync_rows(rows)
+    generation = database.get_generation()
+
+    moved = archive.archive_closed_years(today=datetime(2026, 5, 1))
+
+    assert moved == {2023: 1, 2024: 1}
+    assert (temp_db.parent / "database_RDA_2023.db").exists()
+    assert [r['rda_number'] for r in database.get_all_rows()] == ["26/1", "25/1"]
+    assert database.get_statistics()['total_rda'] == 2
+    assert database.get_generation() > generation
+
+    # Le righe archiviate ritornano dal registro ma non nel database principale
+    summary = database.sync_rows(rows)
+    assert summary['inserted'] == [] and summary['unchanged'] == 4 and summary['archived'] == 0
+    assert archive.archive_closed_years(today=datetime(2026, 5, 1)) == {}
+
+    found = database.search_rda({'text': "valvola", 'include_archive': True})
+    assert [r['rda_number'] for r in found] == ["25/1", "24/1", "23/1"]
+    assert [r['rda_number'] for r in database.search_rda({'text': "valvola"})] == ["25/1"]
+    limited = database.search_rda({'text': "valvola", 'include_archive': True, 'data_to': "31/12/2023"})
+    assert [r['rda_number'] for r in limited] == ["23/1"]
+    assert [r['rda_number'] for r in archive.iter_archived_rows()] == ["23/1", "24/1"]
+
+    conn = database.get_connection()
+    try:
+        assert archive.attach_archives(conn) == [2023, 2024]
+        cross_year = conn.execute("SELECT rda_number FROM rda_data_all ORDER BY data_rda_iso").fetchall()
+        assert [r[0] for r in cross_year] == ["23/1", "24/1", "25/1", "26/1"]
+    finally:
+        archive.detach_archives(conn)
+        conn.close()
+
+
+def test_sync_writes_archived_year_changes_to_archives(temp_db):
+    database.sync_rows([
+        _dated_row("23/1", "valvola", "10/03/2023"),
+        _dated_row("23/2", "flangia", "11/03/2023"),
+        _dated_row("24/1", "raccordo", "10/03/2024"),
+        _dated_row("26/1", "guarnizione", "10/03/2026"),
+    ])
+    archive.archive_closed_years(today=datetime(2026, 5, 1))
+    generation = database.get_generation()
+
+    # 23/1 modificata, 23/2 eliminata, 23/3 nuova; il 2024 non è più nel registro
+    summary = database.sync_rows([
+        _dated_row("23/1", "valvola a sfera", "10/03/2023"),
+        _dated_row("23/3", "manicotto", "12/03/2023"),
+        _dated_row("26/1", "guarnizione", "10/03/2026"),
+    ])
+
+    assert summary['archived'] == 3
+    assert summary['unchanged'] == 1
+    assert not (summary['inserted'] or summary['updated'] or summary['deleted'])
+    assert database.get_generation() > generation
+    assert [r['rda_number'] for r in database.get_all_rows()] == ["26/1"]
+    archived = {r['rda_number']: r['descrizione_materiale'] for r in archive.iter_archived_rows()}
+    assert archived == {"23/1": "valvola a sfera", "23/3": "manicotto", "24/1": "raccordo"}
+    found = database.search_rda({'text': "sfera", 'include_archive': True})
+    assert [r['rda_number'] for r in found] == ["23/1"]
+
+    conn = database.get_connection()
+    counts = dict(conn.execute("SELECT year, row_count FROM archive_year").fetchall())
+    conn.close()
+    assert counts == {2023: 2, 2024: 1}
+
+
+def test_aborted_replace_leaves_archives_unchanged(temp_db, monkeypatch):
+    monkeypatch.setattr(staging, "WRITE_BATCH_SIZE", 1)
+    monkeypatch.setattr(staging, "STAGING_COMMIT_ROWS", 1)
+    database.sync_rows([_dated_row("23/1", "valvola", "10/03/2023"), _dated_row("26/1", "A", "10/03/2026")])
+    archive.archive_closed_years(today=datetime(2026, 5, 1))
+
+    def rows():
+        yield _dated_row("23/1", "valvola a sfera", "10/03/2023")
+        yield _dated_row("26/1", "A", "10/03/2026")
+        other = sqlite3.connect(str(temp_db))
+        other.execute("UPDATE db_meta SET value = value + 1 WHERE key = 'generation'")
+        other.commit()
+        other.close()
+
+    with pytest.raises(RuntimeError):
+        staging.replace_all_data(rows())
+
+    assert [r['descrizione_materiale'] for r in archive.iter_archived_rows()] == ["valvola"]
+
+    staging.replace_all_data([_dated_row("23/1", "valvola a sfera", "10/03/2023"), _dated_row("26/1", "A", "10/03/2026")])
+    assert [r['descrizione_materiale'] for r in archive.iter_archived_rows()] == ["valvola a sfera"]
+
+
+def test_interrupted_archiving_is_resumed(temp_db):
+    database.sync_rows([_dated_row("23/1", "A", "10/03/2023"), _dated_row("23/2", "B", "11/03/2023")])
+
+    # Copia già confermata nell'archivio, righe ancora nel database principale
+    conn = database.get_connection()
+    conn.execute("ATTACH DATABASE ? AS archive", (archive.archive_path(2023),))
+    archive._create_archive_schema(conn.cursor())
+    conn.execute("INSERT INTO archive.rda_data SELECT * FROM main.rda_data WHERE rda_number = '23/1'")
+    conn.commit()
+    conn.execute("DETACH DATABASE archive")
+    conn.close()
+
+    assert archive.archive_closed_years(today=datetime(2026, 5, 1)) == {2023: 2}
+    assert database.get_all_rows() == []
+    assert sorted(r['rda_number'] for r in archive.iter_archived_rows()) == ["23/1", "23/2"]
@@ -0,0 +1,293 @@
+import re
+from datetime import datetime, timedelta
+
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.data.excel_manager import ExcelManager
+
+
+def _col_index(letters):
+    index = 0
+    for ch in letters:
+        index = index * 26 + (ord(ch) - ord('A') + 1)
+    return index
+
+
+class FakeRange:
+    def __init__(self, sheet, r1, c1, r2, c2):
+        self.sheet = sheet
+        self.bounds = (r1, c1, r2, c2)
+
+    def _cells(self):
+        r1, c1, r2, c2 = self.bounds
+        return [[(r, c) for c in range(c1, c2 + 1)] for r in range(r1, r2 + 1)]
+
+    @property
+    def Value(self):
+        self.sheet.com_calls += 1
+        rows = tuple(tuple(self.sheet.values.get(cell) for cell in row) for row in self._cells())
+        if len(rows) == 1 and len(rows[0]) == 1:
+            return rows[0][0]
+        return rows
+
+    @Value.setter
+    def Value(self, data):
+        self.sheet.com_calls += 1
+        self.sheet.writes.append(self.bounds)
+        if not isinstance(data, tuple):
+            data = ((data,),)
+        for row, values in zip(self._cells(), data):
+            for cell, value in zip(row, values):
+                self.sheet.values[cell] = value
+
+    @property
+    def Formula(self):
+        self.sheet.com_calls += 1
+        rows = tuple(
+            tuple(self.sheet.formulas.get(cell, self.sheet.values.get(cell) or "") for cell in row)
+            for row in self._cells()
+        )
+        if len(rows) == 1 and len(rows[0]) == 1:
+            return rows[0][0]
+        return rows
+
+    def Delete(self, Shift=None):
+        self.sheet.com_calls += 1
+        self.sheet.deletes.append(self.bounds)
+        r1, c1, r2, c2 = self.bounds
+        height = r2 - r1 + 1
+        shifted = {}
+        for (r, c), v in self.sheet.values.items():
+            if c1 <= c <= c2 and r >= r1:
+                if r > r2:
+                    shifted[(r - height, c)] = v
+            else:
+                shifted[(r, c)] = v
+        self.sheet.values = shifted
+        self.sheet.table_rows -= height
+
+    def End(self, direction):
+        self.sheet.com_calls += 1
+        _, col, _, _ = self.bounds
+        rows = [r for (r, c), v in self.sheet.values.items() if c == col and v is not None]
+        return type("EndCell", (), {"Row": max(rows, default=1)})()
+
+
+class FakeSheet:
+    """Foglio Excel simulato che conta le chiamate COM."""
+
+    def __init__(self, rows):
+        self.values = {}
+        self.formulas = {}
+        self.com_calls = 0
+        self.writes = []
+        self.deletes = []
+        self.table_rows = len(rows)
+        self.Rows = type("Rows", (), {"Count": 1048576})()
+        self.ListObjects = FakeListObjects(self)
+        for r, row in enumerate(rows, start=2):
+            for c, value in enumerate(row, start=1):
+                self.values[(r, c)] = value
+
+    def Range(self, address, end=None):
+        self.com_calls += 1
+        if end is not None:
+            r1, c1, _, _ = address.bounds
+            _, _, r2, c2 = end.bounds
+            return FakeRange(self, r1, c1, r2, c2)
+        m = re.fullmatch(r"([A-Z]+)(\d+)(?::([A-Z]+)(\d+))?", address)
+        c1, r1 = _col_index(m.group(1)), int(m.group(2))
+        c2, r2 = (_col_index(m.group(3)), int(m.group(4))) if m.group(3) else (c1, r1)
+        return FakeRange(self, r1, c1, r2, c2)
+
+    def Cells(self, row, col):
+        self.com_calls += 1
+        if isinstance(col, str):
+            col = _col_index(col)
+        return FakeRange(self, row, col, row, col)
+
+
+class FakeListObjects:
+    """Tabella Excel (ListObject) con intestazione in riga 1 e 12 colonne."""
+
+    def __init__(self, sheet):
+        self.sheet = sheet
+        self.Count = 1
+
+    def __call__(self, name):
+        self.sheet.com_calls += 1
+        return self
+
+    @property
+    def ListRows(self):
+        sheet = self.sheet
+
+        class _ListRows:
+            Count = sheet.table_rows
+
+            def __call__(self, index):
+                sheet.com_calls += 1
+                row = type("ListRow", (), {})()
+                row.Range = FakeRange(sheet, index + 1, 1, index + 1, 12)
+                return row
+
+        return _ListRows()
+
+    @property
+    def DataBodyRange(self):
+        return FakeRange(self.sheet, 2, 1, self.sheet.table_rows + 1, 12)
+
+
+def _make_row(rda, rda_date, delivery=None, alert=0):
+    return [rda, 5400082055.0, "GEN", "FLESSIBILE", "PZ", 1.0, "No",
+            "Apri PDF", rda_date, delivery, alert, "Mario Rossi"]
+
+
+@pytest.fixture
+def today():
+    return datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _open_manager(sheet):
+    mgr = ExcelManager()
+    mgr.sheet = sheet
+    mgr._is_open = True
+    return mgr
+
+
+def test_update_alerts_is_constant_in_com_calls(today):
+    def run(n_rows):
+        rows = [_make_row(f"25/{i:05d}", today - timedelta(days=30)) for i in range(n_rows)]
+        sheet = FakeSheet(rows)
+        overdue = _open_manager(sheet).update_alerts_and_get_overdue()
+        return sheet, overdue
+
+    small_sheet, small_overdue = run(5)
+    large_sheet, large_overdue = run(2000)
+
+    assert len(small_overdue) == 5
+    assert len(large_overdue) == 2000
+    assert small_sheet.com_calls == large_sheet.com_calls
+    assert len(large_sheet.writes) == 1
+
+
+def test_update_alerts_values_and_overdue(today):
+    rows = [
+        _make_row("25/00001", today - timedelta(days=3)),                       # nessun alert
+        _make_row("25/00002", today - timedelta(days=15)),                      # 2 settimane, aperta
+        _make_row("25/00003", today - timedelta(days=22), today - timedelta(days=1)),  # consegnata
+        _make_row("25/00004", None, alert=7),                                   # senza data
+    ]
+    sheet = FakeSheet(rows)
+
+    overdue = _open_manager(sheet).update_alerts_and_get_overdue()
+
+    assert [sheet.values[(r, 11)] for r in range(2, 6)] == [0, 2, 3, 7]
+    assert [item["N°RDA"] for item in overdue] == ["25/00002"]
+    assert overdue[0]["richiesta da: (giorni)"] == 15
+    assert overdue[0]["Richiedente"] == "Mario Rossi"
+
+
+def test_rda_index_lookup_without_com_calls(today):
+    rows = [_make_row(" 25/00001 ", today), _make_row("25/00002", today)]
+    sheet = FakeSheet(rows)
+    mgr = _open_manager(sheet)
+    mgr._build_rda_index()
+
+    calls_after_build = sheet.com_calls
+    assert mgr.check_if_exists("25/00001")
+    assert mgr.check_if_exists("25/00002 ")
+    assert not mgr.check_if_exists("25/00003")
+    assert sheet.com_calls == calls_after_build
+
+    mgr.append_data({
+        'rda_number_raw': "25/00003",
+        'table': [["1", "C1", "D1", "MAT", "PZ", "2", "", "No", ""]],
+        'pdf_final_path': "x.pdf",
+        'rda_date_obj': today,
+        'requester': "Mario Rossi",
+    })
+    assert mgr.check_if_exists("25/00003")
+    assert "25/00003" in mgr.known_rda_numbers
+
+
+def test_check_if_exists_fail_safe_without_index():
+    mgr = ExcelManager()
+    assert mgr.check_if_exists("25/00001")
+
+
+def test_delete_empty_rows_removes_runs_in_bulk(today):
+    empty = [None] * 12
+    rows = [
+        _make_row("25/00001", today),
+        empty, empty, empty,
+        _make_row("25/00002", today),
+        empty,
+        _make_row("25/00003", today),
+        empty, empty,
+    ]
+    sheet = FakeSheet(rows)
+
+    _open_manager(sheet).delete_empty_rows()
+
+    # Un Delete per blocco contiguo, eseguiti dal basso verso l'alto
+    assert sheet.deletes == [(9, 1, 10, 12), (7, 1, 7, 12), (3, 1, 5, 12)]
+    assert sheet.table_rows == 3
+    assert [sheet.values[(r, 1)] for r in range(2, 5)] == ["25/00001", "25/00002", "25/00003"]
+
+
+def test_delete_empty_rows_keeps_full_table(today):
+    sheet = FakeSheet([_make_row("25/00001", today), _make_row("25/00002", today)])
+
+    _open_manager(sheet).delete_empty_rows()
+
+    assert sheet.deletes == []
+    assert sheet.table_rows == 2
+
+
+def test_iter_sync_blocks_reads_fixed_size_blocks(today):
+    rows = [_make_row(f"25/{i:05d}", today) for i in range(7)]
+    rows[3] = [None] * 12
+    sheet = FakeSheet(rows)
+    mgr = _open_manager(sheet)
+
+    blocks = list(mgr.iter_sync_blocks(block_size=3))
+
+    assert [len(block) for block in blocks] == [3, 2, 1]
+    assert [row for block in blocks for row in block] == mgr.get_all_data_for_sync()
+    assert blocks[2][0][0] == "25/00006"
+
+
+def test_quiet_run_writes_and_saves_nothing(today):
+    rows = [_make_row("25/00001", today - timedelta(days=15), alert=2),
+            _make_row("25/00002", today, alert=0)]
+    sheet = FakeSheet(rows)
+    sheet.Columns = MagicMock()
+    mgr = _open_manager(sheet)
+    workbook = mgr.workbook = MagicMock()
+
+    mgr.update_alerts_and_get_overdue()
+    mgr.delete_empty_rows()
+    mgr.fit_columns()
+    mgr.close(save=True)
+
+    assert sheet.writes == []
+    sheet.Columns.AutoFit.assert_not_called()
+    workbook.Close.assert_called_once_with(SaveChanges=False)
+
+
+def test_only_changed_alerts_are_written(today):
+    rows = [_make_row(f"25/{i:05d}", today - timedelta(days=15), alert=2) for i in range(10)]
+    rows[6][10] = 1  # alert non aggiornato
+    sheet = FakeSheet(rows)
+    mgr = _open_manager(sheet)
+    workbook = mgr.workbook = MagicMock()
+
+    mgr.update_alerts_and_get_overdue()
+    mgr.close(save=True)
+
+    assert sheet.writes == [(8, 11, 8, 11)]
+    assert sheet.values[(8, 11)] == 2
+    workbook.Close.assert_called_once_with(SaveChanges=True)
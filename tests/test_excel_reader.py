@@ -0,0 +1,98 @@
+from datetime import datetime, timezone
+
+import openpyxl
+
+from src.data.excel_manager import ExcelManager
+from src.data.excel_reader import ExcelReader, open_register_for_read
+from tests.test_excel_manager import FakeSheet
+
+HEADER = ["N° RDA", "Commessa", "Articolo", "Descrizione Materiale", "UM", "Quantita Richiesta",
+          "APF", "Riferimento PDF", "Data RDA", "Data di Consegna", "N° Alert", "Richiedente"]
+
+ROWS = [
+    ["19/02053", 5400082055, "GEN", "FLESSIBILE", "PZ", 1, "No",
+     '=HYPERLINK("\\\\srv\\RDA_PDF\\RDA_19-02053_16-12-19.pdf", "Apri PDF")',
+     datetime(2019, 12, 15, 23, 0), datetime(2019, 12, 30), 312, "Di Grande Domenico"],
+    ["25/00002", "C-12", None, "RACCORDO", None, 2.5, "Si",
+     '=HYPERLINK("C:\\RDA_PDF\\RDA_25-00002_02-01-25.pdf", "Apri PDF")',
+     datetime(2025, 1, 2), "da definire", 0, None],
+    [None] * 12,
+    ["25/00005", None, None, "VITE", "PZ", 10, None, None, datetime(2025, 1, 2), None, 1, "Rossi"],
+    [None, None, None, "riga oltre l'ultima RDA", None, None, None, None, None, None, None, None],
+]
+
+
+def _write_workbook(path, rows=ROWS):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(HEADER)
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+
+
+def _com_value(value):
+    """Valore come restituito da pywin32 (numeri float, date con tzinfo UTC)."""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=timezone.utc)
+    if isinstance(value, str) and value.startswith("="):
+        return "Apri PDF"
+    return value
+
+
+def test_reader_matches_com_tuples(tmp_path):
+    path = tmp_path / "database_RDA.xlsx"
+    _write_workbook(path)
+
+    sheet = FakeSheet([[_com_value(v) for v in row] for row in ROWS])
+    for r, row in enumerate(ROWS, start=2):
+        if isinstance(row[7], str):
+            sheet.formulas[(r, 8)] = row[7]
+    excel_mgr = ExcelManager()
+    excel_mgr.sheet = sheet
+    excel_mgr._is_open = True
+
+    reader = ExcelReader(str(path))
+    assert reader.open()
+    try:
+        rows = reader.get_all_data_for_sync()
+    finally:
+        reader.close()
+
+    assert rows == excel_mgr.get_all_data_for_sync()
+    assert len(rows) == 3
+    assert rows[0][1] == "5400082055.0"
+    assert rows[0][7] == "\\\\srv\\RDA_PDF\\RDA_19-02053_16-12-19.pdf"
+    assert rows[1][9] == "da definire"
+
+
+def test_reader_index_and_factory(tmp_path):
+    path = tmp_path / "database_RDA.xlsx"
+    _write_workbook(path)
+
+    reader = open_register_for_read(str(path))
+    assert isinstance(reader, ExcelReader)
+    assert reader.check_if_exists("25/00005")
+    assert not reader.check_if_exists("25/99999")
+    reader.close()
+    assert reader.check_if_exists("25/99999")  # Fail safe a file chiuso
+
+
+def test_reader_blocks_match_full_read(tmp_path):
+    path = tmp_path / "database_RDA.xlsx"
+    _write_workbook(path)
+
+    reader = ExcelReader(str(path))
+    assert reader.open()
+    try:
+        blocks = list(reader.iter_sync_blocks(block_size=2))
+        rows = reader.get_all_data_for_sync()
+    finally:
+        reader.close()
+
+    assert [len(block) for block in blocks] == [2, 1]
+    assert [row for block in blocks for row in block] == rows
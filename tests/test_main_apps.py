@@ -8,30 +8,74 @@ from src import main_gui
 from src import main_bot
 
 class TestMainGui:
-    def test_database_manager(self, tmp_path):
-        db_path = tmp_path / "test.db"
+    def test_database_manager(self, temp_db):
+        from src.data import database
 
-        # Test Init
-        db = main_gui.DatabaseManager(str(db_path))
-
-        # Test Connection (creates DB)
-        conn = db.get_connection()
-        cursor = conn.cursor()
+        # Schema reale creato da init_db (testate, indice di ricerca)
+        database.sync_rows([
+            ('RDA001', 'C001', 'GEN', 'Item1', 'KG', 10, 'A1', 'path.pdf', '01/01/2023', '01/02/2023', 1, 'User1'),
+            ('RDA001', 'C001', 'GEN', 'Item2', 'KG', 5, 'A1', 'path.pdf', '01/01/2023', '', 1, 'User1'),
+        ])
 
-        # Create table for testing
-        cursor.execute("CREATE TABLE rda_data (rda_number text, commessa text, descrizione_materiale text, unita_misura text, quantita real, apf text, data_rda text, data_consegna text, alert_level int, richiedente text, pdf_path text)")
-        cursor.execute("INSERT INTO rda_data VALUES ('RDA001', 'C001', 'Item1', 'KG', 10, 'A1', '01/01/2023', '01/02/2023', 0, 'User1', 'path.pdf')")
-        conn.commit()
-        conn.close()
+        # Test Init
+        db = main_gui.DatabaseManager(str(temp_db))
 
         # Test Fetch
         rows = db.fetch_all_data()
-        assert len(rows) == 1
+        assert len(rows) == 2
         assert rows[0]['rda_number'] == 'RDA001'
 
+        # Test Search (indice FTS e LIKE per i testi corti)
+        assert [r['descrizione_materiale'] for r in db.search("item2")] == ['Item2']
+        assert len(db.search("A1")) == 2
+        assert db.search("nothing") == []
+
         # Test Stats
         stats = db.get_statistics()
         assert stats['total_rda'] == 1
+        assert stats['total_rows'] == 2
+        assert stats['overdue_rda'] == 1
+        assert [tuple(r) for r in stats['by_requester']] == [('User1', 1)]
+        assert [tuple(r) for r in stats['by_month']] == [('01/2023', 1)]
+
+        # Test Overdue (alert calcolato dalla data, riga consegnata esclusa)
+        overdue = db.fetch_overdue()
+        assert [r['descrizione_materiale'] for r in overdue] == ['Item2']
+        assert overdue[0]['alert_level'] == overdue[0]['days_elapsed'] // 7
+        assert rows[0]['alert_level'] == overdue[0]['alert_level']
+
+        # Aggiornamento incrementale dal registro delle modifiche
+        generation = database.get_generation()
+        database.sync_rows([
+            ('RDA001', 'C001', 'GEN', 'Item1', 'KG', 12, 'A1', 'path.pdf', '01/01/2023', '01/02/2023', 1, 'User1'),
+            ('RDA002', 'C002', 'GEN', 'Item3', 'PZ', 1, 'A2', 'path.pdf', '05/01/2023', '', 1, 'User2'),
+        ])
+        _, changes = database.changes_since(generation)
+        patched = db.apply_changes(rows, changes)
+        assert [tuple(r) for r in patched] == [tuple(r) for r in db.fetch_all_data()]
+        assert sorted(r['quantita'] for r in patched) == [1, 12]
+
+    def test_search_is_debounced_and_keeps_latest_results(self):
+        app = main_gui.RDAViewerApp.__new__(main_gui.RDAViewerApp)
+        app.root = MagicMock()
+        app.root.after.side_effect = ["job1", "job2"]
+        app._search_job = None
+        app._search_seq = 0
+        app._refresh_table = MagicMock()
+        app.results_label = MagicMock()
+
+        # Due tasti ravvicinati: la prima ricerca programmata viene annullata
+        app._on_search()
+        app._on_search()
+        app.root.after_cancel.assert_called_once_with("job1")
+        assert app._search_job == "job2"
+
+        # Risultati di una ricerca superata da una più recente: ignorati
+        app._search_seq = 2
+        app._show_search_results(1, ["vecchio"])
+        app._refresh_table.assert_not_called()
+        app._show_search_results(2, ["nuovo"])
+        app._refresh_table.assert_called_once_with(["nuovo"])
 
     def test_formatting_utils(self):
         assert main_gui.format_number(10.0) == "10"
@@ -44,9 +88,10 @@ class TestMainBot:
         # Mock ExcelManager
         mock_excel = MagicMock()
         mock_excel.check_if_exists.return_value = False
+        mock_excel.known_rda_numbers = {"RDA001"}
 
         # Mock PDF extraction
-        mocker.patch("src.main_bot.extract_rda_data", return_value={
+        mock_extract = mocker.patch("src.main_bot.extract_rda_data", return_value={
             'rda_number_raw': 'RDA999',
             'rda_date_str': '2023-01-01'
         })
@@ -64,6 +109,7 @@ class TestMainBot:
         cb("temp.pdf")
 
         # Verify calls
+        mock_extract.assert_called_once_with("temp.pdf", known_rda_numbers={"RDA001"})
         mock_excel.check_if_exists.assert_called_with('RDA999')
         mock_excel.append_data.assert_called_once()
         args, _ = mock_excel.append_data.call_args
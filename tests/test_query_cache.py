@@ -0,0 +1,87 @@
+import sqlite3
+import threading
+
+from src.data import database
+from src.data.query_cache import QueryCache
+
+
+def _row(rda, desc):
+    return (rda, "C1", "GEN", desc, "PZ", 1.0, "No", "x.pdf", "02/01/2025", "", 0, "Rossi")
+
+
+def test_repeated_reads_hit_the_cache(temp_db):
+    database.sync_rows([_row("25/1", "A")])
+    cache = QueryCache()
+    conn = database.get_connection()
+
+    first = cache.fetchall(conn, "SELECT rda_number FROM rda_data WHERE rda_number = ?", ("25/1",))
+    second = cache.fetchall(conn, "SELECT rda_number FROM rda_data WHERE rda_number = ?", ("25/1",))
+    conn.close()
+
+    assert [tuple(r) for r in second] == [tuple(r) for r in first] == [("25/1",)]
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+    assert cache.stats()['hit_rate'] == 0.5
+
+
+def test_reads_from_new_threads_hit_the_cache(temp_db):
+    database.sync_rows([_row("25/1", "A")])
+    cache = QueryCache()
+    results = []
+
+    def read():
+        # Ogni thread ha una nuova connessione del pool
+        conn = database.get_connection()
+        results.append(cache.fetchall(conn, "SELECT rda_number FROM rda_data"))
+        conn.close()
+
+    for _ in range(5):
+        thread = threading.Thread(target=read)
+        thread.start()
+        thread.join()
+
+    assert [[tuple(r) for r in rows] for rows in results] == [[("25/1",)]] * 5
+    assert cache.stats()['hits'] == 4
+    assert cache.stats()['invalidations'] == 0
+
+    # Una sincronizzazione vista da un nuovo thread svuota comunque la cache
+    database.sync_rows([_row("25/1", "A"), _row("25/2", "B")])
+    read()
+    assert len(results[-1]) == 2
+
+
+def test_sync_generation_invalidates(temp_db):
+    database.sync_rows([_row("25/1", "A")])
+    assert len(database.get_all_rows()) == 1
+
+    # Scrittura sulla stessa connessione: data_version non cambia, la generazione sì
+    database.sync_rows([_row("25/1", "A"), _row("25/2", "B")])
+
+    assert len(database.get_all_rows()) == 2
+
+
+def test_foreign_commit_invalidates(temp_db):
+    database.sync_rows([_row("25/1", "A")])
+    assert database.get_all_rows()[0]['descrizione_materiale'] == "A"
+
+    # Scrittura di un'altra connessione che non incrementa la generazione
+    other = sqlite3.connect(str(temp_db))
+    other.execute("UPDATE rda_data SET descrizione_materiale = 'Z'")
+    other.commit()
+    other.close()
+
+    assert database.get_all_rows()[0]['descrizione_materiale'] == "Z"
+
+
+def test_lru_eviction_by_size(temp_db):
+    cache = QueryCache(max_bytes=2000)
+    conn = database.get_connection()
+
+    for n in range(10):
+        cache.fetchall(conn, "SELECT ? || zeroblob(0)", ("x" * 300 + str(n),))
+    stats = cache.stats()
+    conn.close()
+
+    assert stats['evictions'] > 0
+    assert stats['bytes'] <= 2000
+    assert 0 < stats['entries'] < 10
@@ -0,0 +1,42 @@
+import pytest
+
+from src.data import register_cache, sync
+from src.utils.utils import file_fingerprint
+from tests.test_excel_reader import _write_workbook
+
+
+def test_snapshot_is_reused_while_fingerprint_matches(tmp_path, mocker):
+    path = str(tmp_path / "database_RDA.xlsx")
+    _write_workbook(path)
+    copy_spy = mocker.spy(register_cache, "_copy_file")
+
+    local_path, fingerprint = register_cache.snapshot_register(path, file_fingerprint(path))
+    again, _ = register_cache.snapshot_register(path, file_fingerprint(path))
+
+    assert local_path == again
+    assert local_path.startswith(register_cache.REGISTER_CACHE_DIR)
+    assert fingerprint == file_fingerprint(path)
+    assert copy_spy.call_count == 1
+
+
+def test_snapshot_falls_back_to_cached_copy_when_locked(tmp_path, mocker):
+    path = str(tmp_path / "database_RDA.xlsx")
+    _write_workbook(path)
+    local_path, fingerprint = register_cache.snapshot_register(path, file_fingerprint(path))
+
+    mocker.patch.object(register_cache, "_copy_file", side_effect=PermissionError("file bloccato"))
+
+    assert register_cache.snapshot_register(path) == (local_path, fingerprint)
+    with pytest.raises(PermissionError):
+        register_cache.snapshot_register(str(tmp_path / "altro.xlsx"))
+
+
+def test_sync_reads_local_copy(temp_db, tmp_path, mocker):
+    path = str(tmp_path / "database_RDA.xlsx")
+    _write_workbook(path)
+    open_spy = mocker.spy(sync, "open_register_for_read")
+
+    result = sync.sync_register(path)
+
+    assert result['rows'] == 3
+    assert open_spy.call_args[0][0].startswith(register_cache.REGISTER_CACHE_DIR)
@@ -0,0 +1,104 @@
+import os
+import sqlite3
+
+import pytest
+
+from src import main_gui
+from src.data import database
+from src.data.connections import close_path
+from src.data.replica import DatabaseReplica
+
+
+def _row(rda, desc):
+    return (rda, "C1", "GEN", desc, "PZ", 1.0, "No", "x.pdf", "02/01/2025", "", 0, "Rossi")
+
+
+def _count(conn):
+    return conn.execute("SELECT COUNT(*) FROM rda_data").fetchone()[0]
+
+
+def test_replica_is_copied_only_when_version_changes(temp_db, tmp_path):
+    database.sync_rows([_row("25/1", "A")])
+    replica = DatabaseReplica(str(temp_db), str(tmp_path / "Replica"))
+
+    assert not replica.open_existing()
+    assert replica.refresh()
+    assert not replica.refresh()
+    assert replica.generation == database.get_generation()
+
+    conn = replica.connect()
+    assert _count(conn) == 1
+    with pytest.raises(sqlite3.OperationalError):
+        conn.execute("DELETE FROM rda_data")
+
+    # Le scritture sul database condiviso arrivano alla copia solo con refresh
+    database.sync_rows([_row("25/1", "A"), _row("25/2", "B")])
+    assert _count(replica.connect()) == 1
+    assert replica.refresh()
+    assert _count(replica.connect()) == 2
+
+    database.sync_rows([_row("25/3", "C")])
+    replica.refresh()
+    files = sorted(p.name for p in (tmp_path / "Replica").iterdir())
+    assert len(files) == 2  # Copia in uso e precedente
+    replica.close()
+
+    # All'avvio successivo la copia più recente si apre senza il database condiviso
+    restarted = DatabaseReplica(str(temp_db), str(tmp_path / "Replica"))
+    restarted.source = str(tmp_path / "non_raggiungibile.db")
+    assert restarted.open_existing()
+    assert restarted.generation == database.get_generation()
+    assert [r[0] for r in restarted.connect().execute("SELECT rda_number FROM rda_data")] == ["25/3"]
+    restarted.close()
+
+
+def test_replica_follows_recreated_source(temp_db, tmp_path):
+    database.sync_rows([_row("25/1", "A")])
+    replica = DatabaseReplica(str(temp_db), str(tmp_path / "Replica"))
+    replica.refresh()
+    generation = replica.generation
+
+    # Database condiviso ricreato: stessa generazione, contenuto diverso
+    close_path(str(temp_db))
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(f"{temp_db}{suffix}"):
+            os.remove(f"{temp_db}{suffix}")
+    database.init_db()
+    database.sync_rows([_row("25/9", "Z")])
+    assert database.get_generation() == generation
+
+    assert replica.refresh()
+    assert [r[0] for r in replica.connect().execute("SELECT rda_number FROM rda_data")] == ["25/9"]
+
+    # Una migrazione (nuova struttura) cambia la versione anche senza nuove righe
+    conn = database.get_connection()
+    conn.execute("DROP INDEX idx_alert_level")
+    conn.commit()
+    conn.close()
+    generation = database.get_generation()
+    database.init_db()
+    assert database.get_generation() > generation
+    assert replica.refresh()
+    assert not replica.refresh()
+    replica.close()
+
+
+def test_gui_reads_from_in_memory_replica(temp_db, tmp_path):
+    database.sync_rows([_row("25/1", "Valvola")])
+    replica = DatabaseReplica(str(temp_db), str(tmp_path / "Replica"), in_memory=True)
+    replica.refresh()
+    db = main_gui.DatabaseManager(str(temp_db), replica)
+
+    rows = db.fetch_all_data()
+    generation = db.get_generation()
+    assert [r['rda_number'] for r in rows] == ["25/1"]
+    assert [r['rda_number'] for r in db.search("valvola")] == ["25/1"]
+
+    database.sync_rows([_row("25/1", "Valvola"), _row("25/2", "Flangia")])
+    assert db.get_generation() == generation
+    replica.refresh()
+
+    current, changes = db.changes_since(generation)
+    assert current == db.get_generation() == database.get_generation()
+    assert [r['rda_number'] for r in db.apply_changes(rows, changes)] == ["25/1", "25/2"]
+    replica.close()
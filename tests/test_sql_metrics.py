@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from src.data import database, pagination, sql_metrics
+
+
+def _row(rda, desc):
+    return (rda, "C1", "GEN", desc, "PZ", 1.0, "No", "x.pdf", "02/01/2025", "", 0, "Rossi")
+
+
+@pytest.fixture
+def metrics(tmp_path):
+    active = sql_metrics.enable(slow_ms=10 ** 6, slow_log=str(tmp_path / "slow.log"))
+    yield active
+    sql_metrics.disable()
+
+
+def test_normalize_sql_groups_literal_values():
+    first = sql_metrics.normalize_sql("SELECT *  FROM rda_data\n WHERE rda_number = '25/1' AND id IN (?, ?, ?)")
+    second = sql_metrics.normalize_sql("SELECT * FROM rda_data WHERE rda_number = 'x''y' AND id IN (?, ?)")
+
+    assert first == second == "SELECT * FROM rda_data WHERE rda_number = ? AND id IN (?, ...)"
+    assert sql_metrics.normalize_sql("SELECT 1 FROM idx_g12 LIMIT 10") == "SELECT ? FROM idx_g12 LIMIT ?"
+
+
+def test_timings_slow_log_and_export(temp_db, tmp_path, metrics):
+    metrics.slow_ms = 0
+    database.sync_rows([_row("25/1", "A"), _row("25/2", "B")])
+    for rda in ("25/1", "25/2"):
+        database.search_rda({'rda_number': rda})
+
+    stats = metrics.snapshot()
+    search = [s for s in stats if s['statement'].startswith("SELECT rda_data.* FROM rda_data JOIN rda_fts")]
+    assert len(search) == 1 and search[0]['count'] == 2
+    search = search[0]
+    assert 0 <= search['p95_ms'] <= search['max_ms'] <= search['total_ms']
+
+    # Il log delle query lente riporta i valori dei parametri
+    slow_log = (tmp_path / "slow.log").read_text(encoding="utf-8")
+    assert "MATCH 'rda_number : \"25/2\"'" in slow_log
+
+    metrics.export(str(tmp_path / "metrics.json"))
+    exported = json.loads((tmp_path / "metrics.json").read_text(encoding="utf-8"))
+    assert len(exported['statements']) == len(stats)
+
+
+def test_core_queries_do_not_scan_whole_tables(temp_db, metrics):
+    database.sync_rows([_row("25/1", "Valvola"), _row("25/2", "Flangia")])
+    database.sync_rows([_row("25/1", "Valvola"), _row("25/3", "Flangia")], site="Priolo")
+    database.update_rows([(1, _row("25/1", "Valvola a sfera"))])
+    database.get_all_rows()
+    database.search_rda({'text': "valv", 'data_from': "01/01/2025", 'only_overdue': True})
+    database.search_rda({'rda_number': "25", 'site': "Priolo"})
+    database.get_statistics()
+    database.get_overdue_items()
+    for sort in pagination.PAGE_SORTS:
+        list(pagination.iter_query(sort=sort, page_size=1))
+    pagination.count_rows({'text': "flangia"})
+
+    conn = database.get_connection()
+    scans = {
+        " ".join(sql.split()): sql_metrics.full_scans(conn, sql)
+        for sql in metrics.statements()
+        if sql.lstrip().upper().startswith(("SELECT", "WITH", "UPDATE", "DELETE"))
+        # Il file di appoggio di sync_rows è già scollegato (e letto per intero)
+        and "staging." not in sql
+    }
+    conn.close()
+
+    # Prima pagina in ordine di registro: lettura per chiave primaria fino a LIMIT
+    allowed = ("ORDER BY rda_data.id ASC LIMIT ?",)
+    assert len(scans) > 20
+    assert {sql: tables for sql, tables in scans.items() if tables and not sql.endswith(allowed)} == {}
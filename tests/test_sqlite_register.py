@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta
+
+import openpyxl
+
+from src.data import archive, database
+from src.data.excel_export import export_register
+from src.data.excel_reader import ExcelReader
+from src.data.sqlite_register import SqliteRegister
+
+
+def _rda_data(number, rda_date, n_lines=1):
+    return {
+        'rda_number_raw': number,
+        'table': [[str(i + 1), "C-12", "GEN", f"MATERIALE {i}", "PZ", "2", "", "No", ""]
+                  for i in range(n_lines)],
+        'pdf_final_path': f"C:\\RDA_PDF\\RDA_{number.replace('/', '-')}.pdf",
+        'rda_date_obj': rda_date,
+        'requester': "Mario Rossi",
+    }
+
+
+def test_register_appends_and_updates_alerts(temp_db):
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    register = SqliteRegister()
+    assert register.open()
+
+    register.append_data(_rda_data("25/00001", today - timedelta(days=15), n_lines=2))
+    register.append_data(_rda_data("25/00002", today))
+    assert register.check_if_exists("25/00001 ")
+    assert not register.check_if_exists("25/00003")
+
+    overdue = register.update_alerts_and_get_overdue()
+    assert register.is_dirty
+    register.close()
+
+    rows = {row['row_key']: row for row in database.get_all_rows()}
+    assert set(rows) == {"25/00001#1", "25/00001#2", "25/00002#1"}
+    conn = database.get_connection()
+    levels = dict(conn.execute("SELECT id, alert_level FROM rda_alert").fetchall())
+    conn.close()
+    assert levels[rows["25/00001#1"]['id']] == 2
+    assert levels[rows["25/00002#1"]['id']] == 0
+    assert rows["25/00001#1"]['pdf_path'] == "C:\\RDA_PDF\\RDA_25-00001.pdf"
+    assert [item["N°RDA"] for item in overdue] == ["25/00001", "25/00001"]
+
+    # Una nuova sessione senza modifiche non scrive nulla
+    generation = database.get_generation()
+    assert register.open()
+    register.update_alerts_and_get_overdue()
+    assert not register.is_dirty
+    assert database.get_generation() == generation
+
+
+def test_register_appends_rows_to_its_site(temp_db):
+    register = SqliteRegister(site="Priolo")
+    register.open()
+    register.append_data(_rda_data("25/00001", datetime(2025, 1, 2)))
+    register.close()
+
+    assert [row['site'] for row in database.get_all_rows()] == ["Priolo"]
+
+    # Una sincronizzazione di un'altra sede non elimina le righe aggiunte
+    database.sync_rows([
+        ("25/00009", "C1", "GEN", "A", "PZ", 1.0, "No", "x.pdf", "02/01/2025", "", 0, "Rossi")
+    ], site="Ravenna")
+    assert sorted(row['site'] for row in database.get_all_rows()) == ["Priolo", "Ravenna"]
+
+
+def test_register_detects_rda_moved_to_archive(temp_db):
+    register = SqliteRegister()
+    register.open()
+    register.append_data(_rda_data("23/00001", datetime(2023, 3, 10)))
+    register.close()
+    assert archive.archive_closed_years(today=datetime(2026, 5, 1)) == {2023: 1}
+
+    assert register.open()
+    assert register.check_if_exists("23/00001")
+    register.close()
+
+
+def test_export_round_trips_through_reader(temp_db, tmp_path):
+    register = SqliteRegister()
+    register.open()
+    register.append_data(_rda_data("25/00001", datetime(2025, 1, 2), n_lines=3))
+    register.close()
+
+    path = str(tmp_path / "database_RDA.xlsx")
+    assert export_register(path) == 3
+
+    wb = openpyxl.load_workbook(path)
+    ws = wb.active
+    assert list(ws.tables) == ["Tabella1"]
+    assert ws.tables["Tabella1"].ref == "A1:L4"
+    assert ws.protection.sheet
+    wb.close()
+
+    reader = ExcelReader(path)
+    assert reader.open()
+    try:
+        exported = reader.get_all_data_for_sync()
+    finally:
+        reader.close()
+    # Colonna K: alert calcolato alla data dell'export
+    level = (datetime.now() - datetime(2025, 1, 2)).days // 7
+    assert exported == [row[:10] + (level,) + row[11:] for _, row in database.iter_data_rows()]
+
+
+def test_export_keeps_numeric_looking_text(temp_db, tmp_path):
+    rda_data = _rda_data("25/00001", datetime(2025, 1, 2))
+    rda_data['table'][0][1] = "0042"
+    rda_data['table'][0][3] = "1234"
+    register = SqliteRegister()
+    register.open()
+    register.append_data(rda_data)
+    register.close()
+
+    path = str(tmp_path / "database_RDA.xlsx")
+    export_register(path)
+
+    wb = openpyxl.load_workbook(path)
+    row = [cell.value for cell in wb.active[2]]
+    wb.close()
+    assert row[1:4] == ["0042", "GEN", "1234"]
+    assert row[5] == 2
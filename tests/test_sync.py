@@ -0,0 +1,84 @@
+import os
+
+import pytest
+
+from src.data import database, sync
+from tests.test_excel_reader import ROWS, _write_workbook
+
+
+def test_sync_skips_unchanged_register(temp_db, tmp_path, mocker):
+    path = str(tmp_path / "database_RDA.xlsx")
+    _write_workbook(path)
+    open_spy = mocker.spy(sync, "open_register_for_read")
+
+    first = sync.sync_register(path)
+    second = sync.sync_register(path)
+
+    assert first['rows'] == 3 and not first['skipped']
+    assert len(first['changes']['inserted']) == 3
+    assert second == {'skipped': True, 'rows': 0, 'changes': None}
+    assert open_spy.call_count == 1
+    assert len(database.get_all_rows()) == 3
+
+
+def test_sync_force_and_modified_register(temp_db, tmp_path):
+    path = str(tmp_path / "database_RDA.xlsx")
+    _write_workbook(path)
+    sync.sync_register(path)
+
+    assert not sync.sync_register(path, force=True)['skipped']
+
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+    changed, _ = sync.check_register_changed(path)
+    assert changed
+
+
+def test_sync_all_registers_keeps_sites_apart(temp_db, tmp_path):
+    registers = [
+        {"site": "Priolo", "path": str(tmp_path / "priolo.xlsx")},
+        {"site": "Ravenna", "path": str(tmp_path / "ravenna.xlsx")},
+    ]
+    for register in registers:
+        _write_workbook(register["path"])
+
+    first = sync.sync_all_registers(registers=registers)
+
+    assert {site: result['rows'] for site, result in first.items()} == {"Priolo": 3, "Ravenna": 3}
+    rows = database.get_all_rows()
+    assert sorted(row['site'] for row in rows) == ["Priolo"] * 3 + ["Ravenna"] * 3
+
+    # Solo la sede modificata viene riletta, le righe delle altre restano
+    _write_workbook(registers[1]["path"], rows=ROWS[:1])
+    second = sync.sync_all_registers(registers=registers)
+
+    assert second["Priolo"]['skipped']
+    assert len(second["Ravenna"]['changes']['deleted']) == 2
+    assert len(database.get_all_rows()) == 4
+
+
+def test_sync_all_registers_reports_unreadable_register(temp_db, tmp_path):
+    path = str(tmp_path / "priolo.xlsx")
+    _write_workbook(path)
+    registers = [
+        {"site": "Priolo", "path": path},
+        {"site": "Gela", "path": str(tmp_path / "mancante.xlsx")},
+    ]
+
+    results = sync.sync_all_registers(registers=registers)
+
+    assert results["Priolo"]['rows'] == 3
+    assert 'error' in results["Gela"]
+
+
+def test_sync_all_registers_rejects_repeated_sites(temp_db, tmp_path):
+    registers = [
+        {"site": "Priolo", "path": str(tmp_path / "priolo.xlsx")},
+        {"site": "Priolo", "path": str(tmp_path / "priolo_2.xlsx")},
+    ]
+    for register in registers:
+        _write_workbook(register["path"])
+
+    with pytest.raises(ValueError, match="Priolo"):
+        sync.sync_all_registers(registers=registers)
+    assert database.get_all_rows() == []
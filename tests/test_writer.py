@@ -0,0 +1,174 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from src.data import database, writer
+from src.data.writer import RequestCoalescer, WriterLease
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Scrittore simulato: un processo che sincronizza più volte la propria sede
+WRITER_SCRIPT = """
+import sys
+from src.data import database
+
+database.DATABASE_DIR, database.SQLITE_DB_PATH = sys.argv[1], sys.argv[2]
+site, writes = sys.argv[3], int(sys.argv[4])
+for n in range(writes):
+    database.sync_rows([
+        (f"25/{site}{i}", "C1", "GEN", f"rev {n}", "PZ", 1.0, "No", "x.pdf", "02/01/2025", "", 0, "Rossi")
+        for i in range(50)
+    ], site=site)
+"""
+
+
+def _other_process_lease():
+    lease = WriterLease(database.get_connection)
+    lease.owner = "altro-pc:1234"
+    return lease
+
+
+def test_lease_blocks_other_writers_until_released(temp_db, monkeypatch):
+    monkeypatch.setattr(writer, "LEASE_POLL_SECONDS", 0.02)
+    other = _other_process_lease()
+    other.acquire()
+
+    with pytest.raises(TimeoutError):
+        database.writer_lease.acquire(timeout=0.2)
+
+    other.release()
+    with database.writer_lease:
+        with database.writer_lease:  # Riacquisizione dallo stesso thread
+            database.sync_rows([("25/1", "C1", "GEN", "A", "PZ", 1.0, "No", "x.pdf", "02/01/2025", "", 0, "R")])
+        with pytest.raises(TimeoutError):
+            other.acquire(timeout=0.2)
+
+    conn = database.get_connection()
+    assert conn.execute("SELECT COUNT(*) FROM writer_lease").fetchone()[0] == 0
+    conn.close()
+
+
+def test_expired_lease_is_taken_over(temp_db, monkeypatch):
+    monkeypatch.setattr(writer, "LEASE_SECONDS", 0.2)
+    monkeypatch.setattr(writer, "LEASE_POLL_SECONDS", 0.02)
+    other = _other_process_lease()
+    other._take_lease(time.monotonic() + 1)  # Processo terminato: nessun heartbeat
+
+    start = time.monotonic()
+    with database.writer_lease:
+        conn = database.get_connection()
+        owner = conn.execute("SELECT owner FROM writer_lease").fetchone()[0]
+        conn.close()
+    assert owner == database.writer_lease.owner
+    assert time.monotonic() - start >= 0.2
+
+
+def test_lease_with_heartbeat_is_not_taken_over(temp_db, monkeypatch):
+    monkeypatch.setattr(writer, "LEASE_SECONDS", 0.2)
+    monkeypatch.setattr(writer, "LEASE_POLL_SECONDS", 0.02)
+    other = _other_process_lease()
+    other.acquire()  # Heartbeat ogni LEASE_SECONDS / 4
+
+    with pytest.raises(TimeoutError):
+        database.writer_lease.acquire(timeout=0.6)
+    other.release()
+
+
+def test_lease_is_not_taken_over_during_holder_transaction(temp_db, monkeypatch):
+    monkeypatch.setattr(writer, "LEASE_SECONDS", 0.4)
+    monkeypatch.setattr(writer, "LEASE_POLL_SECONDS", 0.02)
+    other = _other_process_lease()
+    other.acquire()
+    taken = []
+
+    def wait():
+        try:
+            database.writer_lease.acquire(timeout=2)
+        except TimeoutError:
+            return
+        taken.append(True)
+        database.writer_lease.release()
+
+    waiting = threading.Thread(target=wait)
+    waiting.start()
+    time.sleep(0.1)
+
+    # Transazione del detentore più lunga di LEASE_SECONDS: l'heartbeat è
+    # fermo e riprende solo al giro successivo alla fine della transazione
+    other._stop_heartbeat()
+    conn = sqlite3.connect(str(temp_db))
+    conn.execute("BEGIN IMMEDIATE")
+    time.sleep(1)
+    conn.execute("COMMIT")
+    conn.close()
+    time.sleep(0.15)
+    other._start_heartbeat()
+
+    waiting.join(5)
+    other.release()
+    assert not taken
+
+
+def test_coalescer_merges_requests_during_a_run():
+    coalescer = RequestCoalescer()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow_sync():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return len(calls)
+
+    first = threading.Thread(target=coalescer.run, args=("sync", slow_sync))
+    first.start()
+    started.wait(5)
+
+    results = []
+    waiting = [
+        threading.Thread(target=lambda: results.append(coalescer.run("sync", slow_sync)))
+        for _ in range(5)
+    ]
+    for thread in waiting:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in [first] + waiting:
+        thread.join(5)
+
+    # Una sola esecuzione dopo quella in corso, condivisa da tutte le richieste
+    assert len(calls) == 2
+    assert results == [2] * 5
+    assert coalescer.joined == 4
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="misura su Linux")
+def test_concurrent_writers_throughput(temp_db, record_property):
+    writers, writes = 4, 10
+    start = time.perf_counter()
+    processes = [
+        subprocess.Popen(
+            [sys.executable, "-c", WRITER_SCRIPT, str(temp_db.parent), str(temp_db), f"S{n}", str(writes)],
+            cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+        )
+        for n in range(writers)
+    ]
+    errors = [p.communicate(timeout=120)[1] for p in processes if p.wait(timeout=120)]
+    elapsed = time.perf_counter() - start
+
+    throughput = writers * writes / elapsed
+    record_property("writes_per_second", round(throughput, 1))
+
+    # Nessun "database is locked": tutte le scritture completate
+    assert not errors
+    sites = {}
+    for row in database.get_all_rows():
+        sites[row['site']] = sites.get(row['site'], 0) + 1
+        assert row['descrizione_materiale'] == f"rev {writes - 1}"
+    assert sites == {f"S{n}": 50 for n in range(writers)}